@@ -42,8 +42,8 @@ def get_configs(settings, work_dir):
     nyudepthv2_cfg = {
         'task_type': 'depth_estimation',
         'dataset_category': datasets.DATASET_CATEGORY_NYUDEPTHV2,
-        'calibration_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_NYUDEPTHV2]['calibration_dataset'],
-        'input_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_NYUDEPTHV2]['input_dataset'],
+        'calibration_dataset': datasets.DATASET_CATEGORY_NYUDEPTHV2,
+        'input_dataset': datasets.DATASET_CATEGORY_NYUDEPTHV2,
     }
 
     postproc_depth_estimation_onnx = postproc_transforms.get_transform_depth_estimation_onnx()
@@ -40,16 +40,16 @@ def get_configs(settings, work_dir):
     common_cfg_1class = {
         'task_type': 'detection_3d',
         'dataset_category': datasets.DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS,
-        'calibration_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS]['calibration_dataset'],
-        'input_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS]['input_dataset'],
+        'calibration_dataset': datasets.DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS,
+        'input_dataset': datasets.DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS,
         'postprocess': None
     }
 
     common_cfg_3class = {
         'task_type': 'detection_3d',
         'dataset_category': datasets.DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS,
-        'calibration_dataset': settings.dataset_cache['kitti_lidar_det_3class']['calibration_dataset'],
-        'input_dataset': settings.dataset_cache['kitti_lidar_det_3class']['input_dataset'],
+        'calibration_dataset': 'kitti_lidar_det_3class',
+        'input_dataset': 'kitti_lidar_det_3class',
         'postprocess': None
     }
 
@@ -46,8 +46,8 @@ def get_configs(settings, work_dir):
     common_cfg = {
         'task_type': 'classification',
         'dataset_category': datasets.DATASET_CATEGORY_IMAGENET,
-        'calibration_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_IMAGENET]['calibration_dataset'],
-        'input_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_IMAGENET]['input_dataset'],
+        'calibration_dataset': datasets.DATASET_CATEGORY_IMAGENET,
+        'input_dataset': datasets.DATASET_CATEGORY_IMAGENET,
         'postprocess': postproc_transforms.get_transform_classification(),
         'calibration_frames': calibration_frames,
         'num_frames': num_frames
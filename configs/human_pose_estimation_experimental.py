@@ -50,8 +50,8 @@ def get_configs(settings, work_dir):
     common_cfg = {
         'task_type': 'keypoint_detection',
         'dataset_category': datasets.DATASET_CATEGORY_COCOKPTS,
-        'calibration_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_COCOKPTS]['calibration_dataset'],
-        'input_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_COCOKPTS]['input_dataset'],
+        'calibration_dataset': datasets.DATASET_CATEGORY_COCOKPTS,
+        'input_dataset': datasets.DATASET_CATEGORY_COCOKPTS,
         'postprocess': postproc_transforms.get_transform_human_pose_estimation_onnx() 
     }
 
@@ -42,8 +42,8 @@ def get_configs(settings, work_dir):
     robokitseg_cfg = {
         'task_type': 'visual_localization',
         'dataset_category': datasets.DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD,
-        'calibration_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD]['calibration_dataset'],
-        'input_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD]['input_dataset'],
+        'calibration_dataset': datasets.DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD,
+        'input_dataset': datasets.DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD,
     }
 
     pipeline_configs = {
@@ -42,36 +42,36 @@ def get_configs(settings, work_dir):
     ade20k_cfg = {
         'task_type': 'segmentation',
         'dataset_category': datasets.DATASET_CATEGORY_ADE20K,
-        'calibration_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_ADE20K]['calibration_dataset'],
-        'input_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_ADE20K]['input_dataset'],
+        'calibration_dataset': datasets.DATASET_CATEGORY_ADE20K,
+        'input_dataset': datasets.DATASET_CATEGORY_ADE20K,
     }
 
     ade20k32_cfg = {
         'task_type': 'segmentation',
         'dataset_category': datasets.DATASET_CATEGORY_ADE20K32,
-        'calibration_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_ADE20K32]['calibration_dataset'],
-        'input_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_ADE20K32]['input_dataset'],
+        'calibration_dataset': datasets.DATASET_CATEGORY_ADE20K32,
+        'input_dataset': datasets.DATASET_CATEGORY_ADE20K32,
     }
 
     pascal_voc_cfg = {
         'task_type': 'segmentation',
         'dataset_category': datasets.DATASET_CATEGORY_VOC2012,
-        'calibration_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_VOC2012]['calibration_dataset'],
-        'input_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_VOC2012]['input_dataset'],
+        'calibration_dataset': datasets.DATASET_CATEGORY_VOC2012,
+        'input_dataset': datasets.DATASET_CATEGORY_VOC2012,
     }
 
     cocoseg21_cfg = {
         'task_type': 'segmentation',
         'dataset_category': datasets.DATASET_CATEGORY_COCOSEG21,
-        'calibration_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_COCOSEG21]['calibration_dataset'],
-        'input_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_COCOSEG21]['input_dataset'],
+        'calibration_dataset': datasets.DATASET_CATEGORY_COCOSEG21,
+        'input_dataset': datasets.DATASET_CATEGORY_COCOSEG21,
     }
 
     robokitseg_cfg = {
         'task_type': 'segmentation',
         'dataset_category': datasets.DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD,
-        'calibration_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD]['calibration_dataset'],
-        'input_dataset': settings.dataset_cache[datasets.DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD]['input_dataset'],
+        'calibration_dataset': datasets.DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD,
+        'input_dataset': datasets.DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD,
     }
 
     postproc_segmentation_onnx = postproc_transforms.get_transform_segmentation_onnx()
@@ -88,6 +88,41 @@ class ConfigDict(utils.AttrDict):
         # for example 1 will mean one model will run (but in a separae processs from that of the main process)
         # None will mean one process will run, in the same process as the main
         self.parallel_processes = None
+        # how the parallel processes are run
+        # 'process': a new process is forked for every model
+        # 'worker': parallel_processes long lived workers are forked once and each of them runs many models in sequence.
+        #     a worker is replaced by a new process only if it crashes (or after parallel_max_tasks_per_worker models)
+        self.parallel_mode = 'process'
+        # in parallel_mode 'worker', the number of models after which a worker is recycled. None means never.
+        self.parallel_max_tasks_per_worker = None
+        # run the longest models first in parallel runs - using the durations recorded in the previous runs
+        # (run_stats.yaml in run_dir) or the perfsim gmacs / model file size when they are not available.
+        # this changes the order in which the models are run (and logged) - so it is off by default
+        self.parallel_cost_ordering = False
+        # memory budget in GB for the parallel processes. a model is started only if its peak memory (learnt from the
+        # previous runs - run_stats.yaml in run_dir) fits in the budget along with the models that are running.
+        # None means there is no limit. this uses /proc and works only on linux.
+        self.parallel_memory_limit = None
+        # run the import and inference of each model as separate tasks in parallel runs, with a limit on the number of
+        # processes of each stage - for example: {'import': 4, 'infer': 8}. parallel_processes is still the overall limit.
+        # None means the import and inference of a model are run in the same task.
+        self.parallel_stage_processes = None
+        # wall clock timeout in seconds for the import and for the inference of a model in parallel runs. a model that
+        # does not finish in time is killed (along with the processes that it has started) and retried. None means no limit.
+        # if either of them is given, the import and inference of each model are run as separate tasks (as with
+        # parallel_stage_processes) - so that each limit is enforced on its own.
+        self.parallel_import_timeout = None
+        self.parallel_infer_timeout = None
+        # number of retries of a model that has timed out, before it is marked as failed in run_summary.yaml
+        self.parallel_max_retries = 1
+        # wait time in seconds before the first retry of a model that has timed out - doubled for each retry
+        self.parallel_retry_backoff = 60
+        # share the work of one run between several hosts (or several invocations on one host) using the same work_dir
+        # on a shared file system. set it to a name for the run that is the same on all the hosts - each host claims the
+        # models that are not yet done using lease files in work_dir/.work_sharing/<name>. None means no sharing.
+        self.work_sharing = None
+        # a lease that has not been renewed for these many seconds is considered to belong to a dead host and reclaimed
+        self.work_sharing_lease_timeout = 600
         # quantization bit precision
         self.tensor_bits = 8 #8 #16 #32
         # runtime_options can be specified as a dict. eg {'accuracy_level': 0}
@@ -186,3 +221,42 @@ class ConfigDict(utils.AttrDict):
         self.fast_calibration_factor = None
         # cna use this file as template to cleanup model config file
         self.param_template_file = None
+        # folder to cache the compiled artifacts - an import with the same model, runtime_options,
+        # calibration data and tidl_tools will be restored from this cache instead of being run again.
+        # None disables the cache.
+        self.artifacts_cache_path = None
+        # folder where the optimized models are cached (eg. after onnxsim and shape inference), keyed by the source model
+        # and the optimization options - so that a model is optimized only once for all the run_dirs that use it.
+        self.model_cache_path = None
+        # bind the inputs and outputs of the runtime to buffers that are allocated once and reused for every frame
+        # (onnxruntime: IOBinding, tflite: direct access with interpreter.tensor()).
+        # the outputs of a frame are copied only if the postprocess keeps references to them.
+        self.session_io_binding = False
+        # number of inference requests kept in flight by AccuracyPipeline (with session.infer_frame_async), so that the
+        # pre and post processing on the host overlap with the inference. None or 1: the frames are inferred one by one.
+        self.session_infer_requests = None
+        # number of frames that AccuracyPipeline infers in one run of the session. onnxruntime on the host (tidl_offload=False)
+        # runs a batch at once - the others infer the frames one by one. None or 1: no batching.
+        self.session_batch_size = None
+        # number of processes used for the accuracy evaluation of datasets that support it (eg. coco detection)
+        # None or 0 means the evaluation is done in the same process
+        self.eval_processes = None
+        # number of frames to read and preprocess ahead of the session during inference.
+        # None or 0 means the frames are read and preprocessed one at a time, in the inference loop.
+        self.prefetch_frames = None
+        # number of workers used for prefetch. None means min(prefetch_frames, cpu_count)
+        self.prefetch_workers = None
+        # prefetch workers can be 'thread' or 'process'
+        self.prefetch_mode = 'thread'
+        # save the outputs and stats of the inference every these many frames into run_dir, so that an inference that is
+        # interrupted can be resumed from there (with run_missing). None means no checkpoint.
+        self.infer_checkpoint_frames = None
+        # folder of a store of decoded images that is shared by the processes on this host, eg. /dev/shm/edgeai-benchmark-images
+        # an image that has been decoded by one process is read from there by the others. None means no store.
+        self.image_store_path = None
+        # number of processes used to package the artifacts in run_package. None or 0 means sequential.
+        self.package_processes = None
+        # compression of the packaged artifacts: 'gz' (.tar.gz), 'bz2', 'xz' or None (uncompressed .tar)
+        self.package_compression = 'gz'
+        # compression level for the packaged artifacts - a lower value is faster. None uses the default.
+        self.package_compresslevel = None
@@ -114,6 +114,14 @@ class PreQuantizedModelType:
     PREQUANTIZED_MODEL_TYPE_V2 = 2
 
 
+# file in run_dir with the import/infer durations and the peak memory - used to schedule the tasks in parallel runs
+RUN_STATS_YAML_FILE = 'run_stats.yaml'
+
+# files in run_dir with the state of an inference that is in progress - used to resume an interrupted inference
+INFER_CHECKPOINT_STATE_FILE = 'infer_checkpoint_state.pkl'
+INFER_CHECKPOINT_DATA_FILE = 'infer_checkpoint_data.pkl'
+
+
 # some options in runtime_options
 OBJECT_DETECTION_META_FILE_KEY = 'object_detection:meta_layers_names_list'
 ADVANCED_OPTIONS_QUANT_FILE_KEY = 'advanced_options:quant_params_proto_path'
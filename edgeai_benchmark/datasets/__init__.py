@@ -26,8 +26,10 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import copy
 import warnings
 
+from .dataset_base import DatasetBase
 from .image_cls import *
 from .image_seg import *
 from .image_det import *
@@ -152,8 +154,65 @@ def _initialize_datasets(settings):
     return dataset_cache
 
 
+class DatasetCache(dict):
+    '''
+    dataset_cache that constructs the datasets of a category on its first access and then keeps them.
+    the categories that are not in dataset_list (or are not selected for loading) stay as category names,
+    the same as in initialize_datasets()
+    '''
+    def __init__(self, settings, download=False, dataset_list=None):
+        super().__init__(_initialize_datasets(settings))
+        self.settings = settings
+        self.download = download
+        dataset_list = dataset_list or get_dataset_categories(settings)
+        self.pending_categories = set(k for k in dataset_list if dict.__contains__(self, k))
+
+    def __getitem__(self, dataset_category):
+        if dataset_category in self.pending_categories:
+            self.pending_categories.discard(dataset_category)
+            dataset_entry = dict.__getitem__(self, dataset_category)
+            # the category entry is updated in place
+            _load_datasets(self.settings, {dataset_category: dataset_entry}, download=self.download,
+                           dataset_list=[dataset_category])
+        #
+        return dict.__getitem__(self, dataset_category)
+
+    def get(self, dataset_category, default=None):
+        return self[dataset_category] if dataset_category in self else default
+
+    def values(self):
+        return [self[k] for k in self.keys()]
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def __reduce__(self):
+        # pickle and copy.deepcopy of a dict subclass go through items() - that would load all the pending categories.
+        # the entries are copied as they are instead - the pending ones are loaded on their first access in the copy.
+        return (_make_dataset_cache, (self.__class__, dict(dict.items(self)), self.__dict__))
+
+
+def _make_dataset_cache(cls, dataset_entries, state):
+    dataset_cache = dict.__new__(cls)
+    dict.update(dataset_cache, dataset_entries)
+    dataset_cache.__dict__.update(state)
+    return dataset_cache
+
+
 def get_datasets(settings, download=False, dataset_list=None):
-    dataset_cache = _initialize_datasets(settings)
+    # the datasets are constructed only when they are accessed - see DatasetCache
+    return DatasetCache(settings, download=download, dataset_list=dataset_list)
+
+
+def get_dataset_view(dataset):
+    # the datasets derived from DatasetBase share their loaded data with the view - others are copied fully
+    if isinstance(dataset, DatasetBase):
+        return dataset.get_view()
+    #
+    return copy.deepcopy(dataset)
+
+
+def _load_datasets(settings, dataset_cache, download=False, dataset_list=None):
     dset_info_dict = get_dataset_info_dict(settings)
     dataset_list = dataset_list or get_dataset_categories(settings)
 
@@ -243,7 +302,8 @@ def get_datasets(settings, download=False, dataset_list=None):
             num_frames=min(settings.num_frames,5000),
             name=DATASET_CATEGORY_COCO)
         dataset_cache[DATASET_CATEGORY_COCO]['calibration_dataset'] = COCODetection(**coco_det_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_COCO]['input_dataset'] = COCODetection(**coco_det_val_cfg, download=False)
+        dataset_cache[DATASET_CATEGORY_COCO]['input_dataset'] = COCODetection(**coco_det_val_cfg, download=False,
+                                                                              eval_processes=settings.eval_processes)
     #
     if check_dataset_load(settings, DATASET_CATEGORY_WIDERFACE) and (DATASET_CATEGORY_WIDERFACE in dataset_list):
         print(utils.log_color("\nINFO", f"loading dataset", f"category:{DATASET_CATEGORY_WIDERFACE} variant:{DATASET_CATEGORY_WIDERFACE}"))
@@ -277,7 +337,8 @@ def get_datasets(settings, download=False, dataset_list=None):
             num_frames=min(settings.num_frames,5000),
             name=DATASET_CATEGORY_COCOSEG21)
         dataset_cache[DATASET_CATEGORY_COCOSEG21]['calibration_dataset'] = COCOSegmentation(**cocoseg21_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_COCOSEG21]['input_dataset'] = COCOSegmentation(**cocoseg21_val_cfg, download=False)
+        dataset_cache[DATASET_CATEGORY_COCOSEG21]['input_dataset'] = COCOSegmentation(**cocoseg21_val_cfg, download=False,
+                                                                                   eval_processes=settings.eval_processes)
     #
     if check_dataset_load(settings, DATASET_CATEGORY_ADE20K) and (DATASET_CATEGORY_ADE20K in dataset_list):
         print(utils.log_color("\nINFO", f"loading dataset", f"category:{DATASET_CATEGORY_ADE20K} variant:{DATASET_CATEGORY_ADE20K}"))
@@ -512,6 +573,7 @@ def download_datasets(settings, download=True, dataset_list=None):
     # just creating the dataset classes with download=True will check of the dataset folders are present
     # if the dataset folders are missing, it will be downloaded and extracted
     # set download='always' to force re-download the datasets
+    # note: the dataset classes are created (and downloaded if needed) when they are first accessed in settings.dataset_cache
     settings.dataset_cache = get_datasets(settings, download=download, dataset_list=dataset_list)
     return True
 
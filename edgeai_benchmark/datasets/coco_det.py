@@ -78,7 +78,7 @@ import os
 import random
 import json
 import shutil
-import tempfile
+import multiprocessing
 import numpy as np
 from colorama import Fore
 from pycocotools.coco import COCO
@@ -90,9 +90,26 @@ from .dataset_base import *
 __all__ = ['COCODetection', 'coco_det_label_offset_80to90', 'coco_det_label_offset_90to90']
 
 
+# state of the worker processes used in parallel evaluation
+# these are inherited by fork and are not pickled
+_coco_eval_worker_state = {}
+
+
+def _coco_eval_worker(cat_ids):
+    # evaluate and accumulate are independent for each category - so the categories can be split across processes
+    coco_eval = COCOeval(_coco_eval_worker_state['coco_gt'], _coco_eval_worker_state['coco_det'], iouType='bbox')
+    coco_eval.params.catIds = cat_ids
+    coco_eval.evaluate()
+    coco_eval.accumulate()
+    return coco_eval.eval['precision'], coco_eval.eval['recall'], coco_eval.eval['scores']
+
+
 class COCODetection(DatasetBase):
-    def __init__(self, num_classes=90, download=False, image_dir=None, annotation_file=None, num_frames=None, name='coco', **kwargs):
+    def __init__(self, num_classes=90, download=False, image_dir=None, annotation_file=None, num_frames=None, name='coco',
+                 eval_processes=None, **kwargs):
         super().__init__(num_classes=num_classes, num_frames=num_frames, name=name, **kwargs)
+        # number of processes to be used in evaluate(). None or 0 means that the evaluation is done in this process.
+        self.eval_processes = eval_processes
         if image_dir is None or annotation_file is None:
             self.force_download = True if download == 'always' else False
             assert 'path' in self.kwargs and 'split' in self.kwargs, 'kwargs must have path and split'
@@ -215,33 +232,21 @@ class COCODetection(DatasetBase):
 
     def evaluate(self, predictions, **kwargs):
         label_offset = kwargs.get('label_offset_pred', 0)
-        #run_dir = kwargs.get('run_dir', None)
-        temp_dir_obj = tempfile.TemporaryDirectory()
-        temp_dir = temp_dir_obj.name
-        self.tempfiles.append(temp_dir_obj)
-
-        #os.makedirs(run_dir, exist_ok=True)
-        detections_formatted_list = []
-        for frame_idx, det_frame in enumerate(predictions):
-            for det_id, det in enumerate(det_frame):
-                det = self._format_detections(det, frame_idx, label_offset=label_offset)
-                category_id = det['category_id'] if isinstance(det, dict) else det[4]
-                if category_id >= 1: # final coco categories start from 1
-                    detections_formatted_list.append(det)
-                #
-            #
-        #
+        eval_processes = kwargs.get('eval_processes', self.eval_processes)
+        # the detections are kept as a numpy array of [image_id, x, y, w, h, score, category_id]
+        # this is passed directly to loadRes(), without the json file round trip
+        detections_formatted = self._format_detections_array(predictions, label_offset=label_offset)
         coco_ap = 0.0
         coco_ap50 = 0.0
-        if len(detections_formatted_list) > 0:
-            detection_file = os.path.join(temp_dir, 'detection_results.json')
-            with open(detection_file, 'w') as det_fp:
-                json.dump(detections_formatted_list, det_fp)
-            #
-            cocoDet = self.coco_dataset.loadRes(detection_file)
+        if len(detections_formatted) > 0:
+            cocoDet = self.coco_dataset.loadRes(detections_formatted)
             cocoEval = COCOeval(self.coco_dataset, cocoDet, iouType='bbox')
-            cocoEval.evaluate()
-            cocoEval.accumulate()
+            if eval_processes:
+                self._evaluate_parallel(cocoEval, cocoDet, eval_processes)
+            else:
+                cocoEval.evaluate()
+                cocoEval.accumulate()
+            #
             cocoEval.summarize()
             coco_ap = cocoEval.stats[0]
             coco_ap50 = cocoEval.stats[1]
@@ -249,6 +254,34 @@ class COCODetection(DatasetBase):
         accuracy = {'accuracy_ap[.5:.95]%': coco_ap*100.0, 'accuracy_ap50%': coco_ap50*100.0}
         return accuracy
 
+    def _evaluate_parallel(self, cocoEval, cocoDet, eval_processes):
+        cat_ids = cocoEval.params.catIds
+        num_chunks = min(eval_processes, len(cat_ids))
+        cat_ids_chunks = [c.tolist() for c in np.array_split(cat_ids, num_chunks)]
+        # with fork, the ground truth and detections are inherited by the workers - only the outputs are pickled
+        _coco_eval_worker_state['coco_gt'] = self.coco_dataset
+        _coco_eval_worker_state['coco_det'] = cocoDet
+        try:
+            mp_context = multiprocessing.get_context(method='fork')
+            with mp_context.Pool(num_chunks) as eval_pool:
+                eval_outputs = eval_pool.map(_coco_eval_worker, cat_ids_chunks)
+            #
+        finally:
+            _coco_eval_worker_state.clear()
+        #
+        # the category chunks are in the same order as catIds - so concatenating them along
+        # the category axis gives exactly what accumulate() on all the categories would give
+        precision = np.concatenate([e[0] for e in eval_outputs], axis=2)
+        recall = np.concatenate([e[1] for e in eval_outputs], axis=1)
+        scores = np.concatenate([e[2] for e in eval_outputs], axis=2)
+        cocoEval.eval = {
+            'params': cocoEval.params,
+            'counts': list(precision.shape),
+            'precision': precision,
+            'recall': recall,
+            'scores': scores,
+        }
+
     def get_dataset_info(self):
         # return only info and categories for now as the whole thing could be quite large.
         dataset_store = dict()
@@ -277,6 +310,42 @@ class COCODetection(DatasetBase):
         output_dict['score'] = float(bbox_label_score[5])
         return output_dict
 
+    def _format_detections_array(self, predictions, label_offset=0):
+        '''
+        columnar equivalent of _format_detections() for all the frames.
+        returns an array of [image_id, x, y, w, h, score, category_id] in float64
+        - the values are identical to what the json file written from _format_detections() would have
+        '''
+        frame_dets_list = []
+        frame_ids_list = []
+        for frame_idx, det_frame in enumerate(predictions):
+            det_frame = np.asarray(det_frame)
+            if det_frame.size > 0:
+                det_frame = det_frame.reshape(det_frame.shape[0], -1)
+                # width and height are computed in the precision of each frame, as in _xyxy2xywh() - this is done
+                # before the frames are concatenated, as that would promote all of them to the widest precision
+                det_wh = det_frame[:,2:4] - det_frame[:,0:2]
+                frame_dets_list.append(np.concatenate([det_frame[:,0:2].astype(np.float64), det_wh.astype(np.float64),
+                                                       det_frame[:,4:6].astype(np.float64)], axis=1))
+                frame_ids_list.append(np.full(det_frame.shape[0], self.img_ids[frame_idx], dtype=np.float64))
+            #
+        #
+        if len(frame_dets_list) == 0:
+            return np.zeros((0,7), dtype=np.float64)
+        #
+        # each row is [x, y, w, h, label, score]
+        dets = np.concatenate(frame_dets_list, axis=0)
+        image_ids = np.concatenate(frame_ids_list, axis=0)
+        # label to category_id - the mapping is done once for every unique label
+        unique_labels, label_indices = np.unique(dets[:,4], return_inverse=True)
+        unique_cat_ids = np.array([self._detection_label_to_catid(label, label_offset) for label in unique_labels], dtype=np.int64)
+        category_ids = unique_cat_ids[label_indices.reshape(-1)]
+        detections_formatted = np.stack([image_ids, dets[:,0], dets[:,1], dets[:,2], dets[:,3],
+                                         dets[:,5], category_ids], axis=1).astype(np.float64)
+        # final coco categories start from 1
+        detections_formatted = detections_formatted[category_ids >= 1]
+        return detections_formatted
+
     def _detection_label_to_catid(self, label, label_offset):
         if isinstance(label_offset, (list,tuple)):
             label = int(label)
@@ -80,6 +80,8 @@ import numpy as np
 import PIL
 import cv2
 import tempfile
+import multiprocessing
+import yaml
 from colorama import Fore
 from pycocotools.coco import COCO
 from pycocotools import mask as coco_mask
@@ -91,9 +93,22 @@ from .dataset_base import *
 __all__ = ['COCOSegmentation']
 
 
+# state of the worker processes used for label precomputation
+# these are inherited by fork and are not pickled
+_coco_seg_label_worker_state = {}
+
+
+def _coco_seg_label_worker(idx):
+    dataset = _coco_seg_label_worker_state['dataset']
+    return dataset._get_label(idx)
+
+
 class COCOSegmentation(DatasetBase):
-    def __init__(self, num_classes=21, download=False, num_frames=None, name="cocoseg21", **kwargs):
+    def __init__(self, num_classes=21, download=False, num_frames=None, name="cocoseg21", label_cache_dir=None,
+                 eval_processes=None, **kwargs):
         super().__init__(num_classes=num_classes, num_frames=num_frames, name=name, **kwargs)
+        # number of processes used to precompute the labels in evaluate(). None or 0 means the same process.
+        self.eval_processes = eval_processes
         self.force_download = True if download == 'always' else False
         assert 'path' in self.kwargs and 'split' in self.kwargs, 'kwargs must have path and split'
         path = self.kwargs['path']
@@ -153,16 +168,26 @@ class COCOSegmentation(DatasetBase):
         self.img_ids = self.coco_dataset.getImgIds()
         self.num_frames = self.kwargs['num_frames'] = num_frames
 
-        run_dir = self.kwargs.get('run_dir', None)
-        if run_dir is None:
-            temp_dir = tempfile.TemporaryDirectory()
-            run_dir = temp_dir.name
-            self.tempfiles.append(temp_dir)
-        #
-        self.label_dir = os.path.join(run_dir, 'labels')
         with open(self.annotation_file) as afp:
             self.dataset_store = json.load(afp)
         #
+        # the rasterized labels are kept in a persistent cache, so that they are created only once
+        # and shared by all the models that use this dataset. the folder name has a fingerprint
+        # of the annotations and the category mapping, so that a stale cache is never used.
+        annotation_stat = os.stat(self.annotation_file)
+        label_fingerprint = utils.hash_digest(self.annotation_file, annotation_stat.st_size, annotation_stat.st_mtime_ns,
+                                              list(self.categories), self.num_classes)
+        if label_cache_dir is None:
+            label_cache_dir = os.path.join(root, 'labels_cache') if os.access(root, os.W_OK) else None
+        #
+        if label_cache_dir is None:
+            temp_dir = tempfile.TemporaryDirectory()
+            label_cache_dir = temp_dir.name
+            self.tempfiles.append(temp_dir)
+        #
+        self.label_dir = os.path.join(label_cache_dir, f'{name}_{split}_{label_fingerprint[:16]}')
+        self.label_manifest_file = os.path.join(self.label_dir, 'manifest.yaml')
+        self.label_manifest = None
         self.kwargs['dataset_info'] = self.get_dataset_info()
 
     def download(self, path, split):
@@ -201,22 +226,89 @@ class COCOSegmentation(DatasetBase):
         img = self.coco_dataset.loadImgs([img_id])[0]
         image_path = os.path.join(self.image_dir, img['file_name'])
         if with_label:
-            os.makedirs(self.label_dir, exist_ok=True)
-            ann_ids = self.coco_dataset.getAnnIds(imgIds=img_id, iscrowd=None)
-            anno = self.coco_dataset.loadAnns(ann_ids)
-            image = PIL.Image.open(image_path)
-            image, anno = self._filter_and_remap_categories(image, anno)
-            image, target = self._convert_polys_to_mask(image, anno)
-            # write the label file to a temorary dir so that it can be used by evaluate()
-            image_basename = os.path.basename(image_path)
-            label_path = os.path.join(self.label_dir, image_basename)
-            label_path = os.path.splitext(label_path)[0] + '.png'
-            cv2.imwrite(label_path, target)
+            label_path = self._get_label(idx)
             return image_path, label_path
         else:
             return image_path
         #
 
+    def _get_label_path(self, idx):
+        img_id = self.img_ids[idx]
+        img = self.coco_dataset.loadImgs([img_id])[0]
+        label_path = os.path.join(self.label_dir, os.path.splitext(img['file_name'])[0] + '.png')
+        return label_path
+
+    def _get_label(self, idx):
+        # rasterize the label into the cache, if it is not already there
+        label_path = self._get_label_path(idx)
+        if self.label_manifest is not None and os.path.basename(label_path) in self.label_manifest:
+            return label_path
+        elif os.path.exists(label_path):
+            return label_path
+        #
+        os.makedirs(self.label_dir, exist_ok=True)
+        img_id = self.img_ids[idx]
+        img = self.coco_dataset.loadImgs([img_id])[0]
+        image_path = os.path.join(self.image_dir, img['file_name'])
+        ann_ids = self.coco_dataset.getAnnIds(imgIds=img_id, iscrowd=None)
+        anno = self.coco_dataset.loadAnns(ann_ids)
+        image = PIL.Image.open(image_path)
+        image, anno = self._filter_and_remap_categories(image, anno)
+        image, target = self._convert_polys_to_mask(image, anno)
+        # write to a temporary file and rename, so that other processes never see a partial label file
+        label_path_temp = os.path.splitext(label_path)[0] + f'.{os.getpid()}.tmp.png'
+        cv2.imwrite(label_path_temp, target)
+        os.replace(label_path_temp, label_path)
+        return label_path
+
+    def precompute_labels(self, num_frames=None):
+        '''
+        rasterize the labels of the first num_frames into the label cache - in parallel if eval_processes is set.
+        a manifest of the labels in the cache is written, so that later runs need not check each file.
+        '''
+        num_frames = min(self.num_frames, num_frames) if num_frames is not None else self.num_frames
+        self.label_manifest = self._read_label_manifest()
+        label_names = [os.path.basename(self._get_label_path(idx)) for idx in range(num_frames)]
+        missing_indices = [idx for idx, label_name in enumerate(label_names) if label_name not in self.label_manifest]
+        if len(missing_indices) == 0:
+            return
+        #
+        print(utils.log_color('\nINFO', 'creating label cache', f'{len(missing_indices)} labels in {self.label_dir}'))
+        os.makedirs(self.label_dir, exist_ok=True)
+        if self.eval_processes:
+            # with fork, the dataset is inherited by the workers - only the label paths are pickled
+            _coco_seg_label_worker_state['dataset'] = self
+            try:
+                mp_context = multiprocessing.get_context(method='fork')
+                with mp_context.Pool(self.eval_processes) as label_pool:
+                    label_pool.map(_coco_seg_label_worker, missing_indices, chunksize=16)
+                #
+            finally:
+                _coco_seg_label_worker_state.clear()
+            #
+        else:
+            for idx in missing_indices:
+                self._get_label(idx)
+            #
+        #
+        # other processes may have added labels in the meantime - so read it again before updating
+        self.label_manifest = self._read_label_manifest()
+        self.label_manifest.update(label_names)
+        label_manifest_temp = f'{self.label_manifest_file}.{os.getpid()}.tmp'
+        with open(label_manifest_temp, 'w') as fp:
+            yaml.safe_dump(dict(label_files=sorted(self.label_manifest)), fp)
+        #
+        os.replace(label_manifest_temp, self.label_manifest_file)
+
+    def _read_label_manifest(self):
+        if not os.path.exists(self.label_manifest_file):
+            return set()
+        #
+        with open(self.label_manifest_file) as fp:
+            label_manifest = yaml.safe_load(fp) or {}
+        #
+        return set(label_manifest.get('label_files', []))
+
     def __len__(self):
         return self.num_frames
 
@@ -235,6 +327,8 @@ class COCOSegmentation(DatasetBase):
     def evaluate(self, predictions, **kwargs):
         cmatrix = None
         num_frames = min(self.num_frames, len(predictions))
+        # make sure that the labels are available in the label cache
+        self.precompute_labels(num_frames)
         for n in range(num_frames):
             image_file, label_file = self.__getitem__(n, with_label=True)
             label_img = PIL.Image.open(label_file)
@@ -1,3 +1,5 @@
+import copy
+
 from .. import utils
 
 
@@ -9,6 +11,19 @@ class DatasetBase(utils.ParamsBase):
         # call the utils.ParamsBase.initialize()
         super().initialize()
 
+    def get_view(self):
+        '''
+        lightweight copy of the dataset for a pipeline. the loaded annotations, frame list and such large data
+        are shared with this dataset (and must be treated as read-only) - only kwargs, that the pipelines modify, is copied.
+        '''
+        dataset_view = copy.copy(self)
+        dataset_view.kwargs = copy.deepcopy(self.kwargs)
+        if hasattr(self, 'tempfiles'):
+            # the temporary files belong to this dataset and are cleaned up along with it - not with the view
+            dataset_view.tempfiles = []
+        #
+        return dataset_view
+
     def get_color_map(self, num_classes=None):
         if num_classes is None:
             if 'num_classes' in self.kwargs and self.kwargs['num_classes']:
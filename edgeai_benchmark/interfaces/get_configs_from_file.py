@@ -84,6 +84,8 @@ def pipeline_param_to_config(settings, config_file_or_pipeline_param, work_dir):
 
     # set it to pipeline_params
     pipeline_param['session']['work_dir'] = work_dir
+    # the params of the host that runs the benchmark - not the ones written into the config file
+    pipeline_param['session'].update(sessions.get_session_host_params(settings))
     pipeline_param['session']['runtime_options'] = runtime_options
 
     if session_name == constants.SESSION_NAME_ONNXRT:
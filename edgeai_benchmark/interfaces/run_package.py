@@ -34,8 +34,15 @@ import tarfile
 import yaml
 import glob
 import re
+import functools
+import multiprocessing
 
 from .. import utils
+from .. import constants
+from .. import sessions
+
+
+PACKAGE_MANIFEST_FILE = 'package_manifest.yaml'
 
 
 def run_package(settings, work_dir, out_dir, include_results=False, custom_model=False, param_template=None):
@@ -44,6 +51,10 @@ def run_package(settings, work_dir, out_dir, include_results=False, custom_model
                       param_template=param_template)
 
 
+def get_package_extension(compression):
+    return f'.tar.{compression}' if compression else '.tar'
+
+
 def match_string(patterns, filename):
     matches = [re.search(p, filename) for p in patterns]
     got_match = any(matches)
@@ -51,7 +62,14 @@ def match_string(patterns, filename):
 
 
 def package_artifact(pipeline_param, work_dir, out_dir, make_package_tar=True, make_package_dir=False,
-                     include_results=False, param_template=None):
+                     include_results=False, param_template=None, compression='gz', compresslevel=None,
+                     package_manifest=None):
+    '''
+    compression: 'gz', 'bz2', 'xz' or None (uncompressed tar). compresslevel: None uses the tarfile default.
+    package_manifest: optional dict, keyed by the run_dir name, with the fingerprint of the packaged files.
+        if the files have not changed since the last package, the existing package is kept.
+        the entry of this run_dir is updated in package_manifest.
+    '''
     input_files = []
     packaged_files = []
 
@@ -106,12 +124,26 @@ def package_artifact(pipeline_param, work_dir, out_dir, make_package_tar=True, m
     pipeline_param['session']['model_folder'] = relative_model_dir
     pipeline_param['session']['model_path'] = relative_model_path
     pipeline_param['session']['artifacts_folder'] = relative_artifacts_dir
+    # the params that are specific to the host that ran the benchmark are not packaged
+    for param_name in sessions.SESSION_HOST_PARAMS:
+        pipeline_param['session'].pop(param_name, None)
+    #
     # result is being excluded from the param.yaml - that will only be in result.yaml
     if 'result' in pipeline_param:
         del pipeline_param['result']
     #
-    with open(param_file, 'w') as pfp:
-        yaml.safe_dump(pipeline_param, pfp)
+    param_str = yaml.safe_dump(pipeline_param)
+    # write param.yaml only if it has changed - so that its mtime can be used to detect changes in the package
+    param_str_prev = None
+    if os.path.exists(param_file):
+        with open(param_file) as pfp:
+            param_str_prev = pfp.read()
+        #
+    #
+    if param_str != param_str_prev:
+        with open(param_file, 'w') as pfp:
+            pfp.write(param_str)
+        #
     #
 
     # copy model files
@@ -176,10 +208,33 @@ def package_artifact(pipeline_param, work_dir, out_dir, make_package_tar=True, m
         if (not include_results) and 'result' in f:
             continue
         #
+        if os.path.basename(f) in (constants.RUN_STATS_YAML_FILE, constants.INFER_CHECKPOINT_STATE_FILE,
+                                   constants.INFER_CHECKPOINT_DATA_FILE):
+            continue
+        #
         input_files.append(f)
         packaged_files.append(pf)
     #
 
+    tarfile_name = package_run_dir + get_package_extension(compression)
+    package_digest = None
+    if package_manifest is not None:
+        package_key = os.path.basename(package_run_dir)
+        package_stats = []
+        for inpf, pf in zip(input_files, packaged_files):
+            inpf_stat = os.stat(inpf)
+            package_stats.append((pf.replace(package_run_dir, ''), inpf_stat.st_size, inpf_stat.st_mtime_ns))
+        #
+        package_digest = utils.hash_digest(package_stats, make_package_tar, make_package_dir, compression, compresslevel)
+        previous_entry = package_manifest.get(package_key, None)
+        # the package is unchanged if the fingerprint matches and the outputs are still present
+        if previous_entry is not None and previous_entry['digest'] == package_digest and \
+                (not make_package_tar or (os.path.exists(tarfile_name) and os.path.getsize(tarfile_name) == previous_entry['size'])) and \
+                (not make_package_dir or os.path.isdir(package_run_dir)):
+            return (package_run_dir if make_package_tar else None), previous_entry['size']
+        #
+    #
+
     if make_package_dir:
         for inpf, pf in zip(input_files, packaged_files):
             os.makedirs(os.path.dirname(pf), exist_ok=True)
@@ -189,74 +244,139 @@ def package_artifact(pipeline_param, work_dir, out_dir, make_package_tar=True, m
 
     tarfile_size = 0
     if make_package_tar:
-        tarfile_name = package_run_dir + '.tar.gz'
-        tfp = tarfile.open(tarfile_name, 'w:gz')
-        for inpf, pf in zip(input_files, packaged_files):
-            outpf = pf.replace(package_run_dir, '')
-            tfp.add(inpf, arcname=outpf)
+        tarfile_kwargs = {}
+        if compression and compresslevel is not None:
+            tarfile_kwargs = {'preset': compresslevel} if compression == 'xz' else {'compresslevel': compresslevel}
+        #
+        # write to a temporary file first, so that an interrupted package is not mistaken as a complete one
+        tarfile_name_temp = tarfile_name + f'.{os.getpid()}.tmp'
+        try:
+            with tarfile.open(tarfile_name_temp, f'w:{compression or ""}', **tarfile_kwargs) as tfp:
+                for inpf, pf in zip(input_files, packaged_files):
+                    outpf = pf.replace(package_run_dir, '')
+                    tfp.add(inpf, arcname=outpf)
+                #
+            #
+            os.replace(tarfile_name_temp, tarfile_name)
+        finally:
+            # the temporary file of a package that failed part way must not be left in out_dir
+            if os.path.exists(tarfile_name_temp):
+                os.remove(tarfile_name_temp)
+            #
         #
-        tfp.close()
         tarfile_size = os.path.getsize(tarfile_name)
-    else:
+    #
+    if package_manifest is not None:
+        package_manifest[package_key] = {'digest': package_digest, 'size': tarfile_size}
+    #
+    if not make_package_tar:
         package_run_dir = None
     #
     return package_run_dir, tarfile_size
 
 
+def _package_run_dir(run_dir, package_manifest, work_dir, out_dir, include_results=False, custom_model=False,
+                     param_template=None, compression='gz', compresslevel=None):
+    # package_manifest has the previous entry of this run_dir (if any) and it is returned with the updated entry
+    # - so that this function can be run in a separate process
+    artifact_id = None
+    artifacts_dict = None
+    try:
+        param_yaml = os.path.join(run_dir, 'param.yaml')
+        result_yaml = os.path.join(run_dir, 'result.yaml')
+        read_yaml = result_yaml if os.path.exists(result_yaml) else param_yaml
+        with open(read_yaml) as fp:
+            pipeline_param = yaml.safe_load(fp)
+        #
+        package_run_dir, tarfile_size = package_artifact(pipeline_param, work_dir, out_dir,
+                            include_results=include_results, param_template=param_template,
+                            compression=compression, compresslevel=compresslevel, package_manifest=package_manifest)
+        if package_run_dir is not None:
+            task_type = pipeline_param['task_type']
+            package_run_dir = os.path.basename(package_run_dir)
+            model_path = pipeline_param['session']['model_path']
+            model_path = model_path[0] if isinstance(model_path, (list,tuple)) else model_path
+
+            run_dir = pipeline_param['session']['run_dir']
+            run_dir_basename = os.path.basename(run_dir)
+            run_dir_splits = run_dir_basename.split('_')
+            artifact_id = '_'.join(run_dir_splits[:2]) if not custom_model else None
+            runtime_name = pipeline_param['session']['session_name']
+            model_name = utils.get_artifact_name(artifact_id) if not custom_model else None
+            model_name = model_name or run_dir_basename
+
+            # artifacts generated using scripts/benchmark_resolution.py will not produce good accuracy
+            # that is only for performance test
+            suffix_highres = artifact_id.split('_')[0] if not custom_model else ''
+            is_highres = suffix_highres.endswith('1') or suffix_highres.endswith('2')
+            is_shortlisted = utils.is_shortlisted_model(artifact_id) and (not is_highres) if not custom_model else True
+            is_recommended = utils.is_recommended_model(artifact_id) if not custom_model else True
+
+            artifacts_dict = {'task_type': task_type, 'session_name': runtime_name,
+                              'run_dir': package_run_dir, 'model_name': model_name,
+                              'size': tarfile_size,
+                              'shortlisted': is_shortlisted,
+                              'recommended': is_recommended}
+            print(utils.log_color('SUCCESS', 'finished packaging', run_dir))
+        else:
+            print(utils.log_color('WARNING', 'could not package', run_dir))
+        #
+    except:
+        print(utils.log_color('WARNING', 'could not package', run_dir))
+    #
+    sys.stdout.flush()
+    return artifact_id, artifacts_dict, package_manifest
+
+
 def package_artifacts(settings, work_dir, out_dir, include_results=False, custom_model=False, param_template=None):
     print(f'packaging artifacts to {out_dir} please wait...')
     run_dirs = glob.glob(f'{work_dir}/*')
     run_dirs = sorted(run_dirs)
+    run_dirs = [run_dir for run_dir in run_dirs if os.path.isdir(run_dir)]
 
-    packaged_artifacts_dict = {}
+    compression = settings.package_compression
+    compresslevel = settings.package_compresslevel
+    package_processes = settings.package_processes
+
+    # the manifest of the previous package - used to skip the run_dirs that have not changed
+    os.makedirs(out_dir, exist_ok=True)
+    package_manifest_file = os.path.join(out_dir, PACKAGE_MANIFEST_FILE)
+    package_manifest = {}
+    if os.path.exists(package_manifest_file):
+        with open(package_manifest_file) as fp:
+            package_manifest = yaml.safe_load(fp) or {}
+        #
+    #
+
+    package_func = functools.partial(_package_run_dir, work_dir=work_dir, out_dir=out_dir,
+                                     include_results=include_results, custom_model=custom_model,
+                                     param_template=param_template, compression=compression,
+                                     compresslevel=compresslevel)
+    package_args = []
     for run_dir in run_dirs:
-        if not os.path.isdir(run_dir):
-            continue
+        package_key = os.path.basename(run_dir)
+        run_dir_manifest = {package_key: package_manifest[package_key]} if package_key in package_manifest else {}
+        package_args.append((run_dir, run_dir_manifest))
+    #
+    if package_processes:
+        mp_context = multiprocessing.get_context(method='fork')
+        with mp_context.Pool(package_processes) as pool:
+            package_outputs = pool.starmap(package_func, package_args)
         #
-        try:
-            param_yaml = os.path.join(run_dir, 'param.yaml')
-            result_yaml = os.path.join(run_dir, 'result.yaml')
-            read_yaml = result_yaml if os.path.exists(result_yaml) else param_yaml
-            with open(read_yaml) as fp:
-                pipeline_param = yaml.safe_load(fp)
-            #
-            package_run_dir, tarfile_size = package_artifact(pipeline_param, work_dir, out_dir,
-                                include_results=include_results, param_template=param_template)
-            if package_run_dir is not None:
-                task_type = pipeline_param['task_type']
-                package_run_dir = os.path.basename(package_run_dir)
-                model_path = pipeline_param['session']['model_path']
-                model_path = model_path[0] if isinstance(model_path, (list,tuple)) else model_path
-
-                run_dir = pipeline_param['session']['run_dir']
-                run_dir_basename = os.path.basename(run_dir)
-                run_dir_splits = run_dir_basename.split('_')
-                artifact_id = '_'.join(run_dir_splits[:2]) if not custom_model else None
-                runtime_name = pipeline_param['session']['session_name']
-                model_name = utils.get_artifact_name(artifact_id) if not custom_model else None
-                model_name = model_name or run_dir_basename
-
-                # artifacts generated using scripts/benchmark_resolution.py will not produce good accuracy
-                # that is only for performance test
-                suffix_highres = artifact_id.split('_')[0] if not custom_model else ''
-                is_highres = suffix_highres.endswith('1') or suffix_highres.endswith('2')
-                is_shortlisted = utils.is_shortlisted_model(artifact_id) and (not is_highres) if not custom_model else True
-                is_recommended = utils.is_recommended_model(artifact_id) if not custom_model else True
-
-                artifacts_dict = {'task_type': task_type, 'session_name': runtime_name,
-                                  'run_dir': package_run_dir, 'model_name': model_name,
-                                  'size': tarfile_size,
-                                  'shortlisted': is_shortlisted,
-                                  'recommended': is_recommended}
-                packaged_artifacts_dict.update({artifact_id:artifacts_dict})
-                print(utils.log_color('SUCCESS', 'finished packaging', run_dir))
-            else:
-                print(utils.log_color('WARNING', 'could not package', run_dir))
-            #
-        except:
-            print(utils.log_color('WARNING', 'could not package', run_dir))
+    else:
+        package_outputs = [package_func(*a) for a in package_args]
+    #
+
+    packaged_artifacts_dict = {}
+    package_manifest = {}
+    for artifact_id, artifacts_dict, run_dir_manifest in package_outputs:
+        if artifacts_dict is not None:
+            packaged_artifacts_dict.update({artifact_id:artifacts_dict})
         #
-        sys.stdout.flush()
+        package_manifest.update(run_dir_manifest)
+    #
+    with open(package_manifest_file, 'w') as fp:
+        yaml.safe_dump(package_manifest, fp)
     #
     if include_results:
         results_yaml = os.path.join(work_dir, 'results.yaml')
@@ -282,7 +402,12 @@ def package_artifacts(settings, work_dir, out_dir, include_results=False, custom
     #
     with open(os.path.join(out_dir, 'extract.sh'), 'w') as fp:
         # Note: append '-exec rm -f "{}" \;' to delete the original .tar.gz files
-        fp.write('find . -name "*.tar.gz" -exec tar --one-top-level -zxvf "{}" \;')
+        if compression == 'gz':
+            fp.write('find . -name "*.tar.gz" -exec tar --one-top-level -zxvf "{}" \;')
+        else:
+            package_extension = get_package_extension(compression)
+            fp.write(f'find . -name "*{package_extension}" -exec tar --one-top-level -xvf "{{}}" \\;')
+        #
     #
 
 
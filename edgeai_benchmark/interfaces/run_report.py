@@ -30,6 +30,8 @@ import os
 import datetime
 import yaml
 import glob
+import pickle
+import sqlite3
 
 from .. import utils
 
@@ -40,32 +42,104 @@ def get_run_dirs(work_dir):
     return run_dirs
 
 
-def run_rewrite_results(work_dir, results_yaml):
+RESULTS_INDEX_FILE = 'results_index.db'
+
+
+def _get_file_stat(file_name):
+    try:
+        file_stat = os.stat(file_name)
+        return file_stat.st_mtime_ns, file_stat.st_size
+    except OSError:
+        return None
+    #
+
+
+def _open_results_index(work_dir):
+    # the index keeps the parsed result.yaml/config.yaml of each run_dir, keyed by the file mtime and size,
+    # so that only the new or changed run_dirs have to be parsed again.
+    index_file = os.path.join(work_dir, RESULTS_INDEX_FILE)
+    try:
+        connection = sqlite3.connect(index_file, timeout=60)
+        connection.execute('CREATE TABLE IF NOT EXISTS runs (run_dir TEXT PRIMARY KEY, yaml_file TEXT, '
+                           'mtime_ns INTEGER, size INTEGER, artifact_id TEXT, result BLOB)')
+        connection.execute('CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)')
+        return connection
+    except sqlite3.Error as e:
+        print(utils.log_color('\nWARNING', 'results index could not be opened - continuing without it', f'{index_file} - {e}'))
+        return None
+    #
+
+
+def _read_result_yaml(run_dir):
+    for yaml_file in ('result.yaml', 'config.yaml'):
+        result_or_config_yaml = os.path.join(run_dir, yaml_file)
+        file_stat = _get_file_stat(result_or_config_yaml)
+        if file_stat is not None:
+            return yaml_file, file_stat
+        #
+    #
+    return None, None
+
+
+def run_rewrite_results(work_dir, results_yaml, use_index=True):
     run_dirs = get_run_dirs(work_dir)
+    connection = _open_results_index(work_dir) if use_index else None
+    indexed_runs = dict()
+    if connection is not None:
+        for row in connection.execute('SELECT run_dir, yaml_file, mtime_ns, size, artifact_id, result FROM runs'):
+            indexed_runs[row[0]] = row[1:]
+        #
+    #
     results = {}
+    index_changed = False
     for run_dir in run_dirs:
-        result_yaml = os.path.join(run_dir, 'result.yaml')
-        config_yaml = os.path.join(run_dir, 'config.yaml')
-        result_or_config_yaml = None
-        if os.path.exists(result_yaml):
-            result_or_config_yaml = result_yaml
-        elif os.path.exists(config_yaml):
-            result_or_config_yaml = config_yaml
+        run_dir_basename = os.path.basename(run_dir)
+        yaml_file, file_stat = _read_result_yaml(run_dir)
+        if yaml_file is None:
+            continue
         #
-        if result_or_config_yaml:
-            with open(result_or_config_yaml) as fp:
-                result = yaml.safe_load(fp)
-                model_id = result['session']['model_id']
-                session_name = result['session']['session_name']
-                artifact_id = f'{model_id}_{session_name}'
-                results[artifact_id] = result
-            #
+        indexed_run = indexed_runs.pop(run_dir_basename, None)
+        if indexed_run is not None and indexed_run[:3] == (yaml_file, *file_stat):
+            artifact_id = indexed_run[3]
+            results[artifact_id] = pickle.loads(indexed_run[4])
+            continue
+        #
+        with open(os.path.join(run_dir, yaml_file)) as fp:
+            result = yaml.safe_load(fp)
+            model_id = result['session']['model_id']
+            session_name = result['session']['session_name']
+            artifact_id = f'{model_id}_{session_name}'
+            results[artifact_id] = result
+        #
+        if connection is not None:
+            connection.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?)',
+                               (run_dir_basename, yaml_file, *file_stat, artifact_id, pickle.dumps(result)))
         #
+        index_changed = True
     #
     results = utils.sorted_dict(results)
+    if connection is not None:
+        # run_dirs that do not exist any more
+        for run_dir_basename in indexed_runs.keys():
+            connection.execute('DELETE FROM runs WHERE run_dir = ?', (run_dir_basename,))
+            index_changed = True
+        #
+        # results_yaml need not be written again if neither the run_dirs nor results_yaml have changed
+        row = connection.execute("SELECT value FROM info WHERE key = 'results_yaml_stat'").fetchone()
+        results_yaml_stat = _get_file_stat(results_yaml)
+        if not index_changed and results_yaml_stat is not None and row is not None and row[0] == str(results_yaml_stat):
+            connection.close()
+            return results
+        #
+    #
     with open(results_yaml, 'w') as rfp:
         yaml.safe_dump(results, rfp)
     #
+    if connection is not None:
+        connection.execute("INSERT OR REPLACE INTO info VALUES ('results_yaml_stat', ?)", (str(_get_file_stat(results_yaml)),))
+        connection.commit()
+        connection.close()
+    #
     return results
 
 
@@ -101,23 +175,26 @@ def run_report(settings, rewrite_results=True, skip_pattern=None):
     for work_id, work_dir in enumerate(work_dirs):
         results_yaml = os.path.join(work_dir, 'results.yaml')
         # generate results.yaml, aggregating results from all the artifacts across all work_dirs.
+        results = None
         if rewrite_results:
-            run_rewrite_results(work_dir, results_yaml)
+            results = run_rewrite_results(work_dir, results_yaml)
         #
         work_dir_splits = os.path.normpath(work_dir).split(os.sep)
         run_dirs = get_run_dirs(work_dir)
         work_dir_key = '_'.join(work_dir_splits[-2:])
         if skip_pattern is None or skip_pattern not in work_dir_key:
-            with open(results_yaml) as rfp:
-                results = yaml.safe_load(rfp)
-                results_collection[work_dir_key] = results
-                if len(run_dirs) > work_dir_results_max_len:
-                    work_dir_results_max_len = len(run_dirs)
-                    work_dir_results_max_id = work_id
-                    work_dir_results_max_name = work_dir_key
-                    work_dir_results_max_path = work_dir
+            if results is None:
+                with open(results_yaml) as rfp:
+                    results = yaml.safe_load(rfp)
                 #
             #
+            results_collection[work_dir_key] = results
+            if len(run_dirs) > work_dir_results_max_len:
+                work_dir_results_max_len = len(run_dirs)
+                work_dir_results_max_id = work_id
+                work_dir_results_max_name = work_dir_key
+                work_dir_results_max_path = work_dir
+            #
             work_dir_keys.append(work_dir_key)
         #
     #
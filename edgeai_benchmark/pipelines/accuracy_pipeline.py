@@ -30,12 +30,36 @@ import os
 import sys
 import copy
 import yaml
+import pickle
+import numpy as np
 import time
 import itertools
+import functools
+import collections
+import multiprocessing
+import concurrent.futures
 from .. import utils, constants
 from .base_pipeline import BasePipeline
 
 
+# state of the worker processes used for prefetch_mode='process'
+# these are inherited by fork and are not pickled
+_prefetch_worker_state = {}
+
+
+def _prefetch_worker_init(dataset, preprocess, info_dict_init):
+    _prefetch_worker_state['dataset'] = dataset
+    _prefetch_worker_state['preprocess'] = preprocess
+    _prefetch_worker_state['info_dict_init'] = info_dict_init
+
+
+def _prefetch_worker(data_index):
+    info_dict = dict(_prefetch_worker_state['info_dict_init'])
+    data = _prefetch_worker_state['dataset'][data_index]
+    data, info_dict = _prefetch_worker_state['preprocess'](data, info_dict)
+    return data, info_dict
+
+
 class AccuracyPipeline(BasePipeline):
     def __init__(self, settings, pipeline_config):
         super().__init__(settings, pipeline_config)
@@ -108,12 +132,17 @@ class AccuracyPipeline(BasePipeline):
                 #
             #
 
+            # the checkpoint of an earlier inference is not valid with the new artifacts
+            self._remove_infer_checkpoint()
             start_time = time.time()
             self.write_log(utils.log_color('\nINFO', f'import {description}', self.run_dir_base + ' - this may take some time...'))
             # import stats
             self._import_model(description)
             elapsed_time = time.time() - start_time
             self.write_log(utils.log_color('\nINFO', f'import completed {description}', f'{self.run_dir_base} - {elapsed_time:.0f} sec'))
+            if self.settings.enable_logging:
+                self.write_run_stats(import_time=elapsed_time)
+            #
 
             # collect the input params
             param_dict = utils.pretty_object(self.pipeline_config)
@@ -139,6 +168,9 @@ class AccuracyPipeline(BasePipeline):
             elapsed_time = time.time() - start_time
             self.write_log(utils.log_color('\nINFO', f'infer completed {description}', f'{self.run_dir_base} - {elapsed_time:.0f} sec'))
             result_dict = self._evaluate(output_list)
+            if self.settings.enable_logging:
+                self.write_run_stats(infer_time=time.time() - start_time)
+            #
             # collect the results
             result_dict.update(self.infer_stats_dict)
             result_dict = utils.pretty_object(result_dict)
@@ -151,6 +183,7 @@ class AccuracyPipeline(BasePipeline):
                     yaml.safe_dump(param_result, fp, sort_keys=False)
                 #
             #
+            self._remove_infer_checkpoint()
         #
         return param_result
 
@@ -197,39 +230,57 @@ class AccuracyPipeline(BasePipeline):
         subgraph_time = 0.0
         ddr_transfer = 0.0
         num_frames_ddr = 0
+        stats_dict = None
 
         output_list = []
-        pbar_desc = f'infer {description}: {run_dir_base}'
-        for data_index in utils.progress_step(range(num_frames), desc=pbar_desc, file=self.logger, position=0):
-            info_dict = {'dataset_info': self.dataset_info, 'label_offset_pred': self.pipeline_config.get('metric',{}).get('label_offset_pred',None)}
-            data = input_dataset[data_index]
-            data, info_dict = preprocess(data, info_dict)
-            output, info_dict = self._run_with_log(session.infer_frame, data, info_dict)
-            invoke_time += info_dict['session_invoke_time']
-
-            stats_dict = session.infer_stats()
-            core_time += stats_dict['core_time']
-            subgraph_time += stats_dict['subgraph_time']
-            if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
-                ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
-                num_frames_ddr += 1
-           
-            if self.settings.flip_test:
-                outputs_flip, info_dict = self._run_with_log(session.infer_frame, info_dict['flip_img'], info_dict)
-                info_dict['outputs_flip'] = outputs_flip
-                invoke_time += info_dict['session_invoke_time']
+        # resume from the checkpoint of an interrupted inference
+        checkpoint_frames = self.settings.get('infer_checkpoint_frames', None)
+        checkpoint_key = dict(num_frames=num_frames, flip_test=bool(self.settings.flip_test))
+        checkpoint_state = self._read_infer_checkpoint(checkpoint_key) \
+            if checkpoint_frames and self.settings.run_missing else None
+        if checkpoint_state is not None:
+            checkpoint_state, output_list = checkpoint_state
+            invoke_time = checkpoint_state['invoke_time']
+            core_time = checkpoint_state['core_time']
+            subgraph_time = checkpoint_state['subgraph_time']
+            ddr_transfer = checkpoint_state['ddr_transfer']
+            num_frames_ddr = checkpoint_state['num_frames_ddr']
+            stats_dict = checkpoint_state['stats_dict']
+            self.write_log(utils.log_color('\nINFO', 'resuming inference', f'{run_dir_base} - from frame {len(output_list)}'))
+        elif checkpoint_frames:
+            self._remove_infer_checkpoint()
+            checkpoint_state = dict(checkpoint_key=checkpoint_key, frame_index=0, data_size=0)
+        #
+        start_frame = len(output_list)
 
-                stats_dict = session.infer_stats()
+        # frames are read and preprocessed ahead of the session if prefetch_frames is set
+        frames_iter = self._preprocess_frames(input_dataset, preprocess, num_frames, start_frame)
+        pbar_desc = f'infer {description}: {run_dir_base}'
+        frame_indices = range(start_frame, num_frames)
+        if len(frame_indices) > 0:
+            frame_indices = utils.progress_step(frame_indices, desc=pbar_desc, file=self.logger, position=0)
+        #
+        infer_iter = self._infer_session_frames(session, frames_iter, len(frame_indices))
+        for data_index in frame_indices:
+            output, info_dict, infer_info_list = next(infer_iter)
+            for (frame_invoke_time, stats_dict) in infer_info_list:
+                invoke_time += frame_invoke_time
                 core_time += stats_dict['core_time']
                 subgraph_time += stats_dict['subgraph_time']
                 if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
                     ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
                     num_frames_ddr += 1
-            else:
-                info_dict['outputs_flip'] = None
-
+                #
+            #
             output, info_dict = postprocess(output, info_dict)
+            output = self._detach_output(output, session.get_output_buffers())
             output_list.append(output)
+
+            if checkpoint_frames and ((data_index+1) % checkpoint_frames == 0 or (data_index+1) == num_frames):
+                checkpoint_state.update(invoke_time=invoke_time, core_time=core_time, subgraph_time=subgraph_time,
+                    ddr_transfer=ddr_transfer, num_frames_ddr=num_frames_ddr, stats_dict=stats_dict)
+                self._write_infer_checkpoint(checkpoint_state, output_list)
+            #
         #
         # compute and populate final stats so that it can be used in result
         self.infer_stats_dict = {
@@ -248,10 +299,237 @@ class AccuracyPipeline(BasePipeline):
         if 'perfsim_macs' in stats_dict:
             self.infer_stats_dict.update({'perfsim_gmacs': stats_dict['perfsim_macs'] / constants.GIGA_CONST})
         #
+        infer_iter.close()
+        frames_iter.close()
         # close the interpreter
         session.close_interpreter()
         return output_list
 
+    def _infer_session_frames(self, session, frames_iter, num_frames):
+        '''
+        generator that yields (output, info_dict, infer_info_list) for each of the frames from frames_iter - in the same order.
+        infer_info_list has (invoke_time, stats_dict) of each inference of the frame (two of them with flip_test).
+        if the session has more than one infer_requests, up to that many frames are submitted to session.infer_frame_async()
+        ahead of the postprocess of the earlier frames. a batch_size above 1 in the session takes precedence over that.
+        '''
+        batch_size = session.get_param('batch_size')
+        if batch_size > 1:
+            yield from self._infer_session_batches(session, frames_iter, num_frames, batch_size)
+            return
+        #
+        infer_requests = session.get_param('infer_requests')
+        if infer_requests <= 1:
+            for _ in range(num_frames):
+                data, info_dict = next(frames_iter)
+                output, info_dict = self._run_with_log(session.infer_frame, data, info_dict)
+                infer_info_list = [(info_dict['session_invoke_time'], session.infer_stats())]
+                if self.settings.flip_test:
+                    # the outputs may be in buffers of the session that are overwritten by the next infer_frame
+                    output = self._detach_output(output, session.get_output_buffers())
+                    outputs_flip, info_dict = self._run_with_log(session.infer_frame, info_dict['flip_img'], info_dict)
+                    # info_dict (and so outputs_flip) is kept by the postprocess and is still alive at the next infer_frame
+                    info_dict['outputs_flip'] = self._detach_output(outputs_flip, session.get_output_buffers())
+                    del outputs_flip
+                    infer_info_list.append((info_dict['session_invoke_time'], session.infer_stats()))
+                else:
+                    info_dict['outputs_flip'] = None
+                #
+                yield output, info_dict, infer_info_list
+                # a reference into the buffers of the session that is alive at the next infer_frame may be overwritten
+                # by it - or may even make it fail (eg. tflite) - so the ones held here are released.
+                del output, info_dict
+            #
+            return
+        #
+        pending_frames = collections.deque()
+        submit_index = 0
+        try:
+            for _ in range(num_frames):
+                # keep up to infer_requests frames in flight
+                while submit_index < num_frames and len(pending_frames) < infer_requests:
+                    data, info_dict = next(frames_iter)
+                    output_future = session.infer_frame_async(data, info_dict, run_with=self._run_with_log)
+                    # the flipped frame has an info_dict of its own - infer_frame writes its invoke time and stats into it
+                    flip_future = session.infer_frame_async(info_dict['flip_img'], {}, run_with=self._run_with_log) \
+                        if self.settings.flip_test else None
+                    pending_frames.append((output_future, flip_future))
+                    submit_index += 1
+                #
+                output_future, flip_future = pending_frames.popleft()
+                output, info_dict = output_future.result()
+                infer_info_list = [(info_dict['session_invoke_time'], info_dict['session_infer_stats'])]
+                if flip_future is not None:
+                    outputs_flip, flip_info_dict = flip_future.result()
+                    info_dict['outputs_flip'] = outputs_flip
+                    infer_info_list.append((flip_info_dict['session_invoke_time'], flip_info_dict['session_infer_stats']))
+                else:
+                    info_dict['outputs_flip'] = None
+                #
+                yield output, info_dict, infer_info_list
+            #
+        finally:
+            for pending_frame in pending_frames:
+                for future in pending_frame:
+                    if future is not None:
+                        future.cancel()
+                    #
+                #
+            #
+        #
+
+    def _infer_session_batches(self, session, frames_iter, num_frames, batch_size):
+        # same as _infer_session_frames, but the frames are given to session.infer_batch() in batches of batch_size
+        for batch_start in range(0, num_frames, batch_size):
+            frames = [next(frames_iter) for _ in range(min(batch_size, num_frames-batch_start))]
+            info_dicts = [info_dict for (_, info_dict) in frames]
+            outputs_list, info_dicts = self._run_with_log(session.infer_batch, [data for (data, _) in frames], info_dicts)
+            if self.settings.flip_test:
+                # the flipped frames have info_dicts of their own - infer_batch writes the invoke time and stats into them
+                flip_info_dicts = [{} for _ in frames]
+                outputs_flip_list, flip_info_dicts = self._run_with_log(session.infer_batch,
+                    [info_dict['flip_img'] for info_dict in info_dicts], flip_info_dicts)
+            else:
+                outputs_flip_list = flip_info_dicts = [None] * len(frames)
+            #
+            for (output, info_dict, outputs_flip, flip_info_dict) in \
+                    zip(outputs_list, info_dicts, outputs_flip_list, flip_info_dicts):
+                infer_info_list = [(info_dict['session_invoke_time'], info_dict['session_infer_stats'])]
+                if flip_info_dict is not None:
+                    infer_info_list.append((flip_info_dict['session_invoke_time'], flip_info_dict['session_infer_stats']))
+                #
+                info_dict['outputs_flip'] = outputs_flip
+                yield output, info_dict, infer_info_list
+            #
+        #
+
+    def _detach_output(self, output, output_buffers):
+        # the arrays that share memory with the reused buffers of the session are copied - the others are kept as they are
+        if len(output_buffers) == 0:
+            return output
+        elif isinstance(output, np.ndarray):
+            return output.copy() if any(np.may_share_memory(output, b) for b in output_buffers) else output
+        elif type(output) in (list, tuple):
+            return type(output)(self._detach_output(o, output_buffers) for o in output)
+        elif type(output) is dict:
+            return {k: self._detach_output(v, output_buffers) for k, v in output.items()}
+        else:
+            return output
+        #
+
+    def _get_infer_checkpoint_files(self):
+        return os.path.join(self.run_dir, constants.INFER_CHECKPOINT_STATE_FILE), \
+            os.path.join(self.run_dir, constants.INFER_CHECKPOINT_DATA_FILE)
+
+    def _read_infer_checkpoint(self, checkpoint_key):
+        state_file, data_file = self._get_infer_checkpoint_files()
+        if not (os.path.exists(state_file) and os.path.exists(data_file)):
+            return None
+        #
+        try:
+            with open(state_file, 'rb') as fp:
+                checkpoint_state = pickle.load(fp)
+            #
+            if checkpoint_state['checkpoint_key'] != checkpoint_key:
+                return None
+            #
+            output_list = []
+            with open(data_file, 'r+b') as fp:
+                # anything written after the last checkpoint state is discarded
+                fp.truncate(checkpoint_state['data_size'])
+                while fp.tell() < checkpoint_state['data_size']:
+                    output_list.extend(pickle.load(fp))
+                #
+            #
+        except Exception as e:
+            self.write_log(utils.log_color('\nWARNING', 'could not read the inference checkpoint', str(e)))
+            return None
+        #
+        if len(output_list) != checkpoint_state['frame_index']:
+            return None
+        #
+        return checkpoint_state, output_list
+
+    def _write_infer_checkpoint(self, checkpoint_state, output_list):
+        state_file, data_file = self._get_infer_checkpoint_files()
+        # only the outputs after the previous checkpoint are appended to the data file
+        with open(data_file, 'ab') as fp:
+            pickle.dump(output_list[checkpoint_state['frame_index']:], fp, protocol=pickle.HIGHEST_PROTOCOL)
+            fp.flush()
+            os.fsync(fp.fileno())
+            data_size = fp.tell()
+        #
+        checkpoint_state.update(frame_index=len(output_list), data_size=data_size)
+        # the state is replaced atomically - it always refers to complete outputs in the data file
+        with open(f'{state_file}.tmp', 'wb') as fp:
+            pickle.dump(checkpoint_state, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            fp.flush()
+            os.fsync(fp.fileno())
+        #
+        os.replace(f'{state_file}.tmp', state_file)
+
+    def _remove_infer_checkpoint(self):
+        for checkpoint_file in self._get_infer_checkpoint_files():
+            if os.path.exists(checkpoint_file):
+                os.remove(checkpoint_file)
+            #
+        #
+
+    def _get_info_dict_init(self):
+        return {'dataset_info': self.dataset_info, 'label_offset_pred': self.pipeline_config.get('metric',{}).get('label_offset_pred',None)}
+
+    def _preprocess_frame(self, dataset, preprocess, data_index):
+        info_dict = self._get_info_dict_init()
+        data = dataset[data_index]
+        data, info_dict = preprocess(data, info_dict)
+        return data, info_dict
+
+    def _preprocess_frames(self, dataset, preprocess, num_frames, start_frame=0):
+        '''
+        generator that yields (data, info_dict) for each frame from start_frame - always in the order of data_index.
+        if settings.prefetch_frames is set, up to that many frames are read and preprocessed
+        ahead of the session in a pool of threads or processes (settings.prefetch_mode),
+        so that image decode and resize can overlap with the inference.
+        '''
+        prefetch_frames = self.settings.get('prefetch_frames', None)
+        if not prefetch_frames:
+            for data_index in range(start_frame, num_frames):
+                yield self._preprocess_frame(dataset, preprocess, data_index)
+            #
+            return
+        #
+        prefetch_workers = self.settings.get('prefetch_workers', None) or \
+            min(prefetch_frames, multiprocessing.cpu_count())
+        prefetch_mode = self.settings.get('prefetch_mode', None) or 'thread'
+        if prefetch_mode == 'thread':
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=prefetch_workers)
+            prefetch_func = functools.partial(self._preprocess_frame, dataset, preprocess)
+        elif prefetch_mode == 'process':
+            # with fork, the dataset and preprocess are inherited by the workers - only the outputs are pickled
+            mp_context = multiprocessing.get_context(method='fork')
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=prefetch_workers, mp_context=mp_context,
+                initializer=_prefetch_worker_init, initargs=(dataset, preprocess, self._get_info_dict_init()))
+            prefetch_func = _prefetch_worker
+        else:
+            assert False, f'_preprocess_frames: unknown prefetch_mode {prefetch_mode}'
+        #
+        pending_frames = collections.deque()
+        submit_index = start_frame
+        try:
+            for data_index in range(start_frame, num_frames):
+                # keep the prefetch queue filled up to prefetch_frames
+                while submit_index < num_frames and len(pending_frames) < prefetch_frames:
+                    pending_frames.append(executor.submit(prefetch_func, submit_index))
+                    submit_index += 1
+                #
+                yield pending_frames.popleft().result()
+            #
+        finally:
+            for pending_frame in pending_frames:
+                pending_frame.cancel()
+            #
+            executor.shutdown(wait=True)
+        #
+
     def _evaluate(self, output_list):
         session = self.pipeline_config['session']
         # if metric is not given use input_dataset
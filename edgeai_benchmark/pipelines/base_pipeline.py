@@ -35,6 +35,29 @@ import itertools
 from .. import utils, constants
 
 
+def read_run_stats(run_dir):
+    run_stats_yaml = os.path.join(run_dir, constants.RUN_STATS_YAML_FILE)
+    if not os.path.exists(run_stats_yaml):
+        return {}
+    #
+    try:
+        with open(run_stats_yaml) as fp:
+            return yaml.safe_load(fp) or {}
+        #
+    except Exception:
+        return {}
+    #
+
+
+def write_run_stats(run_dir, **run_stats):
+    # the stats of the previous runs are kept and only the given ones are updated
+    run_stats_dict = read_run_stats(run_dir)
+    run_stats_dict.update({k:float(v) for k, v in run_stats.items()})
+    with open(os.path.join(run_dir, constants.RUN_STATS_YAML_FILE), 'w') as fp:
+        yaml.safe_dump(run_stats_dict, fp, sort_keys=False)
+    #
+
+
 class BasePipeline():
     def __init__(self, settings, pipeline_config):
         self.info_dict = dict()
@@ -80,6 +103,9 @@ class BasePipeline():
             self.logger = None
         #
 
+    def write_run_stats(self, **run_stats):
+        write_run_stats(self.run_dir, **run_stats)
+
     def write_log(self, message):
         if self.logger is not None:
             self.logger.write(message)
@@ -26,17 +26,23 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
 import sys
+import time
+import socket
 import functools
 import itertools
 import warnings
-import copy
 import traceback
+import statistics
+import yaml
 
+from .. import constants
 from .. import utils
 from .. import datasets
 from .model_transformation import *
 from .accuracy_pipeline import *
+from .base_pipeline import read_run_stats, write_run_stats
 from .gen_config_pipeline import *
 from .. import preprocess
 
@@ -53,10 +59,6 @@ class PipelineRunner():
         for model_id, pipeline_config in pipeline_configs.items():
             # set model_id in each config
             pipeline_config['session'].set_param('model_id', model_id)
-            session = pipeline_config['session']
-            # call initialize() on each pipeline_config so that run_dir,
-            # artifacts folder and such things are initialized
-            session.initialize()
             # get the meta params if it is present and populate model_info - this is just for information
             # commenting out, as this add additional python package dependency
             # od_meta_names_key = 'object_detection:meta_layers_names_list'
@@ -100,6 +102,11 @@ class PipelineRunner():
         if self.settings.config_range is not None:
             pipelines_selected = dict(itertools.islice(pipelines_selected.items(), *self.settings.config_range))
         #
+        # call initialize() on each selected pipeline_config so that run_dir,
+        # artifacts folder and such things are initialized
+        for pipeline_key, pipeline_config in pipelines_selected.items():
+            pipeline_config['session'].initialize()
+        #
         if self.settings.model_transformation_dict is not None:
             pipelines_selected = model_transformation(self.settings, pipelines_selected)
         #
@@ -116,36 +123,106 @@ class PipelineRunner():
         for pipeline_key, pipeline_config in pipelines_selected.items():
             if isinstance(pipeline_config['calibration_dataset'], str):
                 dataset_category_name = pipeline_config['calibration_dataset']
-                pipeline_config['calibration_dataset'] = copy.deepcopy(self.settings.dataset_cache[dataset_category_name]['calibration_dataset'])
+                pipeline_config['calibration_dataset'] = datasets.get_dataset_view(self.settings.dataset_cache[dataset_category_name]['calibration_dataset'])
             #
             if isinstance(pipeline_config['input_dataset'], str):
                 dataset_category_name = pipeline_config['input_dataset']
-                pipeline_config['input_dataset'] = copy.deepcopy(self.settings.dataset_cache[dataset_category_name]['input_dataset'])
+                pipeline_config['input_dataset'] = datasets.get_dataset_view(self.settings.dataset_cache[dataset_category_name]['input_dataset'])
             #
         #
         return pipelines_selected
 
     def run(self):
-        if self.settings.parallel_processes in (None, 0):
+        if self.settings.work_sharing:
+            return self._run_pipelines_shared()
+        elif self.settings.parallel_processes in (None, 0):
             return self._run_pipelines_sequential()
         else:
             return self._run_pipelines_parallel()
         #
 
-    def _run_pipelines_sequential(self):
+    def _run_pipelines_sequential(self, pipeline_configs=None, run_pipeline_func=None):
+        pipeline_configs = pipeline_configs if pipeline_configs is not None else self.pipeline_configs
+        run_pipeline_func = run_pipeline_func or self._run_pipeline
         # get the cwd so that we can continue even if exception occurs
         cwd = os.getcwd()
         results_list = []
-        total = len(self.pipeline_configs)
-        for pipeline_id, pipeline_config in enumerate(self.pipeline_configs.values()):
+        total = len(pipeline_configs)
+        for pipeline_id, pipeline_config in enumerate(pipeline_configs.values()):
             os.chdir(cwd)
             description = f'{pipeline_id+1}/{total}' if total > 1 else ''
-            result = self._run_pipeline(self.settings, pipeline_config, description=description)
+            result = run_pipeline_func(self.settings, pipeline_config, description=description)
             results_list.append(result)
         #
         return results_list
 
-    def _run_pipelines_parallel(self):
+    def _run_pipelines_shared(self):
+        # several hosts share the pipelines of this run - each pipeline (or each stage of it) is claimed by one host
+        # using a lease file. the pipelines that are not yet done are run in passes - a pass runs those that are
+        # not held by other hosts. the leases of dead hosts expire and their pipelines are run in a later pass.
+        if len(self.pipeline_configs) == 0:
+            return []
+        #
+        work_dir = os.path.dirname(list(self.pipeline_configs.values())[0]['session'].get_param('run_dir'))
+        lease_dir = os.path.join(work_dir, '.work_sharing', str(self.settings.work_sharing))
+        work_sharing = utils.WorkSharing(lease_dir, lease_timeout=self.settings.work_sharing_lease_timeout)
+        run_pipeline_func = functools.partial(self._run_pipeline_shared, work_sharing)
+        pipeline_stages = ['import', 'infer'] if self._get_split_stages() else [None]
+        results_list = []
+        while True:
+            pending_configs = {}
+            claimable_configs = {}
+            for pipeline_id, pipeline_config in self.pipeline_configs.items():
+                work_keys = [self._get_work_key(self.settings, pipeline_config, stage) for stage in pipeline_stages]
+                if not all(work_sharing.is_done(work_key) for work_key in work_keys):
+                    pending_configs[pipeline_id] = pipeline_config
+                #
+                if any(work_sharing.is_claimable(work_key) for work_key in work_keys):
+                    claimable_configs[pipeline_id] = pipeline_config
+                #
+            #
+            if len(pending_configs) == 0:
+                break
+            #
+            if len(claimable_configs) > 0:
+                if self.settings.parallel_processes in (None, 0):
+                    pass_results = self._run_pipelines_sequential(claimable_configs, run_pipeline_func)
+                else:
+                    pass_results = self._run_pipelines_parallel(claimable_configs, run_pipeline_func)
+                #
+                # the pipelines that were done or held by other hosts are not included
+                pass_results = [result for result in pass_results if result and not 'work_sharing' in result]
+                results_list.extend(pass_results)
+            else:
+                pass_results = []
+            #
+            if len(pass_results) == 0:
+                # wait for the other hosts to complete or for their leases to expire
+                time.sleep(work_sharing.poll_interval)
+            #
+        #
+        return results_list
+
+    def _get_split_stages(self):
+        # import and inference of a model can be run as separate tasks, so that the import of one model
+        # can overlap with the inference of another - each stage with its own limit on the number of processes.
+        # they are also run as separate tasks if a timeout is given, so that the limit of each stage is enforced on its own
+        split_stages = bool(self.settings.parallel_stage_processes) or \
+            self.settings.parallel_import_timeout is not None or self.settings.parallel_infer_timeout is not None
+        return self.settings.parallel_processes not in (None, 0) and split_stages and \
+            self.settings.run_import and self.settings.run_inference
+
+    @classmethod
+    def _get_work_key(cls, settings, pipeline_config, stage=None):
+        run_dir_base = os.path.basename(pipeline_config['session'].get_param('run_dir'))
+        if stage is None and not (settings.run_import and settings.run_inference):
+            stage = 'import' if settings.run_import else 'infer'
+        #
+        return f'{run_dir_base}.{stage}' if stage is not None else run_dir_base
+
+    def _run_pipelines_parallel(self, pipeline_configs=None, run_pipeline_func=None):
+        pipeline_configs = pipeline_configs if pipeline_configs is not None else self.pipeline_configs
+        run_pipeline_func = run_pipeline_func or self._run_pipeline
         if self.settings.parallel_devices in (None, 0):
             parallel_devices = [0]
         else:
@@ -154,17 +231,147 @@ class PipelineRunner():
         #
         cwd = os.getcwd()
         description = 'TASKS'
+        memory_limit = self.settings.parallel_memory_limit * constants.GIGA_CONST \
+            if self.settings.parallel_memory_limit else None
+        split_stages = self._get_split_stages()
+        if split_stages:
+            stage_settings_dict = {'import': self.settings.basic_settings(), 'infer': self.settings.basic_settings()}
+            stage_settings_dict['import'].run_inference = False
+            stage_settings_dict['infer'].run_import = False
+            pipeline_stages = ['import', 'infer']
+        else:
+            stage_settings_dict = {None: self.settings}
+            pipeline_stages = [None]
+        #
+        pipeline_configs = list(pipeline_configs.values())
+        # the result of each task is appended to this file as soon as it completes - the records of each run
+        # follow a header with the run_id of that run, as the file is kept across runs
+        summary_file = None
+        if self.settings.enable_logging and len(pipeline_configs) > 0:
+            work_dir = os.path.dirname(pipeline_configs[0]['session'].get_param('run_dir'))
+            os.makedirs(work_dir, exist_ok=True)
+            # with work_sharing, the work_dir is shared by several hosts - each of them writes its own summary
+            summary_name = f'run_summary_{socket.gethostname()}.yaml' if self.settings.work_sharing else 'run_summary.yaml'
+            summary_file = os.path.join(work_dir, summary_name)
+        #
         parallel_exec = utils.ParallelRun(parallel_processes=self.settings.parallel_processes, parallel_devices=parallel_devices,
-                                          desc=description)
-        for pipeline_index, pipeline_config in enumerate(self.pipeline_configs.values()):
-            os.chdir(cwd)
-            run_pipeline_bound_func = functools.partial(self._run_pipeline, self.settings, pipeline_config,
-                                                        description='')
-            parallel_exec.enqueue(run_pipeline_bound_func)
+                                          desc=description, mode=self.settings.parallel_mode,
+                                          max_tasks_per_worker=self.settings.parallel_max_tasks_per_worker,
+                                          memory_limit=memory_limit,
+                                          stage_processes=(self.settings.parallel_stage_processes if split_stages else None),
+                                          summary_file=summary_file, summary_filter=self._is_summary_result,
+                                          max_retries=self.settings.parallel_max_retries,
+                                          retry_backoff=self.settings.parallel_retry_backoff)
+        if self.settings.parallel_cost_ordering:
+            # ParallelRun takes the tasks from the end of the queue - so the longest tasks are queued last
+            pipeline_costs = self._get_pipeline_costs(pipeline_configs)
+            pipeline_configs = [pipeline_configs[i] for i in sorted(range(len(pipeline_configs)), key=lambda i:pipeline_costs[i])]
+        #
+        # the tasks of all the models are queued stage by stage - the inference tasks (queued last) are taken first,
+        # when their import has completed.
+        stage_task_ids = {}
+        for stage in pipeline_stages:
+            stage_task_ids[stage] = []
+            for pipeline_index, pipeline_config in enumerate(pipeline_configs):
+                os.chdir(cwd)
+                run_pipeline_bound_func = functools.partial(run_pipeline_func, stage_settings_dict[stage], pipeline_config,
+                                                            description='')
+                # peak memory learnt from the previous runs of this model
+                run_stats = read_run_stats(pipeline_config['session'].get_param('run_dir'))
+                peak_memory_mb = run_stats.get(self._get_peak_memory_key(stage), None) or run_stats.get('peak_memory_mb', None)
+                peak_memory = peak_memory_mb * constants.MEGA_CONST if peak_memory_mb is not None else None
+                depends_on = [stage_task_ids['import'][pipeline_index]] if stage == 'infer' else None
+                run_dir_base = os.path.basename(pipeline_config['session'].get_param('run_dir'))
+                task_id = parallel_exec.enqueue(run_pipeline_bound_func, memory=peak_memory, stage=stage, depends_on=depends_on,
+                                                name=run_dir_base, timeout=self._get_pipeline_timeout(stage))
+                stage_task_ids[stage].append(task_id)
+            #
         #
         results_list = parallel_exec.run()
+        # record the peak memory, to be used in the next runs
+        for stage in pipeline_stages:
+            for pipeline_config, task_id in zip(pipeline_configs, stage_task_ids[stage]):
+                run_dir = pipeline_config['session'].get_param('run_dir')
+                peak_memory = parallel_exec.task_peak_memory[task_id]
+                if peak_memory is not None and os.path.isdir(run_dir):
+                    write_run_stats(run_dir, **{self._get_peak_memory_key(stage): peak_memory / constants.MEGA_CONST})
+                #
+            #
+        #
+        if split_stages:
+            # one result per model - that of the inference stage
+            results_list = [parallel_exec.task_results[task_id] for task_id in stage_task_ids['infer']]
+        #
         return results_list
 
+    def _get_pipeline_timeout(self, stage):
+        stage_timeouts = {'import': self.settings.parallel_import_timeout, 'infer': self.settings.parallel_infer_timeout}
+        if stage is None:
+            # the stages are not split only if one of them is run - see _get_split_stages()
+            stage = 'import' if self.settings.run_import else ('infer' if self.settings.run_inference else None)
+        #
+        return stage_timeouts[stage] if stage is not None else None
+
+    @staticmethod
+    def _is_summary_result(result):
+        # the pipelines that were done or are held by other hosts (with work_sharing) were not run here
+        return not (isinstance(result, dict) and 'work_sharing' in result)
+
+    def _get_peak_memory_key(self, stage):
+        return f'{stage}_peak_memory_mb' if stage is not None else 'peak_memory_mb'
+
+    def _get_pipeline_costs(self, pipeline_configs):
+        # estimated cost of each pipeline - the import and infer durations recorded in the previous runs are used.
+        # if they are not available, the perfsim gmacs or model file size are used - scaled to seconds
+        # using the pipelines that have both.
+        durations = [self._get_pipeline_duration(pipeline_config) for pipeline_config in pipeline_configs]
+        heuristics = [self._get_pipeline_heuristic(pipeline_config) for pipeline_config in pipeline_configs]
+        heuristic_scale = {}
+        for heuristic_type in ('perfsim_gmacs', 'model_size'):
+            ratios = [d/h[1] for d, h in zip(durations, heuristics) if d is not None and h[0] == heuristic_type and h[1] > 0]
+            heuristic_scale[heuristic_type] = statistics.median(ratios) if len(ratios) > 0 else None
+        #
+        default_scale = statistics.median([s for s in heuristic_scale.values() if s is not None] or [1.0])
+        pipeline_costs = []
+        for duration, (heuristic_type, heuristic_value) in zip(durations, heuristics):
+            if duration is None:
+                scale = heuristic_scale.get(heuristic_type, None) or default_scale
+                duration = heuristic_value * scale
+            #
+            pipeline_costs.append(duration)
+        #
+        return pipeline_costs
+
+    def _get_pipeline_duration(self, pipeline_config):
+        durations_dict = read_run_stats(pipeline_config['session'].get_param('run_dir'))
+        duration_keys = (['import_time'] if self.settings.run_import else []) + \
+                        (['infer_time'] if self.settings.run_inference else [])
+        if not all(k in durations_dict for k in duration_keys):
+            return None
+        #
+        return sum(durations_dict[k] for k in duration_keys)
+
+    def _get_pipeline_heuristic(self, pipeline_config):
+        session = pipeline_config['session']
+        # perfsim gmacs from an earlier result, if it is present
+        result_yaml = os.path.join(session.get_param('run_dir'), 'result.yaml')
+        if os.path.exists(result_yaml):
+            try:
+                with open(result_yaml) as fp:
+                    result = (yaml.safe_load(fp) or {}).get('result', None) or {}
+                #
+                if result.get('perfsim_gmacs', None):
+                    return 'perfsim_gmacs', float(result['perfsim_gmacs'])
+                #
+            except Exception:
+                pass
+            #
+        #
+        model_path = session.get_param('model_path')
+        model_paths = model_path if isinstance(model_path, (list,tuple)) else [model_path]
+        model_size = sum(os.path.getsize(m) for m in model_paths if isinstance(m, str) and os.path.isfile(m))
+        return 'model_size', float(model_size)
+
     # this function cannot be an instance method of PipelineRunner, as it causes an
     # error during pickling, involved in the launch of a process is parallel run. make it classmethod
     @classmethod
@@ -188,6 +395,30 @@ class PipelineRunner():
         #
         return result
 
+    @classmethod
+    def _run_pipeline_shared(cls, work_sharing, settings, pipeline_config, description=''):
+        work_key = cls._get_work_key(settings, pipeline_config)
+        if work_sharing.is_done(work_key):
+            return {'work_sharing': 'done'}
+        #
+        if settings.run_inference and not settings.run_import:
+            # the import of this model may still be running on another host - its inference has to wait till it is done
+            import_key = cls._get_work_key(settings, pipeline_config, 'import')
+            if not work_sharing.is_done(import_key) and not work_sharing.is_claimable(import_key):
+                return {'work_sharing': 'held'}
+            #
+        #
+        work_lease = work_sharing.claim(work_key)
+        if work_lease is None:
+            # held by another host
+            return {'work_sharing': 'held'}
+        #
+        with work_lease:
+            result = cls._run_pipeline(settings, pipeline_config, description)
+            work_lease.set_done('done' if result else 'failed')
+        #
+        return result
+
     @classmethod
     def _run_pipeline(cls, settings, pipeline_config, description=''):
         # note that this basic_settings() copies only the basic settings.
@@ -224,10 +455,11 @@ class PipelineRunner():
         return any_match_fully
 
     def _check_model_selection(self, settings, pipeline_config):
-        model_path = pipeline_config['session'].get_param('model_path')
-        model_id = pipeline_config['session'].get_param('model_id')
+        # the session is not initialized yet - only the params given in the config are used here
+        model_path = pipeline_config['session'].peek_param('model_path')
+        model_id = pipeline_config['session'].peek_param('model_id')
         model_path0 = model_path[0] if isinstance(model_path, (list,tuple)) else model_path
-        model_type = pipeline_config['session'].get_param('model_type')
+        model_type = pipeline_config['session'].peek_param('model_type')
         model_type = model_type or os.path.splitext(model_path0)[1][1:]
         selected_model = True
         if settings.runtime_selection is not None:
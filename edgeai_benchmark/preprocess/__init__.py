@@ -51,15 +51,16 @@ class PreProcessTransforms(utils.TransformsCompose):
     def get_transform_base(self, resize, crop, data_layout, reverse_channels,
                          backend, interpolation, resize_with_pad,
                          add_flip_image=False, pad_color=0):
+        image_store_path = self.settings.image_store_path if self.settings is not None else None
         if resize is None:
             transforms_list = [
-                ImageRead(backend=backend),                
+                ImageRead(backend=backend, image_store_path=image_store_path),
                 ImageCenterCrop(crop),
                 ImageToNPTensor4D(data_layout=data_layout)
             ]
         else:
             transforms_list = [
-                ImageRead(backend=backend),
+                ImageRead(backend=backend, image_store_path=image_store_path),
                 ImageResize(resize, interpolation=interpolation, resize_with_pad=resize_with_pad, pad_color=pad_color),
                 ImageCenterCrop(crop),
                 ImageToNPTensor4D(data_layout=data_layout)
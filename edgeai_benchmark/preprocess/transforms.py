@@ -69,6 +69,7 @@ import PIL
 import cv2
 
 from PIL import Image
+from .. import utils
 from . import functional as F
 
 _pil_interpolation_to_str = {
@@ -82,26 +83,43 @@ _pil_interpolation_to_str = {
 
 
 class ImageRead(object):
-    def __init__(self, backend='pil'):
+    def __init__(self, backend='pil', image_store_path=None):
         assert backend in ('pil', 'cv2'), f'backend must be one of pil or cv2. got {backend}'
         self.backend = backend
+        # decoded images shared with the other processes on this host
+        self.image_store = utils.ImageStore(image_store_path) if image_store_path else None
 
     def __call__(self, path, info_dict):
         if isinstance(path, str):
             img_data = None
+            img_stored = self.image_store.get(path, backend=self.backend) if self.image_store is not None else None
             if self.backend == 'pil':
-                img_data = PIL.Image.open(path)
-                img_data = img_data.convert('RGB')
+                if img_stored is not None:
+                    img_data = PIL.Image.fromarray(img_stored)
+                else:
+                    img_data = PIL.Image.open(path)
+                    img_data = img_data.convert('RGB')
+                    if self.image_store is not None:
+                        self.image_store.put(path, np.asarray(img_data), backend=self.backend)
+                    #
+                #
                 info_dict['data_shape'] = img_data.size[1], img_data.size[0], len(img_data.getbands())
             elif self.backend == 'cv2':
-                img_data = cv2.imread(path)
-                if img_data.shape[-1] == 1:
-                    img_data = cv2.cvtColor(img_data, cv2.COLOR_GRAY2BGR)
-                elif img_data.shape[-1] == 4:
-                    img_data = cv2.cvtColor(img_data, cv2.COLOR_BGRA2BGR)
+                if img_stored is not None:
+                    img_data = img_stored
+                else:
+                    img_data = cv2.imread(path)
+                    if img_data.shape[-1] == 1:
+                        img_data = cv2.cvtColor(img_data, cv2.COLOR_GRAY2BGR)
+                    elif img_data.shape[-1] == 4:
+                        img_data = cv2.cvtColor(img_data, cv2.COLOR_BGRA2BGR)
+                    #
+                    # always return in RGB format
+                    img_data = img_data[:,:,::-1]
+                    if self.image_store is not None:
+                        self.image_store.put(path, img_data, backend=self.backend)
+                    #
                 #
-                # always return in RGB format
-                img_data = img_data[:,:,::-1]
                 info_dict['data_shape'] = img_data.shape
             #
             info_dict['data'] = img_data
@@ -480,195 +498,286 @@ class Voxelization(object):
         self.num_feat_per_voxel = 10
         self.num_channel = 64
         self.scale_fact = 32.0
-
+        self.input1 = None
 
     def __call__(self, lidar_data, info_dict):
 
-        scratch_2 =[]
         enable_pre_proc = True
         enable_opt_pre_proc = True
 
-        input1 = np.zeros((1, self.num_channel, (int)(self.num_voxel_x*self.num_voxel_y)),dtype='float32')
+        # input1 is all zeros and is not written to - so a single read-only array is shared across frames
+        if self.input1 is None:
+            input1 = np.zeros((1, self.num_channel, (int)(self.num_voxel_x*self.num_voxel_y)),dtype='float32')
+            input1.setflags(write=False)
+            self.input1 = input1
+        #
+        input1 = self.input1
 
         if enable_pre_proc == True:
-            input0 = np.zeros((1, self.num_feat_per_voxel, self.max_points_per_voxel, self.nw_max_num_voxels),dtype='float32')
-            input2 = np.zeros((1, self.num_channel, self.nw_max_num_voxels),dtype='int32')
+            if enable_opt_pre_proc == True:
+                input0, input2 = self._voxelize(lidar_data)
+            else:
+                input0, input2 = self._voxelize_reference(lidar_data, enable_opt_pre_proc)
+            #
+        else:
+            input0 = np.fromfile(info_dict['data_path'] + "_input0_f32.bin", dtype='float32')
+            input2 = np.fromfile(info_dict['data_path'] + "_input2_f32.bin", dtype='float32')
 
-            #start_time = time.time()
+            #np.savetxt('input2.txt', input2.flatten(), fmt='%6.2e')
+            #np.savetxt('input0.txt', input0.flatten(), fmt='%6.2e')
 
-            if enable_opt_pre_proc == False:
+            input0 = input0.astype("int32")
+            input0 = input0.astype("float32")
 
-                scratch_1 = []
-                for i, data in enumerate(lidar_data):
+            input0 = input0.reshape(1, 9, 32, 10000)
+            input2 = input2.reshape(1, 64, 10000).astype('int32')
 
-                    x = data[0]
-                    y = data[1]
-                    z = data[2]
+        return (input0,input2,input1), info_dict
 
-                    if ((x > self.min_x) and (x < self.max_x) and (y > self.min_y) and (y < self.max_y) and
-                        (z > self.min_z) and (z < self.max_z)):
+    def _voxelize(self, lidar_data):
+        # vectorized version of _voxelize_reference() that produces the same output.
+        # the points are assigned to voxels with unique/argsort and scattered in one step.
+        # input0 and input2 are not reused across frames, as several frames can be in flight (eg. with prefetch_frames)
+        input0 = np.zeros((1, self.num_feat_per_voxel, self.max_points_per_voxel, self.nw_max_num_voxels),dtype='float32')
+        input2 = np.zeros((1, self.num_channel, self.nw_max_num_voxels),dtype='int32')
+
+        x = lidar_data[:, 0]
+        y = lidar_data[:, 1]
+        z = lidar_data[:, 2]
+        valid_pts = (x > self.min_x)*(x < self.max_x)*(y > self.min_y)*\
+                    (y < self.max_y)*(z > self.min_z)*(z < self.max_z)
+        lidar_data = lidar_data[valid_pts]
+
+        x_id = ((((lidar_data[:, 0] - self.min_x) / self.voxel_size_x))).astype(int)
+        y_id = ((((lidar_data[:, 1] - self.min_y) / self.voxel_size_y))).astype(int)
+        voxel_ids, voxel_index, voxel_counts = np.unique(y_id * self.num_voxel_x + x_id, return_inverse=True, return_counts=True)
+        voxel_index = voxel_index.reshape(-1)
+
+        # one entry is needed for the marker after the valid voxels - the points of the other voxels are dropped
+        num_non_empty_voxels = min(len(voxel_ids), self.nw_max_num_voxels-1)
+        voxel_ids = voxel_ids[:num_non_empty_voxels]
+        voxel_counts = voxel_counts[:num_non_empty_voxels]
+
+        # position of each point within its voxel, in the order of the points
+        sort_order = np.argsort(voxel_index, kind='stable')
+        voxel_starts = np.cumsum(voxel_counts) - voxel_counts
+        point_slots = np.empty_like(voxel_index)
+        point_slots[sort_order] = np.arange(len(voxel_index))
+        keep_pts = (voxel_index < num_non_empty_voxels)
+        point_slots[keep_pts] -= voxel_starts[voxel_index[keep_pts]]
+        keep_pts &= (point_slots < self.max_points_per_voxel)
+        voxel_index = voxel_index[keep_pts]
+        point_slots = point_slots[keep_pts]
+        point_feats = lidar_data[keep_pts, 0:4] * self.scale_fact
+        num_points = np.minimum(voxel_counts, self.max_points_per_voxel)
+
+        # the sum of the points of a voxel is done on a contiguous row per voxel, in the same order as
+        # the reference implementation - grouped by the number of points, so that the rounding is also the same
+        voxel_feats = np.zeros((3, num_non_empty_voxels, self.max_points_per_voxel), dtype=point_feats.dtype)
+        voxel_feats[:, voxel_index, point_slots] = point_feats[:, 0:3].T
+        voxel_sums = np.zeros((3, num_non_empty_voxels), dtype=point_feats.dtype)
+        for n in np.unique(num_points):
+            voxel_sel = (num_points == n)
+            voxel_sums[:, voxel_sel] = voxel_feats[:, voxel_sel, :n].sum(axis=2)
+        #
+        voxel_avgs = voxel_sums / num_points
+        # the reference subtracts a numpy float64 scalar from a float32 array - follow the same promotion
+        avg_dtype = np.result_type(point_feats, voxel_avgs.dtype.type(0))
+
+        voxel_ids_int = voxel_ids.astype('int32')
+        voxel_center_y = (voxel_ids_int / self.num_voxel_x).astype(int)
+        voxel_center_x = (voxel_ids_int - voxel_center_y * self.num_voxel_x).astype(int)
+        voxel_center_x = voxel_center_x * self.voxel_size_x + (self.voxel_size_x / 2 + self.min_x)
+        voxel_center_y = voxel_center_y * self.voxel_size_y + (self.voxel_size_y / 2 + self.min_y)
+        voxel_center_z = 0 * self.voxel_size_z + (self.voxel_size_z / 2 + self.min_z)
+        voxel_centers = np.stack([voxel_center_x * self.scale_fact, voxel_center_y * self.scale_fact]).astype(point_feats.dtype)
+
+        point_out = np.empty((len(point_feats), self.num_feat_per_voxel), dtype=point_feats.dtype)
+        point_out[:, 3] = point_feats[:, 3]
+        for c in range(3):
+            point_out[:, 4+c] = point_feats[:, c].astype(avg_dtype) - voxel_avgs[c, voxel_index].astype(avg_dtype)
+        #
+        point_out[:, 7] = point_feats[:, 0] - voxel_centers[0, voxel_index]
+        point_out[:, 8] = point_feats[:, 1] - voxel_centers[1, voxel_index]
+        point_out[:, 9] = point_feats[:, 2] - voxel_center_z * self.scale_fact
+        # looks like bug in python mmdetection3d code, hence below code is to mimic the mmdetect behaviour
+        point_out[:, 0:3] = point_out[:, 7:10]
+        point_out = point_out.astype("int32").astype("float32")
+        input0[0, :, point_slots, voxel_index] = point_out
+
+        input2[0, 0, :num_non_empty_voxels] = voxel_ids
+        input2[0][0][num_non_empty_voxels] = -1 # TIDL doesnt know valid number of voxels, hence this act as marker field.
+        input2[0][1:64] = input2[0][0] # replicating the firsh channel indices to all channels. As scatter is same for all channels.
+        return input0, input2
+
+    def _voxelize_reference(self, lidar_data, enable_opt_pre_proc=True):
+        # reference implementation - slow, but kept for checking _voxelize()
+        scratch_2 =[]
+        input0 = np.zeros((1, self.num_feat_per_voxel, self.max_points_per_voxel, self.nw_max_num_voxels),dtype='float32')
+        input2 = np.zeros((1, self.num_channel, self.nw_max_num_voxels),dtype='int32')
 
-                        x_id = (((x - self.min_x) / self.voxel_size_x)).astype(int)
-                        y_id = (((y - self.min_y) / self.voxel_size_y)).astype(int)
-                        scratch_1.append(y_id * self.num_voxel_x + x_id)
-                    else:
-                        scratch_1.append(-1 - i) # filing unique non valid index
-            else:
-                x = lidar_data[:, 0]
-                y = lidar_data[:, 1]
-                z = lidar_data[:, 2]
+        #start_time = time.time()
 
-                x_id = ((((x - self.min_x) / self.voxel_size_x))).astype(int)
-                y_id =  ((((y - self.min_y) / self.voxel_size_y))).astype(int)
-                valid_idx = y_id * self.num_voxel_x + x_id
-                not_valid_idx = np.ones(len(lidar_data))*-1 # -1  is the invalid index
+        if enable_opt_pre_proc == False:
 
-                valid_pts = (x > self.min_x)*(x < self.max_x)*(y > self.min_y)*\
-                            (y < self.max_y)*(z > self.min_z)*(z < self.max_z)
+            scratch_1 = []
+            for i, data in enumerate(lidar_data):
 
-                indx_write = np.where(valid_pts,valid_idx,not_valid_idx)
+                x = data[0]
+                y = data[1]
+                z = data[2]
 
-                scratch_1  = indx_write
+                if ((x > self.min_x) and (x < self.max_x) and (y > self.min_y) and (y < self.max_y) and
+                    (z > self.min_z) and (z < self.max_z)):
 
-            num_points = np.zeros(self.nw_max_num_voxels,dtype=int)
+                    x_id = (((x - self.min_x) / self.voxel_size_x)).astype(int)
+                    y_id = (((y - self.min_y) / self.voxel_size_y)).astype(int)
+                    scratch_1.append(y_id * self.num_voxel_x + x_id)
+                else:
+                    scratch_1.append(-1 - i) # filing unique non valid index
+        else:
+            x = lidar_data[:, 0]
+            y = lidar_data[:, 1]
+            z = lidar_data[:, 2]
 
-            # Find unique indices
-            # There will be voxel which doesnt have any 3d point, hence collecting the voxel ids for valid voxels*/
-            # scratch_2 is the index in valid voxels
-            num_non_empty_voxels = 0
+            x_id = ((((x - self.min_x) / self.voxel_size_x))).astype(int)
+            y_id =  ((((y - self.min_y) / self.voxel_size_y))).astype(int)
+            valid_idx = y_id * self.num_voxel_x + x_id
+            not_valid_idx = np.ones(len(lidar_data))*-1 # -1  is the invalid index
 
-            lidar_data = lidar_data[np.where(scratch_1 != -1)]
-            scratch_1 = scratch_1[np.where(scratch_1 != -1)]
+            valid_pts = (x > self.min_x)*(x < self.max_x)*(y > self.min_y)*\
+                        (y < self.max_y)*(z > self.min_z)*(z < self.max_z)
 
-            if enable_opt_pre_proc == False:
-                for i in range(len(lidar_data)):
-                    if (scratch_1[i] >= 0):
+            indx_write = np.where(valid_pts,valid_idx,not_valid_idx)
 
-                        find_voxel = scratch_1[i] in scratch_1[:i]
+            scratch_1  = indx_write
 
-                        if find_voxel == False:
-                            scratch_2.append(num_non_empty_voxels) # this voxel idx has come first time, hence allocate a new index for this
-                            input2[0][0][num_non_empty_voxels] = scratch_1[i]
-                            num_non_empty_voxels += 1
-                        else:
-                            if enable_opt_pre_proc == False:
-                                k = scratch_1[:i].index(scratch_1[i])
-                            else:
-                                k = (np.where(scratch_1[:i] == scratch_1[i]))[0][0]
-                            scratch_2.append(scratch_2[k]) #already this voxel is having one id hence reuse it
-                    else:
-                        scratch_2.append(None)
-            else:
-                unq_rtn = np.unique(scratch_1, return_inverse = True, return_counts = True)
-                num_non_empty_voxels = (int)(unq_rtn[2].shape[0])
-                #num_points = unq_rtn[2]
-                #num_points = np.clip(num_points,0,self.max_points_per_voxel)
-                scratch_2 = unq_rtn[1]
-                input2[0, 0, :num_non_empty_voxels] = unq_rtn[0][:num_non_empty_voxels]
+        num_points = np.zeros(self.nw_max_num_voxels,dtype=int)
 
+        # Find unique indices
+        # There will be voxel which doesnt have any 3d point, hence collecting the voxel ids for valid voxels*/
+        # scratch_2 is the index in valid voxels
+        num_non_empty_voxels = 0
 
-            #Even though current_voxels is less than self.nw_max_num_voxels, then also arrange
-            #    the data as per maximum number of voxels.
+        lidar_data = lidar_data[np.where(scratch_1 != -1)]
+        scratch_1 = scratch_1[np.where(scratch_1 != -1)]
 
-            if enable_opt_pre_proc == False:
-                tot_num_pts = 0
-                for i in range(len(lidar_data)):
-                    if (scratch_1[i] >= 0):
-                        j = scratch_2[i] #voxel index
-                        if(num_points[j]<self.max_points_per_voxel):
-                            input0[0, 0:4, num_points[j], j] = lidar_data[i, 0:4] * self.scale_fact
-                            num_points[j] = num_points[j] + 1
-                        else:
-                            tot_num_pts = tot_num_pts+1
-            else:
-                for i in range(len(lidar_data)):
-                    j = scratch_2[i] #voxel index
-                    if(num_points[j] < self.max_points_per_voxel):
-                        input0[0, 0:4, num_points[j], j] = lidar_data[i, 0:4] * self.scale_fact
-                        num_points[j] = num_points[j] + 1
+        if enable_opt_pre_proc == False:
+            for i in range(len(lidar_data)):
+                if (scratch_1[i] >= 0):
 
-            line_pitch = self.nw_max_num_voxels
-            channel_pitch = self.max_points_per_voxel * line_pitch
-            x_offset = self.voxel_size_x / 2 + self.min_x
-            y_offset = self.voxel_size_y / 2 + self.min_y
-            z_offset = self.voxel_size_z / 2 + self.min_z
-
-            for i in range(num_non_empty_voxels):
-                x = 0
-                y = 0
-                z = 0
-
-                if enable_opt_pre_proc == False:
-                    for j in range(num_points[i]):
-                        x += input0[0][0][j][i]
-                        y += input0[0][1][j][i]
-                        z += input0[0][2][j][i]
-                else:
-                    x = input0[0, 0, :num_points[i], i].sum()
-                    y = input0[0, 1, :num_points[i], i].sum()
-                    z = input0[0, 2, :num_points[i], i].sum()
-
-                x_avg = x / num_points[i]
-                y_avg = y / num_points[i]
-                z_avg = z / num_points[i]
-
-                voxel_center_y = (int)(input2[0][0][i] / self.num_voxel_x)
-                voxel_center_x = (int)(input2[0][0][i] - ((int)(voxel_center_y)) * self.num_voxel_x)
-
-                voxel_center_x *= self.voxel_size_x
-                voxel_center_x += x_offset
-
-                voxel_center_y *= self.voxel_size_y
-                voxel_center_y += y_offset
-
-                voxel_center_z = 0
-                voxel_center_z *= self.voxel_size_z
-                voxel_center_z += z_offset
-                if enable_opt_pre_proc == False:
-                    for j in range(num_points[i]):
-                        input0[0][4][j][i] = input0[0][0][j][i] - x_avg
-                        input0[0][5][j][i] = input0[0][1][j][i] - y_avg
-                        input0[0][6][j][i] = input0[0][2][j][i] - z_avg
-                        input0[0][7][j][i] = input0[0][0][j][i] - voxel_center_x * self.scale_fact
-                        input0[0][8][j][i] = input0[0][1][j][i] - voxel_center_y * self.scale_fact
-                        input0[0][9][j][i] = input0[0][2][j][i] - voxel_center_z * self.scale_fact
-
-                    #/*looks like bug in python mmdetection3d code, hence below code is to mimic the mmdetect behaviour*/
-                    for j in range (num_points[i]):
-                        input0[0][0][j][i] = input0[0][7][j][i]
-                        input0[0][1][j][i] = input0[0][8][j][i]
-                        input0[0][2][j][i] = input0[0][9][j][i]
+                    find_voxel = scratch_1[i] in scratch_1[:i]
+
+                    if find_voxel == False:
+                        scratch_2.append(num_non_empty_voxels) # this voxel idx has come first time, hence allocate a new index for this
+                        input2[0][0][num_non_empty_voxels] = scratch_1[i]
+                        num_non_empty_voxels += 1
+                    else:
+                        if enable_opt_pre_proc == False:
+                            k = scratch_1[:i].index(scratch_1[i])
+                        else:
+                            k = (np.where(scratch_1[:i] == scratch_1[i]))[0][0]
+                        scratch_2.append(scratch_2[k]) #already this voxel is having one id hence reuse it
                 else:
-                    input0[0, 4, :num_points[i], i] = input0[0, 0, :num_points[i], i] - x_avg
-                    input0[0, 5, :num_points[i], i] = input0[0, 1, :num_points[i], i] - y_avg
-                    input0[0, 6, :num_points[i], i] = input0[0, 2, :num_points[i], i] - z_avg
-                    input0[0, 7, :num_points[i], i] = input0[0, 0, :num_points[i], i] - voxel_center_x * self.scale_fact
-                    input0[0, 8, :num_points[i], i] = input0[0, 1, :num_points[i], i] - voxel_center_y * self.scale_fact
-                    input0[0, 9, :num_points[i], i] = input0[0, 2, :num_points[i], i] - voxel_center_z * self.scale_fact
+                    scratch_2.append(None)
+        else:
+            unq_rtn = np.unique(scratch_1, return_inverse = True, return_counts = True)
+            num_non_empty_voxels = (int)(unq_rtn[2].shape[0])
+            #num_points = unq_rtn[2]
+            #num_points = np.clip(num_points,0,self.max_points_per_voxel)
+            scratch_2 = unq_rtn[1]
+            input2[0, 0, :num_non_empty_voxels] = unq_rtn[0][:num_non_empty_voxels]
 
-                    input0[0, 0, :num_points[i], i] = input0[0, 7, :num_points[i], i]
-                    input0[0, 1, :num_points[i], i] = input0[0, 8, :num_points[i], i]
-                    input0[0, 2, :num_points[i], i] = input0[0, 9, :num_points[i], i]
 
+        #Even though current_voxels is less than self.nw_max_num_voxels, then also arrange
+        #    the data as per maximum number of voxels.
 
-            input2[0][0][num_non_empty_voxels] = -1 # TIDL doesnt know valid number of voxels, hence this act as marker field.
-            input2[0][1:64] = input2[0][0] # replicating the firsh channel indices to all channels. As scatter is same for all channels.
-            input0 = input0.astype("int32")
-            input0 = input0.astype("float32")
-            #input2 = input2.astype("float32")
-            #np.savetxt('input2.txt', input2.flatten(), fmt='%6.2e')
-            #np.savetxt('input0.txt', input0.flatten(), fmt='%6.2e')
+        if enable_opt_pre_proc == False:
+            tot_num_pts = 0
+            for i in range(len(lidar_data)):
+                if (scratch_1[i] >= 0):
+                    j = scratch_2[i] #voxel index
+                    if(num_points[j]<self.max_points_per_voxel):
+                        input0[0, 0:4, num_points[j], j] = lidar_data[i, 0:4] * self.scale_fact
+                        num_points[j] = num_points[j] + 1
+                    else:
+                        tot_num_pts = tot_num_pts+1
         else:
-            input0 = np.fromfile(info_dict['data_path'] + "_input0_f32.bin", dtype='float32')
-            input2 = np.fromfile(info_dict['data_path'] + "_input2_f32.bin", dtype='float32')
+            for i in range(len(lidar_data)):
+                j = scratch_2[i] #voxel index
+                if(num_points[j] < self.max_points_per_voxel):
+                    input0[0, 0:4, num_points[j], j] = lidar_data[i, 0:4] * self.scale_fact
+                    num_points[j] = num_points[j] + 1
+
+        line_pitch = self.nw_max_num_voxels
+        channel_pitch = self.max_points_per_voxel * line_pitch
+        x_offset = self.voxel_size_x / 2 + self.min_x
+        y_offset = self.voxel_size_y / 2 + self.min_y
+        z_offset = self.voxel_size_z / 2 + self.min_z
+
+        for i in range(num_non_empty_voxels):
+            x = 0
+            y = 0
+            z = 0
 
-            #np.savetxt('input2.txt', input2.flatten(), fmt='%6.2e')
-            #np.savetxt('input0.txt', input0.flatten(), fmt='%6.2e')
+            if enable_opt_pre_proc == False:
+                for j in range(num_points[i]):
+                    x += input0[0][0][j][i]
+                    y += input0[0][1][j][i]
+                    z += input0[0][2][j][i]
+            else:
+                x = input0[0, 0, :num_points[i], i].sum()
+                y = input0[0, 1, :num_points[i], i].sum()
+                z = input0[0, 2, :num_points[i], i].sum()
 
-            input0 = input0.astype("int32")
-            input0 = input0.astype("float32")
+            x_avg = x / num_points[i]
+            y_avg = y / num_points[i]
+            z_avg = z / num_points[i]
 
-            input0 = input0.reshape(1, 9, 32, 10000)
-            input2 = input2.reshape(1, 64, 10000).astype('int32')
+            voxel_center_y = (int)(input2[0][0][i] / self.num_voxel_x)
+            voxel_center_x = (int)(input2[0][0][i] - ((int)(voxel_center_y)) * self.num_voxel_x)
 
-        return (input0,input2,input1), info_dict
+            voxel_center_x *= self.voxel_size_x
+            voxel_center_x += x_offset
+
+            voxel_center_y *= self.voxel_size_y
+            voxel_center_y += y_offset
+
+            voxel_center_z = 0
+            voxel_center_z *= self.voxel_size_z
+            voxel_center_z += z_offset
+            if enable_opt_pre_proc == False:
+                for j in range(num_points[i]):
+                    input0[0][4][j][i] = input0[0][0][j][i] - x_avg
+                    input0[0][5][j][i] = input0[0][1][j][i] - y_avg
+                    input0[0][6][j][i] = input0[0][2][j][i] - z_avg
+                    input0[0][7][j][i] = input0[0][0][j][i] - voxel_center_x * self.scale_fact
+                    input0[0][8][j][i] = input0[0][1][j][i] - voxel_center_y * self.scale_fact
+                    input0[0][9][j][i] = input0[0][2][j][i] - voxel_center_z * self.scale_fact
+
+                #/*looks like bug in python mmdetection3d code, hence below code is to mimic the mmdetect behaviour*/
+                for j in range (num_points[i]):
+                    input0[0][0][j][i] = input0[0][7][j][i]
+                    input0[0][1][j][i] = input0[0][8][j][i]
+                    input0[0][2][j][i] = input0[0][9][j][i]
+            else:
+                input0[0, 4, :num_points[i], i] = input0[0, 0, :num_points[i], i] - x_avg
+                input0[0, 5, :num_points[i], i] = input0[0, 1, :num_points[i], i] - y_avg
+                input0[0, 6, :num_points[i], i] = input0[0, 2, :num_points[i], i] - z_avg
+                input0[0, 7, :num_points[i], i] = input0[0, 0, :num_points[i], i] - voxel_center_x * self.scale_fact
+                input0[0, 8, :num_points[i], i] = input0[0, 1, :num_points[i], i] - voxel_center_y * self.scale_fact
+                input0[0, 9, :num_points[i], i] = input0[0, 2, :num_points[i], i] - voxel_center_z * self.scale_fact
+
+                input0[0, 0, :num_points[i], i] = input0[0, 7, :num_points[i], i]
+                input0[0, 1, :num_points[i], i] = input0[0, 8, :num_points[i], i]
+                input0[0, 2, :num_points[i], i] = input0[0, 9, :num_points[i], i]
+
+
+        input2[0][0][num_non_empty_voxels] = -1 # TIDL doesnt know valid number of voxels, hence this act as marker field.
+        input2[0][1:64] = input2[0][0] # replicating the firsh channel indices to all channels. As scatter is same for all channels.
+        input0 = input0.astype("int32")
+        input0 = input0.astype("float32")
+        #input2 = input2.astype("float32")
+        #np.savetxt('input2.txt', input2.flatten(), fmt='%6.2e')
+        #np.savetxt('input0.txt', input0.flatten(), fmt='%6.2e')
+        return input0, input2
@@ -61,6 +61,21 @@ def get_session_name_to_type_dict():
     return session_name_to_type_dict
 
 
+# session params that depend on the host that runs the benchmark rather than on the model - mapped to the setting
+# they come from. they are always taken from the current settings and are not written into the packaged param.yaml
+SESSION_HOST_PARAMS = {
+    'artifacts_cache_path': 'artifacts_cache_path',
+    'io_binding': 'session_io_binding',
+    'infer_requests': 'session_infer_requests',
+    'batch_size': 'session_batch_size',
+    'model_cache_path': 'model_cache_path',
+}
+
+
+def get_session_host_params(settings):
+    return {param_name:settings.get(setting_name, None) for param_name, setting_name in SESSION_HOST_PARAMS.items()}
+
+
 # these are some example session configs
 # the actual config will vary depending on the parameters used to train the model
 def get_common_session_cfg(settings, work_dir=None, input_optimization=True, input_data_layout=constants.NCHW,
@@ -72,6 +87,7 @@ def get_common_session_cfg(settings, work_dir=None, input_optimization=True, inp
               input_optimization=input_optimization, input_data_layout=input_data_layout,
               input_mean=input_mean, input_scale=input_scale,
               run_dir_tree_depth=settings.run_dir_tree_depth,
+              **get_session_host_params(settings),
               **kwargs)
     return common_session_cfg
 
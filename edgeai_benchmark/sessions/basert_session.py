@@ -35,10 +35,12 @@ import re
 import csv
 import itertools
 import copy
+import concurrent.futures
 from colorama import Fore
 import numpy as np
 import tarfile
 import gc
+import yaml
 
 from .. import utils
 from .. import constants
@@ -55,6 +57,12 @@ class BaseRTSession(utils.ParamsBase):
         self.is_started = False
         self.is_imported = False
         self.is_start_infer_done = False
+        self.is_import_cached = False
+        self.artifacts_cache_pending = None
+        # set by the derived class at the end of a successful import_model - only then the artifacts are cached
+        self.is_import_complete = False
+        # perfsim stats are static for the given artifacts - they are parsed once and kept here
+        self.perfsim_stats = None
         self.input_normalizer = None
         self.force_gc = force_gc
 
@@ -107,6 +115,22 @@ class BaseRTSession(utils.ParamsBase):
         self.kwargs['with_onnxsim'] = self.kwargs.get('with_onnxsim', False)
         self.kwargs['shape_inference'] = self.kwargs.get('shape_inference', True)
 
+        # folder where compiled artifacts are cached, keyed by a fingerprint of model, runtime_options,
+        # calibration data and tidl_tools. None disables the cache.
+        self.kwargs['artifacts_cache_path'] = self.kwargs.get('artifacts_cache_path', None)
+        # folder where the optimized models (see _optimize_model) are cached, keyed by the contents of the source model
+        # and the optimization options - so that the same model is not optimized again for each run_dir. None disables the cache.
+        self.kwargs['model_cache_path'] = self.kwargs.get('model_cache_path', None)
+        # reuse preallocated input/output buffers across frames, if the runtime supports it.
+        # the outputs returned by infer_frame() are then valid only till the next infer_frame() - see get_output_buffers()
+        self.kwargs['io_binding'] = self.kwargs.get('io_binding', False)
+        self.output_buffers = None
+        # number of inference requests that the users of infer_frame_async() keep in flight
+        self.kwargs['infer_requests'] = self.kwargs.get('infer_requests', None) or 1
+        # number of frames that the users of infer_batch() put in a batch - runtimes that cannot infer a batch in one run do them one by one
+        self.kwargs['batch_size'] = self.kwargs.get('batch_size', None) or 1
+        self.infer_executor = None
+
         # store the current directory so that we can go back there any time
         self.cwd = os.getcwd()
 
@@ -162,6 +186,19 @@ class BaseRTSession(utils.ParamsBase):
 
         self.clear()
         self.is_imported = True
+        self.perfsim_stats = None
+
+        # if the same import has been done before, restore the artifacts from cache.
+        # the derived class must skip the actual import if is_import_cached is set.
+        self.is_import_cached = False
+        self.is_import_complete = False
+        self.artifacts_cache_pending = None
+        if self.kwargs['artifacts_cache_path'] is not None:
+            artifacts_cache_dir = os.path.join(self.kwargs['artifacts_cache_path'], self._get_artifacts_cache_key(calib_data))
+            self.is_import_cached = self._restore_artifacts_cache(artifacts_cache_dir)
+            # if it is not found, it will be written into the cache in close_interpreter() after import
+            self.artifacts_cache_pending = None if self.is_import_cached else artifacts_cache_dir
+        #
 
     def start_infer(self):
         artifacts_folder = self.kwargs['artifacts_folder']
@@ -174,6 +211,8 @@ class BaseRTSession(utils.ParamsBase):
         # we assume that it is proper and import is done
         self.is_imported = True
         self.is_start_infer_done = True
+        # the artifacts are final now - parse the perfsim stats once, instead of in every infer_stats() call
+        self.perfsim_stats = self._get_perfsim_stats()
 
     def __call__(self, input, info_dict):
         return self.infer_frame(input, info_dict)
@@ -189,10 +228,60 @@ class BaseRTSession(utils.ParamsBase):
         # the over-ridden function in super class must return valid outputs
         return None, None
 
+    def get_output_buffers(self):
+        # buffers owned by the runtime that are overwritten by the next infer_frame() - the outputs that
+        # are to be kept beyond that must be copied out of these
+        return self.output_buffers or []
+
+    def infer_frame_async(self, input, info_dict=None, run_with=None):
+        '''
+        submits a frame for inference and returns a concurrent.futures.Future of (outputs, info_dict).
+        the requests are run one after the other in the order of submission, in a thread of the session
+        (the interpreters need not be thread safe) - so the pre and post processing of other frames
+        can be done meanwhile. the outputs are not in the buffers of the runtime - they remain valid.
+        the stats of the request are returned in info_dict['session_infer_stats'].
+        run_with: optional function, called as run_with(func, *args) in the thread of the session - eg. to redirect the logs
+        '''
+        if self.infer_executor is None:
+            self.infer_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        #
+        if run_with is not None:
+            return self.infer_executor.submit(run_with, self._infer_frame_request, input, info_dict)
+        else:
+            return self.infer_executor.submit(self._infer_frame_request, input, info_dict)
+        #
+
+    def _infer_frame_request(self, input, info_dict):
+        outputs, info_dict = self.infer_frame(input, info_dict)
+        if self.get_output_buffers():
+            # the next request will overwrite the buffers of the runtime
+            outputs = [np.array(o, copy=True) for o in outputs]
+        #
+        # the stats are of this request only till the next one is run
+        info_dict['session_infer_stats'] = self.infer_stats()
+        return outputs, info_dict
+
+    def infer_batch(self, inputs, info_dicts):
+        '''
+        inference of a batch of frames - returns the list of the outputs of each frame and info_dicts.
+        the sessions that can infer several frames in one run override this - here they are inferred one by one.
+        the outputs are not in the buffers of the runtime and info_dicts[i]['session_infer_stats'] has the stats of frame i.
+        '''
+        outputs_list = []
+        for (input, info_dict) in zip(inputs, info_dicts):
+            outputs, info_dict = self._infer_frame_request(input, info_dict)
+            outputs_list.append(outputs)
+        #
+        return outputs_list, info_dicts
+
     def infer_frames(self, inputs, info_dict=None):
         outputs = []
         for input in inputs:
             output, info_dict = self.infer_frame(input, info_dict)
+            if self.get_output_buffers():
+                # the outputs of all the frames are kept - so they cannot be in the buffers of the runtime
+                output = [np.array(o, copy=True) for o in output]
+            #
             outputs.append(output)
         #
         return outputs, info_dict
@@ -209,11 +298,25 @@ class BaseRTSession(utils.ParamsBase):
 
     def close_interpreter(self):
         # optional: make sure that the interpreter is freed-up after inference
+        if self.infer_executor is not None:
+            # the pending requests are completed before the interpreter goes away
+            self.infer_executor.shutdown(wait=True)
+            self.infer_executor = None
+        #
+        self.output_buffers = None
         if self.force_gc and self.interpreter:
             del self.interpreter
             self.interpreter = None
             gc.collect()
         #
+        # import is complete when the interpreter is closed - the artifacts can be cached now.
+        # the artifacts of an import that failed part way are never cached.
+        if self.artifacts_cache_pending is not None:
+            if self.is_import_complete:
+                self._store_artifacts_cache(self.artifacts_cache_pending)
+            #
+            self.artifacts_cache_pending = None
+        #
         return None
 
     def __del__(self):
@@ -376,13 +479,19 @@ class BaseRTSession(utils.ParamsBase):
             'write_total': write_total, 'read_total': read_total,
             'perfsim_macs': 0.0, 'perfsim_time': 0.0, 'perfsim_ddr_transfer': 0.0
         }
+        if self.perfsim_stats is None:
+            self.perfsim_stats = self._get_perfsim_stats()
+        #
+        stats.update(self.perfsim_stats)
+        return stats
+
+    def _get_perfsim_stats(self):
         try:
             perfsim_stats = self._infer_perfsim_stats()
-            stats.update(perfsim_stats)
         except:
-            pass
+            perfsim_stats = {}
         #
-        return stats
+        return perfsim_stats
 
     def _infer_perfsim_stats(self):
         assert self.is_imported == True, 'the given model must be an imported one.'
@@ -521,14 +630,17 @@ class BaseRTSession(utils.ParamsBase):
         # for example, the input of the model can be converted to 8bit and mean/scale can be moved inside the model
         # for prequantized models, it may also be required to run onnx-simplifier (this will be run if it is set for the model)
         # also does shape_inference for onnx models
-        apply_input_optimization = self._optimize_model(model_file,
-                                                 is_new_file=(not model_file_exists),
-                                                 input_optimization=self.kwargs['input_optimization'],
-                                                 tensor_bits=self.kwargs['tensor_bits'],
-                                                 input_mean=self.kwargs['input_mean'],
-                                                 input_scale=self.kwargs['input_scale'],
-                                                 with_onnxsim=self.kwargs['with_onnxsim'],
-                                                 shape_inference=self.kwargs['shape_inference'])
+        optimize_kwargs = dict(input_optimization=self.kwargs['input_optimization'],
+                               tensor_bits=self.kwargs['tensor_bits'],
+                               input_mean=self.kwargs['input_mean'],
+                               input_scale=self.kwargs['input_scale'],
+                               with_onnxsim=self.kwargs['with_onnxsim'],
+                               shape_inference=self.kwargs['shape_inference'])
+        if self.kwargs['model_cache_path'] is not None and not model_file_exists and isinstance(model_file, str):
+            apply_input_optimization = self._optimize_model_cached(model_file, **optimize_kwargs)
+        else:
+            apply_input_optimization = self._optimize_model(model_file, is_new_file=(not model_file_exists), **optimize_kwargs)
+        #
         if apply_input_optimization:
             # set the mean and scale in kwargs to None as they have been absorbed inside.
             self.kwargs['input_mean'] = None
@@ -597,6 +709,56 @@ class BaseRTSession(utils.ParamsBase):
         #
         return apply_input_optimization
 
+    def _optimize_model_cached(self, model_file, input_optimization=False, tensor_bits=None,
+                               input_mean=None, input_scale=None, with_onnxsim=False, shape_inference=True):
+        # same as _optimize_model on a new model_file - but the optimized model is taken from model_cache_path if it is there
+        apply_input_optimization = (input_optimization and tensor_bits == 8 and input_mean is not None and input_scale is not None)
+        # only the options that change the optimized model are in the key - eg. all the target devices share it.
+        # input optimization is done only for 8 bits - so 8 and 16 bit runs share it only if it does not apply to the model.
+        optimize_info = dict(model_ext=os.path.splitext(model_file)[-1], apply_input_optimization=apply_input_optimization,
+                             input_mean=(input_mean if apply_input_optimization else None),
+                             input_scale=(input_scale if apply_input_optimization else None),
+                             with_onnxsim=with_onnxsim, shape_inference=shape_inference)
+        model_cache_dir = os.path.join(self.kwargs['model_cache_path'], utils.hash_digest(optimize_info, file_names=model_file))
+        model_cache_file = os.path.join(model_cache_dir, os.path.basename(model_file))
+        if os.path.isfile(model_cache_file):
+            self._link_or_copy_file(model_cache_file, model_file)
+            print(utils.log_color('INFO', 'optimized model restored from cache', model_cache_dir))
+            return apply_input_optimization
+        #
+        apply_input_optimization = self._optimize_model(model_file, is_new_file=True, input_optimization=input_optimization,
+                                                        tensor_bits=tensor_bits, input_mean=input_mean, input_scale=input_scale,
+                                                        with_onnxsim=with_onnxsim, shape_inference=shape_inference)
+        # write into a temporary folder and rename it, so that parallel processes never see a partial cache entry
+        model_cache_temp = f'{model_cache_dir}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(model_cache_temp, exist_ok=True)
+            model_cache_temp_file = os.path.join(model_cache_temp, os.path.basename(model_file))
+            shutil.copy2(model_file, model_cache_temp_file)
+            # the cached model is shared by hard links - it must not be modified in place
+            os.chmod(model_cache_temp_file, 0o444)
+            cache_info = dict(model_path=self.kwargs['model_path'], run_dir=self.kwargs['run_dir'], **optimize_info)
+            with open(os.path.join(model_cache_temp, 'cache.yaml'), 'w') as fp:
+                yaml.safe_dump(utils.pretty_object(cache_info), fp, sort_keys=False)
+            #
+            os.rename(model_cache_temp, model_cache_dir)
+        except OSError as e:
+            # another process may have written the same entry in the meantime
+            print(utils.log_color('WARNING', 'optimized model could not be cached', f'{model_cache_dir} - {e}'))
+            shutil.rmtree(model_cache_temp, ignore_errors=True)
+        #
+        return apply_input_optimization
+
+    def _link_or_copy_file(self, src_file, dst_file):
+        # hard link if possible (same file system) - replace dst_file atomically in either case
+        dst_file_temp = f'{dst_file}.{os.getpid()}.tmp'
+        try:
+            os.link(src_file, dst_file_temp)
+        except OSError:
+            shutil.copy2(src_file, dst_file_temp)
+        #
+        os.replace(dst_file_temp, dst_file)
+
     def _replace_confidence_threshold(self, filename):
         if not filename.endswith('.prototxt'):
             return
@@ -655,6 +817,83 @@ class BaseRTSession(utils.ParamsBase):
             fp.write('\n'.join(lines))
         #
 
+    def _get_artifacts_cache_key(self, calib_data):
+        # the paths inside run_dir are different for each run_dir - use relative paths or file contents instead
+        # the quant params file is written by the import - so only its path is used.
+        run_dir = self.kwargs['run_dir']
+        runtime_options = {}
+        for rt_key, rt_value in self.kwargs['runtime_options'].items():
+            if rt_key in ('artifacts_folder', 'import', 'tidl_tools_path'):
+                continue
+            elif rt_key != constants.ADVANCED_OPTIONS_QUANT_FILE_KEY and isinstance(rt_value, str) and os.path.isfile(rt_value):
+                rt_value = utils.hash_digest(file_names=rt_value)
+            elif isinstance(rt_value, str) and rt_value.startswith(run_dir):
+                rt_value = os.path.relpath(rt_value, run_dir)
+            #
+            runtime_options[rt_key] = rt_value
+        #
+        model_file = utils.as_list(self.kwargs['model_file'])
+        tidl_tools_path = self.kwargs['tidl_tools_path']
+        tidl_tools_info = dict(version=constants.TIDL_VERSION_STR, tidl_tools_path=tidl_tools_path,
+                               tidl_tools_stats=utils.hash_folder_stats(tidl_tools_path))
+        session_info = dict(session_name=self.kwargs['session_name'], tidl_offload=self.kwargs['tidl_offload'],
+                            target_machine=self.kwargs['target_machine'], input_normalizer=(self.input_normalizer is not None))
+        # the calibration data is the output of preprocess - so it covers both the calibration frames and the preprocess
+        return utils.hash_digest(session_info, runtime_options, tidl_tools_info, calib_data, file_names=model_file)
+
+    def _restore_artifacts_cache(self, artifacts_cache_dir):
+        artifacts_cache_folder = os.path.join(artifacts_cache_dir, 'artifacts')
+        artifacts_cache_yaml = os.path.join(artifacts_cache_dir, 'cache.yaml')
+        if not (os.path.isdir(artifacts_cache_folder) and os.path.isfile(artifacts_cache_yaml)):
+            return False
+        #
+        with open(artifacts_cache_yaml) as fp:
+            cache_info = yaml.safe_load(fp)
+        #
+        self._clear_folder(self.kwargs['artifacts_folder'], remove_base_folder=True)
+        shutil.copytree(artifacts_cache_folder, self.kwargs['artifacts_folder'], symlinks=True)
+        # quant params file may be written by the import
+        quant_file = self.kwargs['runtime_options'].get(constants.ADVANCED_OPTIONS_QUANT_FILE_KEY, None)
+        quant_cache_file = os.path.join(artifacts_cache_dir, 'qparams.prototxt')
+        if isinstance(quant_file, str) and os.path.isfile(quant_cache_file):
+            shutil.copy2(quant_cache_file, quant_file)
+        #
+        for details_key in ('input_details', 'output_details'):
+            if self.kwargs[details_key] is None:
+                self.kwargs[details_key] = cache_info.get(details_key, None)
+            #
+        #
+        print(utils.log_color('INFO', 'artifacts restored from cache', artifacts_cache_dir))
+        return True
+
+    def _store_artifacts_cache(self, artifacts_cache_dir):
+        artifacts_folder = self.kwargs['artifacts_folder']
+        if os.path.exists(artifacts_cache_dir) or not os.path.isdir(artifacts_folder) or len(os.listdir(artifacts_folder)) == 0:
+            return False
+        #
+        # write into a temporary folder and rename it, so that parallel processes never see a partial cache entry
+        artifacts_cache_temp = f'{artifacts_cache_dir}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(artifacts_cache_temp, exist_ok=True)
+            shutil.copytree(artifacts_folder, os.path.join(artifacts_cache_temp, 'artifacts'), symlinks=True)
+            quant_file = self.kwargs['runtime_options'].get(constants.ADVANCED_OPTIONS_QUANT_FILE_KEY, None)
+            if isinstance(quant_file, str) and os.path.isfile(quant_file):
+                shutil.copy2(quant_file, os.path.join(artifacts_cache_temp, 'qparams.prototxt'))
+            #
+            cache_info = dict(run_dir=self.kwargs['run_dir'],
+                              input_details=self.kwargs['input_details'], output_details=self.kwargs['output_details'])
+            with open(os.path.join(artifacts_cache_temp, 'cache.yaml'), 'w') as fp:
+                yaml.safe_dump(utils.pretty_object(cache_info), fp, sort_keys=False)
+            #
+            os.rename(artifacts_cache_temp, artifacts_cache_dir)
+        except OSError as e:
+            # another process may have written the same entry in the meantime
+            print(utils.log_color('WARNING', 'artifacts could not be cached', f'{artifacts_cache_dir} - {e}'))
+            shutil.rmtree(artifacts_cache_temp, ignore_errors=True)
+            return False
+        #
+        return True
+
     def _set_default_options(self):
         assert False, 'this function must be overridden in the derived class'
 
@@ -40,17 +40,31 @@ class ONNXRTSession(BaseRTSession):
     def __init__(self, session_name=constants.SESSION_NAME_ONNXRT, **kwargs):
         super().__init__(session_name=session_name, **kwargs)
         self.kwargs['input_data_layout'] = self.kwargs.get('input_data_layout', constants.NCHW)
+        # names, shapes and types of the inputs and outputs - resolved once when the interpreter is created
+        self.input_names = None
+        self.output_names = None
+        self.output_dtypes = None
+        self.output_shapes = None
+        self.io_binding = None
+        # number of frames that are inferred in one run - see infer_batch()
+        self.infer_batch_size = 1
+        self.is_batch_checked = False
 
     def start(self):
         super().start()
 
     def import_model(self, calib_data, info_dict=None):
         super().import_model(calib_data)
+        if self.is_import_cached:
+            # artifacts have been restored from the artifacts cache
+            return info_dict
+        #
 
         # create the underlying interpreter
         self.interpreter = self._create_interpreter(is_import=True)
 
         self._get_input_output_details_onnx(self.interpreter)
+        self._get_input_output_names()
 
         # provide the calibration data and run the import
         for frame_idx, in_data in enumerate(calib_data):
@@ -60,61 +74,227 @@ class ONNXRTSession(BaseRTSession):
             if self.input_normalizer is not None:
                 in_data, _ = self.input_normalizer(in_data, {})
             #
-            calib_dict = {getattr(d_info, 'name'):d for d_info, d in zip(self.interpreter.get_inputs(),in_data)}
+            calib_dict = {name:d for name, d in zip(self.input_names,in_data)}
             # model may need additional inputs given in extra_inputs
             if self.kwargs['extra_inputs'] is not None:
                 calib_dict.update(self.kwargs['extra_inputs'])
             #
-            output_keys = [getattr(d_info, 'name') for d_info in self.interpreter.get_outputs()] \
-                if self.kwargs['output_details'] is not None else None
+            output_keys = self.output_names if self.kwargs['output_details'] is not None else None
             # run the actual import step
             outputs = self.interpreter.run(output_keys, calib_dict)
             self._update_output_details(outputs)
         #
 
         print("================================ import model =============")
+        self.is_import_complete = True
         return info_dict
 
     def start_infer(self):
         super().start_infer()
-        # create the underlying interpreter
-        self.interpreter = self._create_interpreter(is_import=False)
+        # the frames are inferred in batches only on the host - the models offloaded to tidl are compiled for one frame
+        batch_model = None
+        if self.kwargs['batch_size'] > 1 and not self.kwargs['tidl_offload']:
+            try:
+                # the model may not be loadable or may fail the checks after its dims are changed
+                batch_model = self._get_batch_model()
+                if batch_model is not None:
+                    self.interpreter = self._create_interpreter(is_import=False, model=batch_model)
+                #
+            except Exception as e:
+                print(utils.log_color('WARNING', 'the model cannot be run in batches', e))
+                batch_model = None
+            #
+        #
+        if batch_model is None:
+            # create the underlying interpreter
+            self.interpreter = self._create_interpreter(is_import=False)
+        #
+        self.infer_batch_size = self.kwargs['batch_size'] if batch_model is not None else 1
+        self.is_batch_checked = False
         # input_details is needed during inference - get it if it is not given
         self._get_input_output_details_onnx(self.interpreter)
+        self._get_input_output_names()
+        if self.kwargs['io_binding']:
+            self._create_io_binding()
+        #
         os.chdir(self.cwd)
         return True
 
     def infer_frame(self, input, info_dict=None):
         super().infer_frame(input, info_dict)
 
-        if not isinstance(input, list):
-            in_data = utils.as_tuple(input)        
+        in_data = input if isinstance(input, list) else utils.as_tuple(input)
 
         if self.input_normalizer is not None:
             in_data, _ = self.input_normalizer(in_data, {})
         #
-        input_dict = {getattr(d_info, 'name'):d for d_info, d in zip(self.interpreter.get_inputs(),in_data)}
+        input_dict = {name:d for name, d in zip(self.input_names,in_data)}
         # model needs additional inputs given in extra_inputs
         if self.kwargs['extra_inputs'] is not None:
             input_dict.update(self.kwargs['extra_inputs'])
         #
-        # output_details is not mandatory, output_keys can be None
-        output_keys = [getattr(d_info, 'name') for d_info in self.interpreter.get_outputs()] \
-            if self.kwargs['output_details'] is not None else None
-        # run the actual inference
-        start_time = time.time()
-        outputs = self.interpreter.run(output_keys, input_dict)
-        info_dict['session_invoke_time'] = (time.time() - start_time)
+        if self.io_binding is not None:
+            outputs, invoke_time = self._run_with_io_binding(input_dict)
+        else:
+            # output_details is not mandatory, output_keys can be None
+            output_keys = self.output_names if self.kwargs['output_details'] is not None else None
+            # run the actual inference
+            start_time = time.time()
+            outputs = self.interpreter.run(output_keys, input_dict)
+            invoke_time = time.time() - start_time
+        #
+        info_dict['session_invoke_time'] = invoke_time
         self._update_output_details(outputs)
         return outputs, info_dict
 
+    def infer_batch(self, inputs, info_dicts):
+        if self.infer_batch_size <= 1 or len(inputs) <= 1:
+            return super().infer_batch(inputs, info_dicts)
+        #
+        for info_dict in info_dicts:
+            # the checks and the info_dict entries that are common to all the frames
+            super().infer_frame(None, info_dict)
+        #
+        in_data_list = []
+        for input in inputs:
+            in_data = input if isinstance(input, list) else utils.as_tuple(input)
+            if self.input_normalizer is not None:
+                in_data, _ = self.input_normalizer(in_data, {})
+            #
+            in_data_list.append(in_data)
+        #
+        if not all(d.shape[:1] == (1,) for in_data in in_data_list for d in in_data):
+            return self._stop_batching('the inputs of the frames do not have a batch dimension', inputs, info_dicts)
+        #
+        # stack the frames along the batch dimension
+        input_dict = {name:np.concatenate([in_data[i] for in_data in in_data_list], axis=0) \
+                      for i, name in enumerate(self.input_names)}
+        output_keys = self.output_names if self.kwargs['output_details'] is not None else None
+        try:
+            start_time = time.time()
+            outputs = self.interpreter.run(output_keys, input_dict)
+            invoke_time = time.time() - start_time
+        except Exception as e:
+            # the first batch shows if the model can be run in batches at all
+            if self.is_batch_checked:
+                raise
+            #
+            return self._stop_batching(e, inputs, info_dicts)
+        #
+        num_frames = len(inputs)
+        if not all(o.shape[:1] == (num_frames,) for o in outputs):
+            return self._stop_batching('the outputs do not have a batch dimension', inputs, info_dicts)
+        #
+        # split the outputs back into the frames
+        outputs_list = [[o[i:i+1] for o in outputs] for i in range(num_frames)]
+        if not self.is_batch_checked:
+            # the batch dimension may be mixed up with the others inside the model (eg. a reshape to a fixed shape)
+            # compare with the outputs of the first frame inferred alone, before trusting the batches.
+            outputs_frame, _ = super().infer_batch(inputs[:1], [{}])
+            if not all(np.allclose(o_batch, o_frame, rtol=1e-3, atol=1e-5) \
+                       for o_batch, o_frame in zip(outputs_list[0], outputs_frame[0])):
+                return self._stop_batching('the outputs in batch mode are not the same', inputs, info_dicts)
+            #
+            self.is_batch_checked = True
+        #
+        infer_stats = self.infer_stats()
+        for info_dict in info_dicts:
+            info_dict['session_invoke_time'] = invoke_time / num_frames
+            info_dict['session_infer_stats'] = infer_stats
+        #
+        self._update_output_details(outputs_list[0])
+        return outputs_list, info_dicts
+
+    def close_interpreter(self):
+        self.io_binding = None
+        return super().close_interpreter()
+
+    def _get_batch_model(self):
+        '''
+        returns the model (serialized) with a variable batch dimension in its inputs and outputs - None if
+        the model cannot be run in batches. infer_batch() checks if the outputs in batch mode are right.
+        '''
+        if self.kwargs['extra_inputs'] is not None:
+            # the extra inputs are given for one frame
+            return None
+        #
+        import onnx
+        onnx_model = onnx.load(self.kwargs['model_file'])
+        initializer_names = [initializer.name for initializer in onnx_model.graph.initializer]
+        model_inputs = [model_input for model_input in onnx_model.graph.input if model_input.name not in initializer_names]
+
+        def _get_batch_dims(model_tensor):
+            dims = model_tensor.type.tensor_type.shape.dim
+            if len(dims) == 0:
+                return None
+            #
+            return ['batch'] + [d.dim_value if d.HasField('dim_value') else d.dim_param for d in dims[1:]]
+        #
+        # the first dimension of the inputs is taken as the batch dimension - it must be 1 or variable
+        for model_input in model_inputs:
+            dims = model_input.type.tensor_type.shape.dim
+            if len(dims) == 0 or (dims[0].HasField('dim_value') and dims[0].dim_value != 1):
+                return None
+            #
+        #
+        input_dims = {model_input.name:_get_batch_dims(model_input) for model_input in model_inputs}
+        output_dims = {model_output.name:_get_batch_dims(model_output) for model_output in onnx_model.graph.output}
+        output_dims = {k:v for k, v in output_dims.items() if v is not None}
+        onnx_model = utils.onnx_update_model_dims(onnx_model, input_dims, output_dims)
+        # the shapes of the intermediate tensors were inferred for one frame
+        del onnx_model.graph.value_info[:]
+        return onnx_model.SerializeToString()
+
+    def _stop_batching(self, reason, inputs, info_dicts):
+        print(utils.log_color('WARNING', 'the frames will be inferred one by one', reason))
+        self.infer_batch_size = 1
+        return super().infer_batch(inputs, info_dicts)
+
+    def _get_input_output_names(self):
+        model_inputs = self.interpreter.get_inputs()
+        model_outputs = self.interpreter.get_outputs()
+        self.input_names = [d_info.name for d_info in model_inputs]
+        self.output_names = [d_info.name for d_info in model_outputs]
+        self.output_dtypes = [self._get_numpy_dtype(d_info.type) for d_info in model_outputs]
+        # the outputs with symbolic dimensions (eg. number of detections) cannot be preallocated
+        self.output_shapes = [tuple(d_info.shape) if all(isinstance(d, int) for d in d_info.shape) else None \
+                              for d_info in model_outputs]
+
+    def _get_numpy_dtype(self, onnx_type):
+        onnx_type_to_dtype = {'tensor(float)': np.float32, 'tensor(float16)': np.float16, 'tensor(double)': np.float64,
+            'tensor(int8)': np.int8, 'tensor(uint8)': np.uint8, 'tensor(int16)': np.int16, 'tensor(uint16)': np.uint16,
+            'tensor(int32)': np.int32, 'tensor(uint32)': np.uint32, 'tensor(int64)': np.int64, 'tensor(uint64)': np.uint64,
+            'tensor(bool)': np.bool_}
+        return onnx_type_to_dtype.get(onnx_type, None)
+
+    def _create_io_binding(self):
+        # the outputs are written directly into buffers that are allocated here and reused for every frame.
+        # this is possible only if the output shapes are static - otherwise the usual run() is used.
+        if not all(s is not None and t is not None for s, t in zip(self.output_shapes, self.output_dtypes)):
+            return
+        #
+        self.io_binding = self.interpreter.io_binding()
+        self.output_buffers = [np.empty(s, dtype=t) for s, t in zip(self.output_shapes, self.output_dtypes)]
+        for name, buffer in zip(self.output_names, self.output_buffers):
+            self.io_binding.bind_output(name, 'cpu', 0, buffer.dtype, buffer.shape, buffer.ctypes.data)
+        #
+
+    def _run_with_io_binding(self, input_dict):
+        for name, d in input_dict.items():
+            self.io_binding.bind_cpu_input(name, np.ascontiguousarray(d))
+        #
+        start_time = time.time()
+        self.interpreter.run_with_iobinding(self.io_binding)
+        invoke_time = time.time() - start_time
+        return list(self.output_buffers), invoke_time
+
     def set_runtime_option(self, option, value):
         self.kwargs["runtime_options"][option] = value
 
     def get_runtime_option(self, option, default=None):
         return self.kwargs["runtime_options"].get(option, default)
 
-    def _create_interpreter(self, is_import):
+    def _create_interpreter(self, is_import, model=None):
         # move the import inside the function, so that onnxruntime needs to be installed
         # only if some one wants to use it
         import onnxruntime
@@ -125,6 +305,8 @@ class ONNXRTSession(BaseRTSession):
             self.kwargs["runtime_options"]["import"] = "no"
         #
         runtime_options = self.kwargs["runtime_options"]
+        # the model can also be given here as serialized bytes - eg. a modified one
+        model_file = model if model is not None else self.kwargs['model_file']
         sess_options = onnxruntime.SessionOptions()
         
         onnxruntime_graph_optimization_level = self.kwargs["runtime_options"].get('onnxruntime:graph_optimization_level', None)
@@ -139,11 +321,11 @@ class ONNXRTSession(BaseRTSession):
         if self.kwargs['tidl_offload']:
             ep_list = ['TIDLCompilationProvider', 'CPUExecutionProvider'] if is_import else \
                       ['TIDLExecutionProvider', 'CPUExecutionProvider']
-            interpreter = onnxruntime.InferenceSession(self.kwargs['model_file'], providers=ep_list,
+            interpreter = onnxruntime.InferenceSession(model_file, providers=ep_list,
                             provider_options=[runtime_options, {}], sess_options=sess_options)
         else:
             ep_list = ['CPUExecutionProvider']
-            interpreter = onnxruntime.InferenceSession(self.kwargs['model_file'], providers=ep_list,
+            interpreter = onnxruntime.InferenceSession(model_file, providers=ep_list,
                             provider_options=[{}], sess_options=sess_options)
         #
         return interpreter
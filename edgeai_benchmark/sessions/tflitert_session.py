@@ -42,9 +42,19 @@ class TFLiteRTSession(BaseRTSession):
     def __init__(self, session_name=constants.SESSION_NAME_TFLITERT, **kwargs):
         super().__init__(session_name=session_name, **kwargs)
         self.kwargs['input_data_layout'] = self.kwargs.get('input_data_layout', constants.NHWC)
+        # details of the inputs and outputs of the interpreter - got once when the interpreter is created
+        self.model_input_details = None
+        self.model_output_details = None
+        # functions that return views into the buffers of the interpreter - used with io_binding
+        self.input_tensors = None
+        self.output_tensors = None
 
     def import_model(self, calib_data, info_dict=None):
         super().import_model(calib_data)
+        if self.is_import_cached:
+            # artifacts have been restored from the artifacts cache
+            return info_dict
+        #
 
         # create the underlying interpreter
         self.interpreter = self._create_interpreter(is_import=True)
@@ -63,6 +73,7 @@ class TFLiteRTSession(BaseRTSession):
             outputs = [self._get_tensor(output_detail) for output_detail in self.interpreter.get_output_details()]
             self._update_output_details(outputs)
         #
+        self.is_import_complete = True
         return info_dict
 
     def start_infer(self):
@@ -71,6 +82,15 @@ class TFLiteRTSession(BaseRTSession):
         self.interpreter = self._create_interpreter(is_import=False)
         # input_details is needed during inference - get it if it is not given
         self._get_input_output_details_tflite(self.interpreter)
+        self.model_input_details = self.interpreter.get_input_details()
+        self.model_output_details = self.interpreter.get_output_details()
+        if self.kwargs['io_binding']:
+            # the inputs are written into and the outputs are read from the buffers of the interpreter directly.
+            # the quantized outputs are converted to float - so they are copied anyway
+            self.input_tensors = [self.interpreter.tensor(input_detail['index']) for input_detail in self.model_input_details]
+            self.output_tensors = [None if output_detail['dtype'] in (np.int8, np.uint8) else \
+                self.interpreter.tensor(output_detail['index']) for output_detail in self.model_output_details]
+        #
         os.chdir(self.cwd)
         return True
 
@@ -81,18 +101,39 @@ class TFLiteRTSession(BaseRTSession):
         if self.input_normalizer is not None:
             in_data, _ = self.input_normalizer(in_data, {})
         #
-        for (input_detail, c_data_entry) in zip(self.interpreter.get_input_details(), in_data):
-            self._set_tensor(input_detail, c_data_entry)
+        # the interpreter cannot be invoked while there are references into its buffers - release the ones held here
+        self.output_buffers = None
+        if self.input_tensors is not None:
+            for (input_tensor, c_data_entry) in zip(self.input_tensors, in_data):
+                # the view of the input buffer is not kept beyond this statement
+                input_tensor()[...] = c_data_entry
+            #
+        else:
+            for (input_detail, c_data_entry) in zip(self.model_input_details, in_data):
+                self._set_tensor(input_detail, c_data_entry)
+            #
         #
         # measure the time across only interpreter.run
         # time for setting the tensor and other overheads would be optimized out in c-api
         start_time = time.time()
         self.interpreter.invoke()
         info_dict['session_invoke_time'] = (time.time() - start_time)
-        outputs = [self._get_tensor(output_detail) for output_detail in self.interpreter.get_output_details()]
+        if self.output_tensors is not None:
+            outputs = [output_tensor() if output_tensor is not None else self._get_tensor(output_detail) \
+                for (output_tensor, output_detail) in zip(self.output_tensors, self.model_output_details)]
+            # these views are valid only till the next infer_frame() - see get_output_buffers()
+            self.output_buffers = [output for (output, output_tensor) in zip(outputs, self.output_tensors) if output_tensor is not None]
+        else:
+            outputs = [self._get_tensor(output_detail) for output_detail in self.model_output_details]
+        #
         self._update_output_details(outputs)
         return outputs, info_dict
 
+    def close_interpreter(self):
+        self.input_tensors = None
+        self.output_tensors = None
+        return super().close_interpreter()
+
     def set_runtime_option(self, option, value):
         self.kwargs["runtime_options"][option] = value
 
@@ -50,6 +50,10 @@ class TVMDLRSession(BaseRTSession):
         from tvm.relay.backend.contrib import tidl
         # prepare for actual model import
         super().import_model(calib_data, info_dict)
+        if self.is_import_cached:
+            # artifacts have been restored from the artifacts cache
+            return info_dict
+        #
 
         self._get_input_output_details()
 
@@ -143,6 +147,7 @@ class TVMDLRSession(BaseRTSession):
             os.symlink(f'{artifact_file}.{target_machine}', artifact_file)
         #
         os.chdir(self.cwd)
+        self.is_import_complete = True
         return info_dict
 
     def start_infer(self):
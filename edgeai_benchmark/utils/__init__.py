@@ -34,6 +34,7 @@ from .file_utils import *
 from .logger_utils import *
 from .parallel_pool import *
 from .parallel_run import *
+from .work_sharing import *
 from .environ_utils import *
 from .timer_utils import *
 from .metric_utils import *
@@ -42,5 +43,7 @@ from .transforms_utils import *
 from .onnx_utils import *
 from .model_utils import *
 from .import_utils import *
+from .hash_utils import *
 from .image_utils import *
+from .image_store import *
 from .artifacts_id_to_model_name import *
@@ -0,0 +1,105 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import hashlib
+import numpy as np
+
+
+def hash_file(file_name, hash_obj=None, chunk_size=1024*1024):
+    hash_obj = hash_obj if hash_obj is not None else hashlib.sha256()
+    with open(file_name, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            hash_obj.update(chunk)
+        #
+    #
+    return hash_obj
+
+
+def hash_object(obj, hash_obj=None):
+    '''
+    update hash_obj with a deterministic hash of obj.
+    handles nested dict/list/tuple, numpy arrays and basic python types.
+    dict keys are sorted, so that the order of insertion doesn't matter.
+    '''
+    hash_obj = hash_obj if hash_obj is not None else hashlib.sha256()
+    if isinstance(obj, dict):
+        hash_obj.update(b'{')
+        for key in sorted(obj.keys(), key=str):
+            hash_object(key, hash_obj)
+            hash_object(obj[key], hash_obj)
+        #
+        hash_obj.update(b'}')
+    elif isinstance(obj, (list, tuple)):
+        hash_obj.update(b'[')
+        for value in obj:
+            hash_object(value, hash_obj)
+        #
+        hash_obj.update(b']')
+    elif isinstance(obj, np.ndarray):
+        obj = np.ascontiguousarray(obj)
+        hash_obj.update(f'ndarray:{obj.dtype.str}:{obj.shape}:'.encode())
+        hash_obj.update(obj.tobytes())
+    else:
+        hash_obj.update(f'{type(obj).__name__}:{obj!r};'.encode())
+    #
+    return hash_obj
+
+
+def hash_digest(*objs, file_names=None):
+    '''
+    returns the hex digest of the given objects and the contents of the given files
+    '''
+    hash_obj = hashlib.sha256()
+    for obj in objs:
+        hash_object(obj, hash_obj)
+    #
+    file_names = file_names if isinstance(file_names, (list,tuple)) else \
+        ([file_names] if file_names is not None else [])
+    for file_name in file_names:
+        hash_file(file_name, hash_obj)
+    #
+    return hash_obj.hexdigest()
+
+
+def hash_folder_stats(folder_name):
+    '''
+    a cheap fingerprint of the files directly inside a folder - based on name, size and modification time.
+    useful to detect that a tools folder has been updated, without reading all the files.
+    '''
+    stats_list = []
+    if folder_name is not None and os.path.isdir(folder_name):
+        for file_name in sorted(os.listdir(folder_name)):
+            file_path = os.path.join(folder_name, file_name)
+            if os.path.isfile(file_path):
+                file_stat = os.stat(file_path)
+                stats_list.append((file_name, file_stat.st_size, file_stat.st_mtime_ns))
+            #
+        #
+    #
+    return hash_digest(stats_list)
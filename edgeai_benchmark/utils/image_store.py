@@ -0,0 +1,92 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+from . import logger_utils
+
+
+class ImageStore():
+    '''
+    store of decoded images that is shared by all the processes on a host - for example in /dev/shm.
+    each image is kept in a .npy file named by the hash of the image file path, its size and modification time
+    and the decode parameters (eg. the backend). the first process to decode an image publishes it here and
+    the others read it instead of decoding it again. the files are written atomically, so the store can be read
+    and written by several processes at the same time. the store is not cleaned up automatically.
+    '''
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+    def get(self, path, **decode_params):
+        store_file = self._get_store_file(path, decode_params)
+        if store_file is None or not os.path.exists(store_file):
+            return None
+        #
+        try:
+            return np.load(store_file, allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        #
+
+    def put(self, path, img_data, **decode_params):
+        store_file = self._get_store_file(path, decode_params)
+        if store_file is None or os.path.exists(store_file):
+            return
+        #
+        store_file_dir = os.path.dirname(store_file)
+        temp_file = None
+        try:
+            os.makedirs(store_file_dir, exist_ok=True)
+            fd, temp_file = tempfile.mkstemp(dir=store_file_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fp:
+                np.save(fp, np.ascontiguousarray(img_data), allow_pickle=False)
+            #
+            os.replace(temp_file, store_file)
+        except OSError as e:
+            # the store is only an optimization - the image that was decoded is still used
+            print(logger_utils.log_color('\nWARNING', 'image store', f'could not write to the image store: {store_file} - {e}'))
+        finally:
+            # the temp file is left only if the write has failed (eg. the store is full)
+            if temp_file is not None and os.path.exists(temp_file):
+                os.remove(temp_file)
+            #
+        #
+
+    def _get_store_file(self, path, decode_params):
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            return None
+        #
+        decode_params_str = ','.join(f'{k}={v}' for k, v in sorted(decode_params.items()))
+        key_str = f'{os.path.abspath(path)}:{file_stat.st_size}:{file_stat.st_mtime_ns}:{decode_params_str}'
+        key = hashlib.sha1(key_str.encode()).hexdigest()
+        return os.path.join(self.store_dir, key[:2], f'{key}.npy')
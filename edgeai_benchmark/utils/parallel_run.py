@@ -28,49 +28,136 @@
 
 import os
 import sys
+import signal
+import socket
+import uuid
 import multiprocessing
+import multiprocessing.connection
 from multiprocessing import pool
 import collections
 import time
 import traceback
 import queue
-import copy
+import yaml
 
 from .progress_step import *
 from .logger_utils import *
 
 
 class ParallelRun:
-    def __init__(self, parallel_processes, parallel_devices=None, desc='tasks', blocking=True, verbose=True, maxinterval=60):
+    '''
+    runs the queued tasks in parallel processes.
+    mode='process': a fresh process is forked for every task.
+    mode='worker': parallel_processes long lived worker processes are forked once and each of them runs
+        many tasks in sequence - so the modules imported and the datasets loaded are reused across tasks.
+        a worker is replaced by a fresh process only if it crashes, or after max_tasks_per_worker tasks.
+    memory_limit: if given (in bytes), a task is started only if its memory estimate (given in enqueue, or else the largest
+        peak seen so far) fits along with the tasks that are running. the memory of the running tasks is sampled every
+        memory_interval seconds and the peak of each task is available in task_peak_memory after run(). the private
+        memory (USS) is used where it is available, so that the pages shared with the parent after fork are not counted.
+        in mode='worker', the memory that the worker had when the task started is subtracted - so that what the
+        worker has kept from its earlier tasks is not counted as the memory of this task.
+    stage_processes: the tasks can be given a stage in enqueue (eg. 'import', 'infer') - this dict limits the number of
+        tasks of a stage that run at the same time. a task can also depend on tasks enqueued earlier - it is started only
+        after they have finished, and is skipped (with an empty result) if any of them returned an empty result.
+        the result of each task is available in task_results after run().
+    summary_file: if given, the result of each task is appended to this yaml file (as a separate document) as soon as
+        the task finishes - so that the completed results are not lost even if this process exits unexpectedly.
+        the file is not truncated - each run() first appends a header with a new run_id (along with the start time,
+        host and pid) and each record of that run carries the same run_id. summary_filter, if given, is called with the
+        result of each task - the tasks for which it returns False are not written (eg. the tasks that were skipped).
+    timeout: a task can be given a wall clock timeout in seconds in enqueue. a task that does not finish in time is killed
+        along with the processes that it has started (its process group) - and it is retried up to max_retries times,
+        waiting retry_backoff seconds before the first retry (doubled for each retry). after that it is marked as failed.
+    '''
+    def __init__(self, parallel_processes, parallel_devices=None, desc='tasks', blocking=True, verbose=True, maxinterval=60,
+                 mode='process', max_tasks_per_worker=None, memory_limit=None, memory_interval=1.0, stage_processes=None,
+                 summary_file=None, summary_filter=None, max_retries=0, retry_backoff=60):
         self.desc = desc
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.summary_file = summary_file
+        self.summary_filter = summary_filter
+        self.stage_processes = stage_processes or {}
+        self.mode = mode
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.memory_limit = memory_limit
+        self.memory_interval = memory_interval
         self.parallel_processes = parallel_processes
         self.parallel_devices = parallel_devices
+        # queued_tasks has the indices into task_list, of the tasks that are not started yet
+        self.task_list = []
+        self.task_memory = []
+        self.task_peak_memory = []
+        self.task_current_memory = dict()
+        self.task_base_memory = dict()
+        self.task_stages = []
+        self.task_names = []
+        self.task_dependencies = []
+        self.task_results = []
+        self.task_done = []
+        self.task_timeouts = []
+        self.task_retries = []
+        self.task_start_times = dict()
+        self.task_retry_times = dict()
+        self.use_process_groups = False
+        self.run_id = None
+        self.pbar_tasks = None
         self.queued_tasks = collections.deque()
+        self.process_task_ids = dict()
         self.maxinterval = maxinterval
         self.blocking = blocking
         self.verbose = verbose
         self.num_total_tasks = 0
         self.num_started_tasks = 0
-        self.result_queues_dict = dict()
+        self.result_conns_dict = dict()
         self.process_dict = dict()
+        self.worker_dict = dict()
         self.result_list = []
         if self.verbose:
-            print(log_color('\nINFO', "parallel_run", f"parallel_processes:{self.parallel_processes} parallel_devices={self.parallel_devices}"))
+            print(log_color('\nINFO', "parallel_run", f"parallel_processes:{self.parallel_processes} parallel_devices={self.parallel_devices}"
+                            f" memory_limit={self.memory_limit}"))
             sys.stdout.flush()
         #
 
-    def enqueue(self, task):
-        self.queued_tasks.append(task)
+    def enqueue(self, task, memory=None, stage=None, depends_on=None, name=None, timeout=None):
+        '''returns the task_id - that can be used in depends_on of the tasks enqueued later'''
+        task_id = len(self.task_list)
+        self.task_list.append(task)
+        self.task_names.append(name)
+        self.task_memory.append(memory)
+        self.task_peak_memory.append(None)
+        self.task_stages.append(stage)
+        self.task_dependencies.append(list(depends_on) if depends_on is not None else [])
+        self.task_results.append(None)
+        self.task_done.append(False)
+        self.task_timeouts.append(timeout)
+        self.task_retries.append(0)
+        self.queued_tasks.append(task_id)
+        return task_id
 
     def run(self):
         assert len(self.queued_tasks) > 0, f'at least one task must be queued, got {len(self.queued_tasks)}'
-        return self._run_parallel()
+        # each task process is put in its own process group, so that it can be killed along with its child processes
+        self.use_process_groups = any(self.task_timeouts)
+        if self.summary_file:
+            self._write_summary_header()
+        #
+        if self.mode == 'worker':
+            return self._run_workers()
+        elif self.mode == 'process':
+            return self._run_parallel()
+        else:
+            assert False, f'ParallelRun: unknown mode {self.mode}'
+        #
 
     def _run_sequential(self):
         self.result_list = []
-        for task_id, task in progress_step(self.queued_tasks, desc='tasks'):
-            result = task()
+        for task_id in progress_step(self.queued_tasks, desc='tasks'):
+            result = self.task_list[task_id]()
             self.result_list.append(result)
+            self.task_results[task_id] = result
+            self.task_done[task_id] = True
         #
         return self.result_list
 
@@ -78,18 +165,27 @@ class ParallelRun:
         self.result_list = []
         self.num_total_tasks = len(self.queued_tasks)
         self.num_started_tasks = 0
-        self.result_queues_dict = dict()
+        self.result_conns_dict = dict()
         self.process_dict = dict()
+        self.process_task_ids = dict()
         pbar_tasks = progress_step(iterable=range(self.num_total_tasks), desc=self.desc, position=1)
-        while len(self.result_list) < self.num_total_tasks:
-            try:
-                self._run_parallel_loop(pbar_tasks)
-            except Exception as exception_e:
-                print(f"Exception occurred in parallel loop: {exception_e} \nRestarting the parallel loop - remaining tasks: {len(self.queued_tasks)}")
-                traceback.print_exc()
-                # add a dummy result because a process/task has exited unexpectedly
-                self.result_list.append({})
-                pbar_tasks.update(1)
+        self.pbar_tasks = pbar_tasks
+        try:
+            while len(self.result_list) < self.num_total_tasks:
+                try:
+                    self._run_parallel_loop(pbar_tasks)
+                except Exception as exception_e:
+                    print(f"Exception occurred in parallel loop: {exception_e} \nRestarting the parallel loop - remaining tasks: {len(self.queued_tasks)}")
+                    traceback.print_exc()
+                    # add a dummy result because a process/task has exited unexpectedly
+                    self.result_list.append({})
+                    pbar_tasks.update(1)
+                #
+            #
+        finally:
+            # the processes that are still running at this point (eg. on KeyboardInterrupt) are not needed any more
+            for proc in self.process_dict.values():
+                self._kill_process(proc)
             #
         #
         pbar_tasks.close()
@@ -99,6 +195,7 @@ class ParallelRun:
     def _run_parallel_loop(self, pbar_tasks):
         mp_context = multiprocessing.get_context(method="fork") #fork, forkserver, spawn
         last_time = time.time()
+        last_memory_time = 0.0
 
         while len(self.result_list) < self.num_total_tasks:
             cur_time = time.time()
@@ -108,47 +205,90 @@ class ParallelRun:
                       f"len(result_list):{len(self.result_list)}"))
                 last_time = cur_time
             #
+            if self.memory_limit and (cur_time - last_memory_time) >= self.memory_interval:
+                self._sample_memory({self.process_task_ids[k]:p.pid for k, p in self.process_dict.items()})
+                last_memory_time = cur_time
+            #
 
             # start the processes
-            if len(self.process_dict) < self.parallel_processes and len(self.queued_tasks) > 0:
-                task = self.queued_tasks.pop()
-                result_queue = mp_context.SimpleQueue()
-                proc = mp_context.Process(target=self._worker, args=(task,self.num_started_tasks,result_queue))
+            while len(self.process_dict) < self.parallel_processes and len(self.queued_tasks) > 0:
+                task_id = self._pop_queued_task(list(self.process_task_ids.values()))
+                if task_id is None:
+                    break
+                #
+                task = self.task_list[task_id]
+                result_conn, child_conn = mp_context.Pipe(duplex=False)
+                proc = mp_context.Process(target=self._worker, args=(task,self.num_started_tasks,child_conn))
                 proc.start()
-                self.result_queues_dict[self.num_started_tasks] = result_queue
+                self._set_process_group(proc)
+                self.task_start_times[task_id] = time.time()
+                # the write end is only needed in the child
+                child_conn.close()
+                self.result_conns_dict[self.num_started_tasks] = result_conn
                 self.process_dict[self.num_started_tasks] = proc
+                self.process_task_ids[self.num_started_tasks] = task_id
                 self.num_started_tasks += 1
             #
 
+            # wait till a process sends its result or exits - there is no polling here
+            wait_dict = dict()
+            for r_key, proc in self.process_dict.items():
+                wait_dict[self.result_conns_dict[r_key]] = r_key
+                wait_dict[proc.sentinel] = r_key
+            #
+            wait_timeout = min(self.memory_interval, self.maxinterval) if self.memory_limit else self.maxinterval
+            wait_timeout = self._get_wait_timeout(wait_timeout, list(self.process_task_ids.values()))
+            if len(wait_dict) == 0:
+                # the queued tasks are waiting for their retry
+                time.sleep(wait_timeout)
+                continue
+            #
+            ready_list = multiprocessing.connection.wait(list(wait_dict.keys()), timeout=wait_timeout)
+
             # collect the available the results
-            result_queues_dict_shallow_copy = copy.copy(self.result_queues_dict)
-            for r_key, r_queue in result_queues_dict_shallow_copy.items():
+            ready_keys = list(dict.fromkeys([wait_dict[r] for r in ready_list]).keys())
+            for r_key in ready_keys:
                 result = {}
-                exception_e = None
-                if not r_queue.empty():
-                    (result, exception_e) = r_queue.get()
-                    self.result_list.append(result)
-                    self.result_queues_dict.pop(r_key)
-                    proc = self.process_dict.pop(r_key)
-                    proc.join()
-                    pbar_tasks.update(1)
-                elif not self.process_dict[r_key].is_alive():
-                    self.result_list.append(result)
-                    self.result_queues_dict.pop(r_key)
+                result_ok = False
+                result_conn = self.result_conns_dict.pop(r_key)
+                try:
+                    if result_conn.poll():
+                        (result, exception_e) = result_conn.recv()
+                        result_ok = True
+                    #
+                except (EOFError, OSError):
+                    pass
+                #
+                result_conn.close()
+                proc = self.process_dict.pop(r_key)
+                if not result_ok:
+                    self._kill_process(proc) # something has happened with the process, terminate it.
+                #
+                proc.join()
+                self._task_finished(self.process_task_ids.pop(r_key), result)
+            #
+
+            # kill the processes that have exceeded their timeout
+            for r_key in list(self.process_dict.keys()):
+                task_id = self.process_task_ids[r_key]
+                if self._is_task_timed_out(task_id):
                     proc = self.process_dict.pop(r_key)
-                    proc.terminate() # something has happened with the process, terminate it.
+                    self._kill_process(proc)
                     proc.join()
-                    pbar_tasks.update(1)
+                    self.result_conns_dict.pop(r_key).close()
+                    self.process_task_ids.pop(r_key)
+                    self._task_timed_out(task_id)
                 #
             #
-
-            time.sleep(0.1)
         #
         return self.result_list
 
-    def _worker(self, task, task_index, result_queue):
+    def _worker(self, task, task_index, result_conn):
         result = {}
         exception_e = None
+        if self.use_process_groups:
+            os.setpgid(0, 0)
+        #
         try:
             if self.parallel_devices is not None:
                 num_devices = len(self.parallel_devices)
@@ -162,6 +302,385 @@ class ParallelRun:
             traceback.print_exc()
             exception_e = e
         #
-        result_queue.put((result,exception_e))
+        try:
+            result_conn.send((result,exception_e))
+        except Exception:
+            # the exception may not be picklable
+            result_conn.send((result,None))
+        #
+        result_conn.close()
+
+    def _run_workers(self):
+        self.result_list = []
+        self.num_total_tasks = len(self.queued_tasks)
+        # the tasks are inherited by the workers (fork) - only the task index and the result is sent over the pipe
+        mp_context = multiprocessing.get_context(method="fork")
+        self.worker_dict = dict()
+        num_workers = min(self.parallel_processes, self.num_total_tasks)
+        pbar_tasks = progress_step(iterable=range(self.num_total_tasks), desc=self.desc, position=1)
+        self.pbar_tasks = pbar_tasks
+        try:
+            for worker_index in range(num_workers):
+                self._start_worker(mp_context, worker_index)
+            #
+            last_memory_time = 0.0
+            while len(self.result_list) < self.num_total_tasks:
+                # assign tasks to the idle workers
+                for worker_index, worker in self.worker_dict.items():
+                    if worker['task_index'] is None and len(self.queued_tasks) > 0:
+                        running_task_ids = [w['task_index'] for w in self.worker_dict.values() if w['task_index'] is not None]
+                        worker['task_index'] = self._pop_queued_task(running_task_ids)
+                        if worker['task_index'] is not None:
+                            self.task_start_times[worker['task_index']] = time.time()
+                            if self.memory_limit:
+                                self.task_base_memory[worker['task_index']] = get_process_tree_memory(worker['proc'].pid) or 0
+                            #
+                            worker['conn'].send(worker['task_index'])
+                        #
+                    #
+                #
+                # wait till a worker sends a result or exits - there is no polling here
+                wait_dict = dict()
+                for worker_index, worker in self.worker_dict.items():
+                    if worker['task_index'] is not None:
+                        wait_dict[worker['conn']] = worker_index
+                        wait_dict[worker['proc'].sentinel] = worker_index
+                    #
+                #
+                wait_timeout = self.memory_interval if self.memory_limit else self.maxinterval
+                running_task_ids = [w['task_index'] for w in self.worker_dict.values() if w['task_index'] is not None]
+                wait_timeout = self._get_wait_timeout(wait_timeout, running_task_ids)
+                ready_list = multiprocessing.connection.wait(list(wait_dict.keys()), timeout=wait_timeout)
+                if self.memory_limit and (time.time() - last_memory_time) >= self.memory_interval:
+                    self._sample_memory({w['task_index']:w['proc'].pid for w in self.worker_dict.values() if w['task_index'] is not None})
+                    last_memory_time = time.time()
+                #
+                if len(ready_list) == 0 and self.verbose and not self.memory_limit:
+                    print(log_color('\nINFO', "parallel_run", f"num_total_tasks:{self.num_total_tasks} "
+                          f"len(queued_tasks):{len(self.queued_tasks)} len(worker_dict):{len(self.worker_dict)} "
+                          f"len(result_list):{len(self.result_list)}"))
+                #
+                ready_workers = list(dict.fromkeys([wait_dict[r] for r in ready_list]).keys())
+                for worker_index in ready_workers:
+                    self._collect_worker(mp_context, worker_index)
+                #
+                # kill and replace the workers whose task has exceeded its timeout
+                for worker_index in list(self.worker_dict.keys()):
+                    task_id = self.worker_dict[worker_index]['task_index']
+                    if task_id is not None and self._is_task_timed_out(task_id):
+                        self._stop_worker(worker_index, terminate=True)
+                        self._start_worker(mp_context, worker_index)
+                        self._task_timed_out(task_id)
+                    #
+                #
+            #
+        finally:
+            self._stop_workers()
+        #
+        pbar_tasks.close()
+        print('\n')
+        return self.result_list
+
+    def _start_worker(self, mp_context, worker_index):
+        parent_conn, child_conn = mp_context.Pipe()
+        proc = mp_context.Process(target=self._worker_loop, args=(worker_index, child_conn))
+        proc.start()
+        self._set_process_group(proc)
+        # the child end is not needed in the parent and must not be inherited by the workers forked later
+        child_conn.close()
+        self.worker_dict[worker_index] = dict(proc=proc, conn=parent_conn, task_index=None, num_tasks=0)
+
+    def _collect_worker(self, mp_context, worker_index):
+        worker = self.worker_dict[worker_index]
+        result = {}
+        worker_ok = False
+        try:
+            if worker['conn'].poll():
+                result = worker['conn'].recv()
+                worker_ok = True
+            #
+        except (EOFError, OSError):
+            pass
+        #
+        self._task_finished(worker['task_index'], result)
+        worker['task_index'] = None
+        worker['num_tasks'] += 1
+        if not worker_ok:
+            # the worker has exited unexpectedly - replace it with a fresh process
+            print(log_color('\nWARNING', "parallel_run", f"worker {worker_index} exited unexpectedly - starting a new worker"))
+            self._stop_worker(worker_index, terminate=True)
+            self._start_worker(mp_context, worker_index)
+        elif self.max_tasks_per_worker and worker['num_tasks'] >= self.max_tasks_per_worker:
+            # recycle the worker to release the resources that it has accumulated
+            self._stop_worker(worker_index)
+            self._start_worker(mp_context, worker_index)
+        #
 
+    def _stop_worker(self, worker_index, terminate=False):
+        worker = self.worker_dict.pop(worker_index)
+        if not terminate:
+            try:
+                worker['conn'].send(None)
+            except (BrokenPipeError, OSError):
+                terminate = True
+            #
+        #
+        if terminate:
+            self._kill_process(worker['proc'])
+        #
+        worker['proc'].join()
+        worker['conn'].close()
+
+    def _stop_workers(self):
+        for worker_index in list(self.worker_dict.keys()):
+            # a worker that is still busy at this point can only be stopped by terminating it
+            terminate = (self.worker_dict[worker_index]['task_index'] is not None)
+            self._stop_worker(worker_index, terminate=terminate)
+        #
 
+    def _worker_loop(self, worker_index, conn):
+        if self.use_process_groups:
+            os.setpgid(0, 0)
+        #
+        # close the connections of the other workers that are inherited from the parent
+        for other_worker in self.worker_dict.values():
+            other_worker['conn'].close()
+        #
+        if self.parallel_devices is not None:
+            num_devices = len(self.parallel_devices)
+            parallel_device = self.parallel_devices[worker_index%num_devices]
+            os.environ['CUDA_VISIBLE_DEVICES'] = str(parallel_device)
+            print(log_color('\nINFO', 'starting worker on parallel_device', parallel_device))
+        #
+        while True:
+            try:
+                task_index = conn.recv()
+            except EOFError:
+                break
+            #
+            if task_index is None:
+                break
+            #
+            result = {}
+            try:
+                result = self.task_list[task_index]()
+            except Exception as e:
+                print(f"Exception occurred in worker process: {e}")
+                traceback.print_exc()
+            #
+            conn.send(result)
+        #
+        conn.close()
+
+    def _get_task_memory(self, task_id):
+        memory = self.task_memory[task_id]
+        if memory is None:
+            # no estimate for this task - use the largest peak seen so far, to be on the safe side
+            peak_memory_list = [m for m in self.task_peak_memory if m is not None]
+            memory = max(peak_memory_list) if len(peak_memory_list) > 0 else 0
+        #
+        return memory
+
+    def _set_process_group(self, proc):
+        # this is done in the parent as well as in the child - so that it is in place whichever of them runs first
+        if self.use_process_groups:
+            try:
+                os.setpgid(proc.pid, proc.pid)
+            except (ProcessLookupError, PermissionError):
+                pass
+            #
+        #
+
+    def _kill_process(self, proc):
+        if self.use_process_groups:
+            # the processes started by the task are in its process group - they are killed as well
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+            #
+        elif proc.is_alive():
+            proc.terminate()
+        #
+
+    def _is_task_timed_out(self, task_id):
+        timeout = self.task_timeouts[task_id]
+        return bool(timeout) and (time.time() - self.task_start_times[task_id]) > timeout
+
+    def _get_wait_timeout(self, wait_timeout, running_task_ids):
+        # wake up in time to kill the tasks that exceed their timeout and to start the tasks that are waiting for retry
+        wake_times = [self.task_start_times[t] + self.task_timeouts[t] for t in running_task_ids if self.task_timeouts[t]]
+        wake_times += [self.task_retry_times[t] for t in self.queued_tasks if t in self.task_retry_times]
+        if len(wake_times) > 0:
+            wait_timeout = max(min(wait_timeout, min(wake_times) - time.time()), 0.0)
+        #
+        return wait_timeout
+
+    def _task_timed_out(self, task_id):
+        self.task_current_memory.pop(task_id, None)
+        self.task_base_memory.pop(task_id, None)
+        self.task_retries[task_id] += 1
+        if self.task_retries[task_id] <= self.max_retries:
+            retry_backoff = self.retry_backoff * (2 ** (self.task_retries[task_id] - 1))
+            print(log_color('\nWARNING', "parallel_run", f"task {task_id} {self.task_names[task_id] or ''} timed out after "
+                  f"{self.task_timeouts[task_id]} sec - retry {self.task_retries[task_id]}/{self.max_retries} in {retry_backoff} sec"))
+            self.task_retry_times[task_id] = time.time() + retry_backoff
+            self.queued_tasks.append(task_id)
+        else:
+            print(log_color('\nWARNING', "parallel_run", f"task {task_id} {self.task_names[task_id] or ''} timed out after "
+                  f"{self.task_timeouts[task_id]} sec - marking it as failed"))
+            self._task_finished(task_id, {}, status='timeout')
+        #
+
+    def _task_finished(self, task_id, result, status=None):
+        self.result_list.append(result)
+        self.task_results[task_id] = result
+        self.task_done[task_id] = True
+        self.task_current_memory.pop(task_id, None)
+        self.task_base_memory.pop(task_id, None)
+        if self.summary_file and (self.summary_filter is None or self.summary_filter(result)):
+            self._write_summary(task_id, result, status)
+        #
+        if self.pbar_tasks is not None:
+            self.pbar_tasks.update(1)
+        #
+
+    def _write_summary_header(self):
+        # the task_ids start from 0 in every run - the run_id tells the records of this run apart from those of
+        # the earlier runs (or of the other hosts) that are in the same file
+        start_time = time.time()
+        self.run_id = f'{time.strftime("%Y%m%d-%H%M%S", time.localtime(start_time))}-{uuid.uuid4().hex[:8]}'
+        summary = dict(run_id=self.run_id, start_time=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_time)),
+                       host=socket.gethostname(), pid=os.getpid(), desc=self.desc, num_tasks=len(self.queued_tasks))
+        self._append_summary(yaml.safe_dump(summary, explicit_start=True, sort_keys=False))
+
+    def _write_summary(self, task_id, result, status=None):
+        status = status or ('ok' if result else 'failed')
+        summary = dict(run_id=self.run_id, task_id=task_id, name=self.task_names[task_id], stage=self.task_stages[task_id],
+                       status=status, retries=self.task_retries[task_id], peak_memory=self.task_peak_memory[task_id],
+                       result=result)
+        try:
+            summary_str = yaml.safe_dump(summary, explicit_start=True, sort_keys=False)
+        except yaml.YAMLError:
+            summary['result'] = str(result)
+            summary_str = yaml.safe_dump(summary, explicit_start=True, sort_keys=False)
+        #
+        self._append_summary(summary_str)
+
+    def _append_summary(self, summary_str):
+        try:
+            with open(self.summary_file, 'a') as fp:
+                fp.write(summary_str)
+                fp.flush()
+                os.fsync(fp.fileno())
+            #
+        except OSError as e:
+            print(log_color('\nWARNING', "parallel_run", f"could not write to summary_file: {self.summary_file} - {e}"))
+        #
+
+    def _skip_failed_dependents(self):
+        # the tasks that depend on a task that has failed (returned an empty result) are not run
+        for task_id in list(self.queued_tasks):
+            dependencies = self.task_dependencies[task_id]
+            if any((self.task_done[d] and not self.task_results[d]) for d in dependencies):
+                print(log_color('\nWARNING', "parallel_run", f"skipping task {task_id} - a task that it depends on has failed"))
+                self.queued_tasks.remove(task_id)
+                self._task_finished(task_id, {})
+            #
+        #
+
+    def _pop_queued_task(self, running_task_ids):
+        if len(self.task_dependencies) > 0 and any(self.task_dependencies):
+            self._skip_failed_dependents()
+        #
+        memory_used = sum(max(self._get_task_memory(t), self.task_current_memory.get(t, 0)) for t in running_task_ids) \
+            if self.memory_limit else 0
+        running_stages = collections.Counter([self.task_stages[t] for t in running_task_ids])
+        # tasks are taken from the end of the queue
+        # the tasks that are not ready or the heavy tasks that do not fit now are delayed - the next one is started instead
+        cur_time = time.time()
+        for queue_index in range(len(self.queued_tasks)-1, -1, -1):
+            task_id = self.queued_tasks[queue_index]
+            if not all(self.task_done[d] for d in self.task_dependencies[task_id]):
+                continue
+            #
+            if self.task_retry_times.get(task_id, 0) > cur_time:
+                continue
+            #
+            stage = self.task_stages[task_id]
+            stage_processes = self.stage_processes.get(stage, None) if stage is not None else None
+            if stage_processes and running_stages[stage] >= stage_processes:
+                continue
+            #
+            # at least one task is always run, even if it does not fit in memory_limit
+            if (not self.memory_limit) or len(running_task_ids) == 0 or \
+                    (memory_used + self._get_task_memory(task_id) <= self.memory_limit):
+                del self.queued_tasks[queue_index]
+                return task_id
+            #
+        #
+        waiting_tasks = [t for t in self.queued_tasks if self.task_retry_times.get(t, 0) <= cur_time]
+        if len(running_task_ids) == 0 and len(waiting_tasks) > 0:
+            # nothing is running, but nothing is ready either (can happen if a task has been lost) - do not wait forever
+            self.queued_tasks.remove(waiting_tasks[-1])
+            return waiting_tasks[-1]
+        #
+        return None
+
+    def _sample_memory(self, task_pids):
+        for task_id, pid in task_pids.items():
+            memory = get_process_tree_memory(pid)
+            if memory is not None:
+                memory = max(memory - self.task_base_memory.get(task_id, 0), 0)
+                self.task_current_memory[task_id] = memory
+                self.task_peak_memory[task_id] = max(memory, self.task_peak_memory[task_id] or 0)
+            #
+        #
+
+
+def get_process_tree_memory(pid):
+    '''
+    memory (in bytes) of a process and its child processes. returns None if it is not available (non linux).
+    the private memory (USS) is used if /proc/<pid>/smaps_rollup is available - otherwise the resident memory (RSS).
+    '''
+    memory = None
+    pid_list = [pid]
+    while len(pid_list) > 0:
+        cur_pid = pid_list.pop()
+        try:
+            process_memory = _get_process_memory(cur_pid)
+            if process_memory is not None:
+                memory = (memory or 0) + process_memory
+            #
+            for task_dir in os.listdir(f'/proc/{cur_pid}/task'):
+                with open(f'/proc/{cur_pid}/task/{task_dir}/children') as fp:
+                    pid_list += [int(c) for c in fp.read().split()]
+                #
+            #
+        except (OSError, ValueError, IndexError):
+            pass
+        #
+    #
+    return memory
+
+
+def _get_process_memory(pid):
+    try:
+        # the pages shared with other processes (eg. the copy on write pages of a forked child) are not counted
+        with open(f'/proc/{pid}/smaps_rollup') as fp:
+            private_memory = [int(line.split()[1]) for line in fp if line.startswith(('Private_Clean:', 'Private_Dirty:'))]
+        #
+        if len(private_memory) > 0:
+            return sum(private_memory) * 1024
+        #
+    except (OSError, ValueError, IndexError):
+        pass
+    #
+    try:
+        page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        with open(f'/proc/{pid}/statm') as fp:
+            return int(fp.read().split()[1]) * page_size
+        #
+    except (OSError, ValueError, IndexError):
+        return None
+    #
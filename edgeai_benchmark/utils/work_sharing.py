@@ -0,0 +1,217 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import socket
+import threading
+import uuid
+
+from . import logger_utils
+
+
+class WorkSharing():
+    '''
+    Sharing of work between several hosts (or several processes on one host) that use the same lease_dir
+    on a shared file system. A work item (identified by a key) is claimed by creating its lease file atomically.
+    The holder of a lease keeps renewing it - a lease that has not been renewed for lease_timeout seconds
+    belongs to a dead host and is reclaimed by another. A done file is written once the work item is completed.
+    The time on the shared file system is used to check the leases - so that the clocks of the hosts need not match.
+    '''
+    def __init__(self, lease_dir, lease_timeout=600, poll_interval=None):
+        self.lease_dir = lease_dir
+        self.lease_timeout = lease_timeout
+        self.poll_interval = poll_interval if poll_interval is not None else max(min(lease_timeout/4, 30), 0.1)
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        os.makedirs(self.lease_dir, exist_ok=True)
+
+    def get_lease_file(self, key):
+        return os.path.join(self.lease_dir, f'{key}.lease')
+
+    def get_done_file(self, key):
+        return os.path.join(self.lease_dir, f'{key}.done')
+
+    def is_done(self, key):
+        return os.path.exists(self.get_done_file(key))
+
+    def is_claimable(self, key):
+        if self.is_done(key):
+            return False
+        #
+        lease_time = self._get_lease_time(self.get_lease_file(key))
+        return lease_time is None or self._is_expired(lease_time)
+
+    def claim(self, key):
+        '''
+        returns a WorkLease if the work item could be claimed - None if it is done or held by another host.
+        '''
+        if self.is_done(key):
+            return None
+        #
+        lease_file = self.get_lease_file(key)
+        token = uuid.uuid4().hex
+        if not self._create_lease(lease_file, token):
+            if not self._reclaim_lease(lease_file, token):
+                return None
+            #
+            if not self._create_lease(lease_file, token):
+                return None
+            #
+        #
+        lease = WorkLease(self, key, token)
+        # it may have been completed by another host, just before we created the lease
+        if self.is_done(key):
+            lease.release()
+            return None
+        #
+        lease.start()
+        return lease
+
+    def _create_lease(self, lease_file, token):
+        try:
+            fd = os.open(lease_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        #
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(f'owner: {self.owner}\ntoken: {token}\n')
+        #
+        return True
+
+    def _reclaim_lease(self, lease_file, token):
+        lease_time = self._get_lease_time(lease_file)
+        if lease_time is not None and not self._is_expired(lease_time):
+            return False
+        #
+        # move the expired lease out of the way - only one of the hosts trying this can succeed
+        stale_file = f'{lease_file}.{token}'
+        try:
+            os.rename(lease_file, stale_file)
+        except FileNotFoundError:
+            return lease_time is None
+        #
+        if not self._is_expired(self._get_lease_time(stale_file)):
+            # another host had reclaimed it in the meantime - put its lease back
+            try:
+                os.link(stale_file, lease_file)
+            except FileExistsError:
+                pass
+            #
+            os.remove(stale_file)
+            return False
+        #
+        os.remove(stale_file)
+        print(logger_utils.log_color('\nINFO', 'work sharing', f'reclaimed the expired lease: {os.path.basename(lease_file)}'))
+        return True
+
+    def _get_lease_time(self, lease_file):
+        try:
+            return os.stat(lease_file).st_mtime
+        except FileNotFoundError:
+            return None
+        #
+
+    def _is_expired(self, lease_time):
+        return lease_time is None or (self._get_current_time() - lease_time) > self.lease_timeout
+
+    def _get_current_time(self):
+        # current time as seen by the shared file system
+        time_file = os.path.join(self.lease_dir, f'.time.{socket.gethostname()}.{os.getpid()}')
+        with open(time_file, 'w'):
+            pass
+        #
+        current_time = os.stat(time_file).st_mtime
+        os.remove(time_file)
+        return current_time
+
+
+class WorkLease():
+    def __init__(self, work_sharing, key, token):
+        self.work_sharing = work_sharing
+        self.key = key
+        self.token = token
+        self.lease_file = work_sharing.get_lease_file(key)
+        self.stop_event = threading.Event()
+        self.renew_thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.release()
+
+    def start(self):
+        self.renew_thread = threading.Thread(target=self._renew_loop, daemon=True)
+        self.renew_thread.start()
+
+    def set_done(self, status='done'):
+        done_file = self.work_sharing.get_done_file(self.key)
+        with open(f'{done_file}.{self.token}', 'w') as fp:
+            fp.write(f'owner: {self.work_sharing.owner}\nstatus: {status}\n')
+        #
+        os.replace(f'{done_file}.{self.token}', done_file)
+
+    def release(self):
+        self.stop_event.set()
+        if self.renew_thread is not None:
+            self.renew_thread.join()
+            self.renew_thread = None
+        #
+        if self._is_owner():
+            try:
+                os.remove(self.lease_file)
+            except FileNotFoundError:
+                pass
+            #
+        #
+
+    def _is_owner(self):
+        try:
+            with open(self.lease_file) as fp:
+                return self.token in fp.read()
+            #
+        except FileNotFoundError:
+            return False
+        #
+
+    def _renew_loop(self):
+        renew_interval = self.work_sharing.lease_timeout / 4
+        while not self.stop_event.wait(renew_interval):
+            try:
+                # the lease file can be replaced or removed by a host that reclaims it, just after the check
+                lease_renewed = self._is_owner()
+                if lease_renewed:
+                    os.utime(self.lease_file)
+                #
+            except FileNotFoundError:
+                lease_renewed = False
+            #
+            if not lease_renewed:
+                print(logger_utils.log_color('\nWARNING', 'work sharing', f'the lease has been lost: {os.path.basename(self.lease_file)}'))
+                break
+            #
+        #
@@ -0,0 +1,81 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# micro-benchmark of the lidar Voxelization transform - compares the vectorized _voxelize() with
+# the reference implementation on synthetic KITTI sized point clouds and checks that the outputs match
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+if os.path.split(os.getcwd())[-1] == 'scripts':
+    os.chdir('../')
+#
+sys.path.insert(0, os.getcwd())
+from edgeai_benchmark.preprocess.transforms import Voxelization
+
+
+def make_point_cloud(seed, num_points, num_clusters):
+    # points grouped around a set of centers that are spread a bit beyond the voxelization range
+    rng = np.random.default_rng(seed)
+    centers = np.stack([rng.uniform(-10, 80, num_clusters), rng.uniform(-50, 50, num_clusters),
+                        rng.uniform(-2.5, 0.5, num_clusters)], axis=1)
+    points = centers[rng.integers(0, num_clusters, num_points)] + rng.normal(0, 0.1, (num_points, 3))
+    intensity = rng.uniform(0, 1, (num_points, 1))
+    return np.concatenate([points, intensity], axis=1).astype(np.float32)
+
+
+def time_function(func, lidar_data, num_repeats):
+    outputs = func(lidar_data)
+    start_time = time.time()
+    for _ in range(num_repeats):
+        func(lidar_data)
+    #
+    return outputs, (time.time() - start_time) / num_repeats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_points', default=[30000, 60000, 120000], type=int, nargs='*')
+    parser.add_argument('--num_clusters', default=1000, type=int)
+    parser.add_argument('--num_repeats', default=5, type=int)
+    cmds = parser.parse_args()
+
+    voxelization = Voxelization()
+    for num_points in cmds.num_points:
+        lidar_data = make_point_cloud(0, num_points, cmds.num_clusters)
+        (input0, input2), voxelize_time = time_function(voxelization._voxelize, lidar_data, cmds.num_repeats)
+        (input0_ref, input2_ref), reference_time = time_function(voxelization._voxelize_reference, lidar_data, cmds.num_repeats)
+        is_equal = np.array_equal(input0, input0_ref) and np.array_equal(input2, input2_ref)
+        num_voxels = int(np.argmax(input2[0, 0] == -1))
+        print(f'num_points={num_points} num_voxels={num_voxels} voxelize={voxelize_time*1000:.2f}ms '
+              f'reference={reference_time*1000:.2f}ms speedup={reference_time/voxelize_time:.1f}x equal={is_equal}')
+    #
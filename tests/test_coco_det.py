@@ -0,0 +1,139 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# COCODetection.evaluate() builds the detections as an array that is passed to loadRes() directly - this checks it
+# against the previous path: a dict per box from _format_detections(), written to a json file and read by loadRes()
+# run from the root of the repository: python -m pytest tests/test_coco_det.py
+
+import os
+import sys
+import copy
+import json
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from edgeai_benchmark.datasets.coco_det import COCODetection
+
+
+NUM_IMAGES = 20
+NUM_CATEGORIES = 5
+
+
+def make_coco_dataset(tmp_path):
+    # synthetic ground truth - a few boxes in each image
+    rng = np.random.default_rng(0)
+    images, annotations = [], []
+    for image_id in range(1, NUM_IMAGES+1):
+        images.append(dict(id=image_id, file_name=f'{image_id:06d}.jpg', width=640, height=480))
+        for _ in range(rng.integers(1, 6)):
+            x, y = rng.uniform(0, 500), rng.uniform(0, 350)
+            w, h = rng.uniform(10, 130), rng.uniform(10, 120)
+            annotations.append(dict(id=len(annotations)+1, image_id=image_id, category_id=int(rng.integers(1, NUM_CATEGORIES+1)),
+                                    bbox=[x, y, w, h], area=w*h, iscrowd=0))
+        #
+    #
+    categories = [dict(id=c, name=f'class{c}', supercategory='none') for c in range(1, NUM_CATEGORIES+1)]
+    annotation_file = os.path.join(str(tmp_path), 'instances.json')
+    with open(annotation_file, 'w') as fp:
+        json.dump(dict(images=images, annotations=annotations, categories=categories), fp)
+    #
+    return COCODetection(num_classes=NUM_CATEGORIES, image_dir=str(tmp_path), annotation_file=annotation_file)
+
+
+def make_predictions(coco_dataset, dtypes):
+    # boxes around the ground truth with some noise, in rows of [x1, y1, x2, y2, label, score]
+    rng = np.random.default_rng(1)
+    predictions = []
+    for frame_idx, image_id in enumerate(coco_dataset.img_ids):
+        frame_dets = []
+        for ann in coco_dataset.coco_dataset.imgToAnns[image_id]:
+            x, y, w, h = ann['bbox'] + rng.normal(0, 3, 4)
+            # label 0 is mapped to category 0 with label_offset 0 - which is dropped
+            label = ann['category_id'] if rng.uniform() > 0.1 else 0
+            frame_dets.append([x, y, x+w, y+h, label, rng.uniform(0.05, 1.0)])
+        #
+        frame_dets += [[*rng.uniform(0, 300, 2), *rng.uniform(300, 600, 2), rng.integers(1, NUM_CATEGORIES+1),
+                        rng.uniform(0.05, 0.5)] for _ in range(rng.integers(0, 4))]
+        predictions.append(np.array(frame_dets, dtype=dtypes[frame_idx % len(dtypes)]).reshape(-1, 6))
+    #
+    return predictions
+
+
+def load_detections_json(coco_dataset, predictions, tmp_path, label_offset=0):
+    # the previous path of evaluate()
+    detections_formatted_list = []
+    for frame_idx, det_frame in enumerate(copy.deepcopy(predictions)):
+        for det in det_frame:
+            det = coco_dataset._format_detections(det, frame_idx, label_offset=label_offset)
+            if det['category_id'] >= 1:
+                detections_formatted_list.append(det)
+            #
+        #
+    #
+    detection_file = os.path.join(str(tmp_path), 'detection_results.json')
+    with open(detection_file, 'w') as det_fp:
+        json.dump(detections_formatted_list, det_fp)
+    #
+    return coco_dataset.coco_dataset.loadRes(detection_file)
+
+
+def check_detections(coco_dataset, predictions, tmp_path):
+    coco_det_json = load_detections_json(coco_dataset, predictions, tmp_path)
+    detections_formatted = coco_dataset._format_detections_array(predictions)
+    coco_det = coco_dataset.coco_dataset.loadRes(detections_formatted)
+    anns_json = sorted(coco_det_json.anns.values(), key=lambda a: a['id'])
+    anns = sorted(coco_det.anns.values(), key=lambda a: a['id'])
+    assert len(anns) == len(anns_json) > 0
+    for ann, ann_json in zip(anns, anns_json):
+        assert ann['image_id'] == ann_json['image_id'] and ann['category_id'] == ann_json['category_id']
+        assert [float(v) for v in ann['bbox']] == ann_json['bbox']
+        assert float(ann['score']) == ann_json['score']
+        assert float(ann['area']) == ann_json['area']
+    #
+    # the accuracy from evaluate() is the same as from the previous path - also with eval_processes
+    accuracy = coco_dataset.evaluate(predictions)
+    accuracy_parallel = coco_dataset.evaluate(predictions, eval_processes=3)
+    from pycocotools.cocoeval import COCOeval
+    coco_eval = COCOeval(coco_dataset.coco_dataset, coco_det_json, iouType='bbox')
+    coco_eval.evaluate()
+    coco_eval.accumulate()
+    coco_eval.summarize()
+    accuracy_json = {'accuracy_ap[.5:.95]%': coco_eval.stats[0]*100.0, 'accuracy_ap50%': coco_eval.stats[1]*100.0}
+    assert accuracy == accuracy_json and accuracy_parallel == accuracy_json
+
+
+def test_coco_det_float32(tmp_path):
+    coco_dataset = make_coco_dataset(tmp_path)
+    check_detections(coco_dataset, make_predictions(coco_dataset, [np.float32]), tmp_path)
+
+
+def test_coco_det_mixed_precision(tmp_path):
+    # frames of different precisions - the width and height of each are computed in its own precision
+    coco_dataset = make_coco_dataset(tmp_path)
+    check_detections(coco_dataset, make_predictions(coco_dataset, [np.float32, np.float64]), tmp_path)
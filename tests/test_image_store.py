@@ -0,0 +1,69 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# tests of the host wide store of decoded images
+# run from the root of the repository: python -m pytest tests/test_image_store.py
+
+import os
+import sys
+from unittest import mock
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from edgeai_benchmark.utils.image_store import ImageStore
+
+
+def _list_store(image_store):
+    return [f for _, _, files in os.walk(image_store.store_dir) for f in files]
+
+
+def test_image_store_put_get(tmp_path):
+    image_file = tmp_path / 'image.jpg'
+    image_file.write_bytes(b'image')
+    image_store = ImageStore(str(tmp_path / 'store'))
+    img_data = np.arange(12, dtype=np.uint8).reshape(2, 2, 3)
+    assert image_store.get(str(image_file), backend='pil') is None
+    image_store.put(str(image_file), img_data, backend='pil')
+    assert np.array_equal(image_store.get(str(image_file), backend='pil'), img_data)
+    assert image_store.get(str(image_file), backend='cv2') is None
+
+
+def test_image_store_put_failure(tmp_path):
+    # a write that fails (eg. the store is full) must not leave the temp file in the store
+    image_file = tmp_path / 'image.jpg'
+    image_file.write_bytes(b'image')
+    image_store = ImageStore(str(tmp_path / 'store'))
+    img_data = np.zeros((2, 2, 3), dtype=np.uint8)
+    for func_name in ('numpy.save', 'os.replace'):
+        with mock.patch(func_name, side_effect=OSError(28, 'No space left on device')):
+            image_store.put(str(image_file), img_data, backend='pil')
+        #
+        assert _list_store(image_store) == []
+        assert image_store.get(str(image_file), backend='pil') is None
+    #
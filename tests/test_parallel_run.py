@@ -0,0 +1,249 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# tests of the parallel runs of the pipelines (utils.ParallelRun through PipelineRunner)
+# run from the root of the repository: python -m pytest tests/test_parallel_run.py
+
+import os
+import sys
+import time
+import signal
+import socket
+import functools
+import threading
+import subprocess
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from edgeai_benchmark import config_dict
+from edgeai_benchmark import utils
+from edgeai_benchmark.pipelines.pipeline_runner import PipelineRunner
+
+
+class FakeSession():
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+
+    def get_param(self, name):
+        assert name == 'run_dir'
+        return self.run_dir
+
+
+def _get_stage(settings):
+    return 'import' if not settings.run_inference else ('infer' if not settings.run_import else None)
+
+
+def _run_fake_pipeline(settings, pipeline_config, description=''):
+    # the import of the model named hang does not return - it also starts a process that would outlive it
+    stage = _get_stage(settings)
+    run_dir = pipeline_config['session'].get_param('run_dir')
+    if os.path.basename(run_dir) == 'hang' and settings.run_import:
+        proc = subprocess.Popen(['sleep', '600'])
+        with open(os.path.join(run_dir, 'child.pid'), 'w') as fp:
+            fp.write(str(proc.pid))
+        #
+        time.sleep(600)
+    #
+    if settings.run_inference:
+        # takes longer than parallel_import_timeout - but it is within parallel_infer_timeout
+        time.sleep(1.5)
+    #
+    return {'stage': stage}
+
+
+def _make_runner(work_dir, model_names, **kwargs):
+    settings = config_dict.ConfigDict()
+    settings.update(kwargs)
+    pipeline_configs = {}
+    for model_name in model_names:
+        run_dir = os.path.join(work_dir, model_name)
+        os.makedirs(run_dir)
+        pipeline_configs[model_name] = dict(session=FakeSession(run_dir))
+    #
+    # filter_pipeline_configs() needs real configs - it is not needed here
+    pipeline_runner = PipelineRunner.__new__(PipelineRunner)
+    pipeline_runner.settings = settings
+    pipeline_runner.pipeline_configs = pipeline_configs
+    return pipeline_runner
+
+
+def _read_summary(summary_file):
+    with open(summary_file) as fp:
+        return [doc for doc in yaml.safe_load_all(fp) if doc is not None]
+    #
+
+
+def _is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    #
+    # a zombie is not alive - it has not been reaped, as it is not our child
+    with open(f'/proc/{pid}/stat') as fp:
+        return fp.read().split(')')[-1].split()[0] != 'Z'
+    #
+
+
+def test_import_timeout(tmp_path):
+    # the import and inference of a model are in the same task by default (parallel_stage_processes is None)
+    # - the import timeout must still apply to the import on its own
+    pipeline_runner = _make_runner(str(tmp_path), ['hang', 'model_a', 'model_b'], parallel_processes=3,
+                                   parallel_import_timeout=1.0, parallel_infer_timeout=30.0, parallel_max_retries=0)
+    start_time = time.time()
+    results_list = pipeline_runner._run_pipelines_parallel(run_pipeline_func=_run_fake_pipeline)
+    assert (time.time() - start_time) < 20
+    # one result per model - the inference of the model whose import has timed out is not run
+    assert results_list == [{}, {'stage': 'infer'}, {'stage': 'infer'}]
+    summary = _read_summary(os.path.join(str(tmp_path), 'run_summary.yaml'))
+    status_dict = {(s['name'], s['stage']): s['status'] for s in summary if 'task_id' in s}
+    assert status_dict[('hang', 'import')] == 'timeout'
+    assert status_dict[('model_a', 'import')] == 'ok' and status_dict[('model_a', 'infer')] == 'ok'
+    # the process started by the import that has timed out has been killed along with it
+    with open(os.path.join(str(tmp_path), 'hang', 'child.pid')) as fp:
+        child_pid = int(fp.read())
+    #
+    if _is_process_alive(child_pid):
+        os.kill(child_pid, signal.SIGKILL)
+        assert False, 'the process started by the task that has timed out is still running'
+    #
+
+
+def _return_value(value):
+    return {'value': value} if value is not None else {}
+
+
+def test_summary_run_id(tmp_path):
+    # the summary file is kept across runs - the records of each run must be identifiable by the run_id
+    summary_file = os.path.join(str(tmp_path), 'run_summary.yaml')
+    run_ids = []
+    for values in ([1, None], [2, 3, 4]):
+        parallel_exec = utils.ParallelRun(parallel_processes=2, summary_file=summary_file, verbose=False)
+        for value in values:
+            parallel_exec.enqueue(functools.partial(_return_value, value), name=f'task{value}')
+        #
+        parallel_exec.run()
+        run_ids.append(parallel_exec.run_id)
+    #
+    assert len(set(run_ids)) == 2
+    summary = _read_summary(summary_file)
+    headers = [s for s in summary if 'task_id' not in s]
+    assert [h['run_id'] for h in headers] == run_ids
+    assert [h['num_tasks'] for h in headers] == [2, 3]
+    assert all(h['pid'] == os.getpid() for h in headers)
+    records = [s for s in summary if 'task_id' in s]
+    # the task_ids start from 0 in each run
+    assert sorted(r['task_id'] for r in records if r['run_id'] == run_ids[0]) == [0, 1]
+    assert sorted(r['task_id'] for r in records if r['run_id'] == run_ids[1]) == [0, 1, 2]
+    status_dict = {(r['run_id'], r['name']): r['status'] for r in records}
+    assert status_dict[(run_ids[0], 'taskNone')] == 'failed' and status_dict[(run_ids[0], 'task1')] == 'ok'
+    assert all(status_dict[(run_ids[1], f'task{v}')] == 'ok' for v in (2, 3, 4))
+
+
+class FakePipelineRunner(PipelineRunner):
+    @classmethod
+    def _run_pipeline(cls, settings, pipeline_config, description=''):
+        result = _run_fake_pipeline(settings, pipeline_config, description)
+        if _get_stage(settings) == 'infer':
+            # the import of the model must have been completed (by whichever host) before its inference
+            run_dir = pipeline_config['session'].get_param('run_dir')
+            import_key = cls._get_work_key(settings, pipeline_config, 'import')
+            lease_dir = os.path.join(os.path.dirname(run_dir), '.work_sharing', str(settings.work_sharing))
+            result['import_done'] = os.path.exists(os.path.join(lease_dir, f'{import_key}.done'))
+        #
+        return result
+
+
+def test_work_sharing_held(tmp_path):
+    pipeline_runner = _make_runner(str(tmp_path), ['model_a', 'model_h'], parallel_processes=2,
+                                   parallel_stage_processes={'import': 1, 'infer': 1}, work_sharing='test',
+                                   work_sharing_lease_timeout=8)
+    pipeline_runner.__class__ = FakePipelineRunner
+    # another host holds the import of model_h for a while and then completes it
+    lease_dir = os.path.join(str(tmp_path), '.work_sharing', 'test')
+    work_sharing = utils.WorkSharing(lease_dir, lease_timeout=8)
+    work_lease = work_sharing.claim('model_h.import')
+    def _complete_import():
+        time.sleep(4)
+        work_lease.set_done()
+        work_lease.release()
+    #
+    other_host = threading.Thread(target=_complete_import)
+    other_host.start()
+    results_list = pipeline_runner._run_pipelines_shared()
+    other_host.join()
+    assert results_list.count({'stage': 'infer', 'import_done': True}) == 2
+    assert all('work_sharing' not in result for result in results_list)
+    # each host has its own summary - the pipelines held by the other host are not recorded as failed
+    summary = _read_summary(os.path.join(str(tmp_path), f'run_summary_{socket.gethostname()}.yaml'))
+    records = [(r['name'], r['stage'], r['status']) for r in summary if 'task_id' in r]
+    assert sorted(records) == [('model_a', 'import', 'ok'), ('model_a', 'infer', 'ok'), ('model_h', 'infer', 'ok')]
+
+
+MEGA = 1024 * 1024
+_retained_buffers = []
+
+
+def _allocate(memory_mb, retain=False):
+    buffer = bytearray(memory_mb * MEGA)
+    if retain:
+        # kept in the worker after the task has finished - as a module or a dataset that is loaded once
+        _retained_buffers.append(buffer)
+    #
+    time.sleep(1.0)
+    return {'memory_mb': memory_mb}
+
+
+def _get_peak_memory_mb(parallel_exec):
+    return [m / MEGA for m in parallel_exec.task_peak_memory]
+
+
+def test_peak_memory_worker(tmp_path):
+    # the memory that a long lived worker has kept from its earlier tasks is not counted in the peak of a task
+    parallel_exec = utils.ParallelRun(parallel_processes=1, mode='worker', memory_limit=64*1024*MEGA,
+                                      memory_interval=0.05, verbose=False)
+    # the tasks are taken from the end of the queue
+    parallel_exec.enqueue(functools.partial(_allocate, 16))
+    parallel_exec.enqueue(functools.partial(_allocate, 256, retain=True))
+    parallel_exec.run()
+    peak_memory_mb = _get_peak_memory_mb(parallel_exec)
+    assert peak_memory_mb[1] > 200
+    assert peak_memory_mb[0] < 100
+
+
+def test_peak_memory_fork(tmp_path):
+    # the pages shared with the parent after fork are not counted in the peak of a task
+    parent_buffer = bytearray(256 * MEGA)
+    parallel_exec = utils.ParallelRun(parallel_processes=1, mode='process', memory_limit=64*1024*MEGA,
+                                      memory_interval=0.05, verbose=False)
+    parallel_exec.enqueue(functools.partial(_allocate, 16))
+    parallel_exec.run()
+    del parent_buffer
+    peak_memory_mb = _get_peak_memory_mb(parallel_exec)
+    assert peak_memory_mb[0] < 100
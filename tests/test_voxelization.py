@@ -0,0 +1,87 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# parity test of Voxelization._voxelize() against the reference implementation that it replaced
+# run from the root of the repository: python -m pytest tests/test_voxelization.py
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from edgeai_benchmark.preprocess.transforms import Voxelization
+
+
+def make_point_cloud(seed, num_points=120000, num_clusters=1000):
+    # synthetic KITTI sized point cloud (x, y, z, intensity) - the points are grouped around a set of centers,
+    # so that there are several thousand non empty voxels, some of them with more than max_points_per_voxel points.
+    # the centers are spread beyond the voxelization range, so that some of the points are dropped.
+    rng = np.random.default_rng(seed)
+    centers = np.stack([rng.uniform(-10, 80, num_clusters), rng.uniform(-50, 50, num_clusters),
+                        rng.uniform(-2.5, 0.5, num_clusters)], axis=1)
+    points = centers[rng.integers(0, num_clusters, num_points)] + rng.normal(0, 0.1, (num_points, 3))
+    intensity = rng.uniform(0, 1, (num_points, 1))
+    return np.concatenate([points, intensity], axis=1).astype(np.float32)
+
+
+def check_parity(lidar_data):
+    voxelization = Voxelization()
+    input0, input2 = voxelization._voxelize(lidar_data)
+    input0_ref, input2_ref = voxelization._voxelize_reference(lidar_data)
+    assert input0.dtype == input0_ref.dtype and input2.dtype == input2_ref.dtype
+    assert np.array_equal(input0, input0_ref)
+    assert np.array_equal(input2, input2_ref)
+    return input0, input2
+
+
+def test_voxelization_parity():
+    for seed in range(3):
+        input0, input2 = check_parity(make_point_cloud(seed))
+        # the marker after the valid voxels must be there
+        assert (input2[0, 0] == -1).sum() == 1
+    #
+
+
+def test_voxelization_parity_dense_voxel():
+    # more points in a single voxel than max_points_per_voxel - the extra points are dropped
+    rng = np.random.default_rng(10)
+    dense_points = np.array([[10.05, 0.05, -1.0, 0.5]], dtype=np.float32) + \
+        rng.uniform(0, 0.05, (100, 4)).astype(np.float32)
+    lidar_data = np.concatenate([make_point_cloud(10, num_points=20000), dense_points], axis=0)
+    input0, _ = check_parity(lidar_data)
+    assert np.count_nonzero(input0[0, 3, -1, :]) > 0
+
+
+def test_voxelization_parity_out_of_range():
+    # all the points are outside the voxelization range - there are no valid voxels
+    lidar_data = make_point_cloud(20, num_points=1000)
+    lidar_data[:, 0] = -1.0
+    input0, input2 = check_parity(lidar_data)
+    assert not np.any(input0)
+    assert np.all(input2[0, :, 0] == -1) and not np.any(input2[0, :, 1:])
@@ -0,0 +1,183 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# multi-process test of the work sharing leases - each process plays the role of a host that uses the same lease_dir
+# run from the root of the repository: python -m pytest tests/test_work_sharing.py
+
+import os
+import sys
+import time
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from edgeai_benchmark.utils.work_sharing import WorkSharing
+
+# a short lease timeout (the setting work_sharing_lease_timeout), so that the expiry of the leases can be checked quickly
+LEASE_TIMEOUT = 1.0
+WORK_KEYS = [f'model_{i}' for i in range(12)]
+
+
+def _run_worker(lease_dir, log_dir, work_keys, work_time):
+    work_sharing = WorkSharing(lease_dir, lease_timeout=LEASE_TIMEOUT)
+    while not all(work_sharing.is_done(key) for key in work_keys):
+        for key in work_keys:
+            work_lease = work_sharing.claim(key)
+            if work_lease is None:
+                continue
+            #
+            with work_lease:
+                # record who did the work - O_APPEND, so that the records of several processes are not mixed
+                fd = os.open(os.path.join(log_dir, key), os.O_CREAT | os.O_APPEND | os.O_WRONLY)
+                os.write(fd, f'{os.getpid()}\n'.encode())
+                os.close(fd)
+                time.sleep(work_time)
+                work_lease.set_done()
+            #
+        #
+        time.sleep(0.05)
+    #
+
+
+def _claim_and_die(lease_dir, key):
+    work_sharing = WorkSharing(lease_dir, lease_timeout=LEASE_TIMEOUT)
+    work_lease = work_sharing.claim(key)
+    # exit without releasing the lease - as a host that crashed
+    os._exit(0 if work_lease is not None else 1)
+
+
+def _claim_and_hold(lease_dir, key, hold_time):
+    work_sharing = WorkSharing(lease_dir, lease_timeout=LEASE_TIMEOUT)
+    work_lease = work_sharing.claim(key)
+    if work_lease is None:
+        os._exit(1)
+    #
+    with work_lease:
+        time.sleep(hold_time)
+        work_lease.set_done()
+    #
+
+
+def _start_process(target, *args):
+    mp_context = multiprocessing.get_context(method='fork')
+    proc = mp_context.Process(target=target, args=args)
+    proc.start()
+    return proc
+
+
+def test_work_sharing_multi_process(tmp_path):
+    lease_dir = str(tmp_path / 'leases')
+    log_dir = tmp_path / 'logs'
+    log_dir.mkdir()
+    procs = [_start_process(_run_worker, lease_dir, str(log_dir), WORK_KEYS, 0.1) for _ in range(4)]
+    for proc in procs:
+        proc.join(timeout=60)
+        assert proc.exitcode == 0
+    #
+    work_sharing = WorkSharing(lease_dir, lease_timeout=LEASE_TIMEOUT)
+    workers = set()
+    for key in WORK_KEYS:
+        assert work_sharing.is_done(key)
+        assert not work_sharing.is_claimable(key)
+        assert work_sharing.claim(key) is None
+        # each work item was done exactly once and its lease was released
+        records = (log_dir / key).read_text().split()
+        assert len(records) == 1
+        assert not os.path.exists(work_sharing.get_lease_file(key))
+        workers.update(records)
+    #
+    assert len(workers) > 1
+
+
+def test_work_sharing_expired_lease(tmp_path):
+    lease_dir = str(tmp_path / 'leases')
+    key = WORK_KEYS[0]
+    proc = _start_process(_claim_and_die, lease_dir, key)
+    proc.join(timeout=60)
+    assert proc.exitcode == 0
+    work_sharing = WorkSharing(lease_dir, lease_timeout=LEASE_TIMEOUT)
+    # the lease of the dead process has not expired yet
+    assert not work_sharing.is_claimable(key)
+    assert work_sharing.claim(key) is None
+    # it is not renewed any more - so it can be reclaimed once it expires
+    time.sleep(LEASE_TIMEOUT * 1.5)
+    assert work_sharing.is_claimable(key)
+    work_lease = work_sharing.claim(key)
+    assert work_lease is not None
+    with work_lease:
+        work_lease.set_done()
+    #
+    assert work_sharing.is_done(key)
+    assert not os.path.exists(work_sharing.get_lease_file(key))
+    assert not [f for f in os.listdir(lease_dir) if not f.endswith('.done')]
+
+
+def test_work_sharing_renewed_lease(tmp_path):
+    lease_dir = str(tmp_path / 'leases')
+    key = WORK_KEYS[0]
+    hold_time = LEASE_TIMEOUT * 3
+    proc = _start_process(_claim_and_hold, lease_dir, key, hold_time)
+    work_sharing = WorkSharing(lease_dir, lease_timeout=LEASE_TIMEOUT)
+    while not os.path.exists(work_sharing.get_lease_file(key)) and proc.is_alive():
+        time.sleep(0.01)
+    #
+    # the lease is renewed by the process that holds it - so it cannot be claimed for longer than lease_timeout
+    start_time = time.time()
+    while proc.is_alive() and (time.time() - start_time) < (hold_time - LEASE_TIMEOUT/2):
+        assert work_sharing.claim(key) is None
+        time.sleep(0.1)
+    #
+    proc.join(timeout=60)
+    assert proc.exitcode == 0
+    assert work_sharing.is_done(key)
+    assert work_sharing.claim(key) is None
+
+
+def test_work_sharing_lease_lost_while_renewing(tmp_path):
+    # the lease file is removed (eg. reclaimed by another host) between the ownership check and its renewal
+    lease_dir = str(tmp_path / 'leases')
+    work_sharing = WorkSharing(lease_dir, lease_timeout=LEASE_TIMEOUT)
+    work_lease = work_sharing.claim(WORK_KEYS[0])
+    def _is_owner_and_lost():
+        if os.path.exists(work_lease.lease_file):
+            os.remove(work_lease.lease_file)
+        #
+        return True
+    #
+    work_lease._is_owner = _is_owner_and_lost
+    thread_exceptions = []
+    threading.excepthook = lambda args: thread_exceptions.append(args.exc_value)
+    try:
+        work_lease.renew_thread.join(timeout=LEASE_TIMEOUT * 4)
+        assert not work_lease.renew_thread.is_alive()
+    finally:
+        threading.excepthook = threading.__excepthook__
+    #
+    assert thread_exceptions == []
+    work_lease.release()